@@ -0,0 +1,41 @@
+import os
+
+import cv2
+
+from fixtures import PANEL_SIZE, stub_app, stub_slider, work_dir, write_dicom
+from harness import register
+from presentation.controller.left_frame_controller import LeftFrameController
+from service.image_io import load_image
+
+
+def _dicom_state(compressed):
+    def setup():
+        name = "slice_rle.dcm" if compressed else "slice.dcm"
+        return {"path": write_dicom(os.path.join(work_dir(), name), compressed=compressed)}
+    return setup
+
+
+def _load(state):
+    load_image(state["path"])
+
+
+def _slider_state(brightness, sharpness):
+    def setup():
+        controller = LeftFrameController.__new__(LeftFrameController)
+        controller.view = type("View", (), {})()
+        controller.view.brightness_slider = stub_slider(brightness)
+        controller.view.sharpness_slider = stub_slider(sharpness)
+        return {"controller": controller, "image": stub_app().current_image}
+    return setup
+
+
+def _slider(state):
+    # What a slider move costs before annotations are drawn: adjust, then fit to the panel
+    adjusted = state["controller"].adjust_brightness_and_sharpness(state["image"])
+    cv2.resize(adjusted, PANEL_SIZE)
+
+
+register("load_image[dicom]", _load, _dicom_state(False), group="image")
+register("load_image[dicom_rle]", _load, _dicom_state(True), group="image")
+register("slider_adjustment[brightness]", _slider, _slider_state(70, 0), group="image")
+register("slider_adjustment[brightness+sharpness]", _slider, _slider_state(70, 3), group="image")
@@ -0,0 +1,91 @@
+import os
+
+from fixtures import IMAGE_SIZE, make_annotations, work_dir
+from harness import register
+from service import annotation_io
+from service.annotation_io import annotations_from_label_data, build_label_data
+from service.annotation_store import create_store
+from service.mask import rasterize_ellipse, rasterize_polygon
+
+SAVE_SHAPES = 100
+
+
+def _mask_state(shape):
+    def setup():
+        if shape == "ellipse":
+            mask = rasterize_ellipse((256, 256), (40, 25), 30, IMAGE_SIZE)
+        else:
+            mask = rasterize_polygon([(200, 200), (300, 210), (320, 300), (220, 320)], IMAGE_SIZE)
+        return {"mask": mask}
+    return setup
+
+
+def _encode(state):
+    state["mask"].to_base64_png()
+
+
+def _build_state(n_shapes, **options):
+    def setup():
+        return {"annotations": make_annotations(n_shapes), "options": options}
+    return setup
+
+
+def _build(state):
+    build_label_data("slice.dcm", state["annotations"], IMAGE_SIZE, **state["options"])
+
+
+def _store_state(store_name, saved=False):
+    def setup():
+        folder = os.path.join(work_dir(), store_name)
+        os.makedirs(folder, exist_ok=True)
+        image_path = os.path.join(folder, "slice.dcm")
+        store = create_store(store_name)
+        annotations = make_annotations(SAVE_SHAPES)
+        label_data = build_label_data(image_path, annotations, IMAGE_SIZE, packed_masks=store.packed_masks)
+        if saved:
+            store.save(image_path, label_data)
+        return {"store": store, "image_path": image_path, "annotations": annotations, "label_data": label_data}
+    return setup
+
+
+def _save(state):
+    state["store"].save(state["image_path"], state["label_data"])
+
+
+def _build_and_save(state):
+    # What "Save Labels" does: mask encoding for JSON/SQLite, packing only for npz
+    store = state["store"]
+    store.save(state["image_path"], build_label_data(state["image_path"], state["annotations"], IMAGE_SIZE,
+                                                     packed_masks=store.packed_masks))
+
+
+def _load(state):
+    annotations_from_label_data(state["store"].load(state["image_path"], include_masks=False), IMAGE_SIZE)
+
+
+def _load_streamed(state):
+    # Force the streaming path used for label JSONs of STREAM_MIN_BYTES or more
+    threshold = annotation_io.STREAM_MIN_BYTES
+    annotation_io.STREAM_MIN_BYTES = 0
+    try:
+        _load(state)
+    finally:
+        annotation_io.STREAM_MIN_BYTES = threshold
+
+
+def _load_with_masks(state):
+    state["store"].load(state["image_path"], include_masks=True)
+
+
+register("mask_encode[ellipse]", _encode, _mask_state("ellipse"), group="io")
+register("mask_encode[polygon]", _encode, _mask_state("polygon"), group="io")
+for n in (10, SAVE_SHAPES):
+    register(f"build_label_data[{n}]", _build, _build_state(n), group="io")
+register(f"build_label_data[{SAVE_SHAPES},serial]", _build, _build_state(SAVE_SHAPES, workers=1), group="io")
+register(f"build_label_data[{SAVE_SHAPES},compression=9]", _build, _build_state(SAVE_SHAPES, compression=9), group="io")
+for store_name in ("json", "npz", "sqlite"):
+    register(f"save[{store_name},{SAVE_SHAPES}]", _save, _store_state(store_name), group="io")
+    register(f"build_and_save[{store_name},{SAVE_SHAPES}]", _build_and_save, _store_state(store_name), group="io")
+    register(f"load[{store_name},{SAVE_SHAPES}]", _load, _store_state(store_name, saved=True), group="io")
+    register(f"load_with_masks[{store_name},{SAVE_SHAPES}]", _load_with_masks, _store_state(store_name, saved=True), group="io")
+register(f"load_streamed[json,{SAVE_SHAPES}]", _load_streamed, _store_state("json", saved=True), group="io")
@@ -0,0 +1,92 @@
+import cv2
+
+from fixtures import PANEL_SIZE, stub_app, stub_event
+from harness import register
+from presentation.controller.center_frame_controller import CenterFrameController
+from render.frame import render_frame
+from render.hover import HoverIndex
+from service.annotation_io import build_label_data
+from service.thumbnails import render_thumbnail
+
+SHAPE_COUNTS = (10, 100, 1000)
+
+
+def _render_state(n_shapes):
+    def setup():
+        app = stub_app(n_shapes)
+        return {"app": app, "display": cv2.resize(app.adjusted_image, PANEL_SIZE), "transform": app.view_transform()}
+    return setup
+
+
+def _redraw(state):
+    render_frame(state["display"], state["app"].annotations, state["transform"])
+
+
+def _center_controller(app, highlight=False):
+    controller = CenterFrameController.__new__(CenterFrameController)
+    controller.master = app
+    controller.hover_index = HoverIndex()
+    if not highlight:
+        # Hit-testing only; blending is measured separately
+        controller.highlight_selected_annotation = lambda name, index: None
+    return controller
+
+
+def _hover_state(n_shapes):
+    def setup():
+        app = stub_app(n_shapes)
+        app.tmp_image = cv2.resize(app.adjusted_image, PANEL_SIZE)
+        # A sweep across the panel, hitting and missing shapes
+        positions = [stub_event(x, y) for y in range(0, PANEL_SIZE[1], 50) for x in range(0, PANEL_SIZE[0], 50)]
+        return {"controller": _center_controller(app), "positions": positions, "i": 0}
+    return setup
+
+
+def _idle_hover_state(n_shapes):
+    def setup():
+        state = _hover_state(n_shapes)()
+        # Jitter over the air in the top-left corner, outside every shape
+        state["positions"] = [stub_event(x, y) for x, y in ((2, 2), (5, 3), (3, 6))]
+        return state
+    return setup
+
+
+def _hover(state):
+    positions = state["positions"]
+    state["controller"].move_on_image(positions[state["i"] % len(positions)])
+    state["i"] += 1
+
+
+def _highlight_state(shape):
+    def setup():
+        app = stub_app(2)
+        name, index = next((name, i) for name, data in app.annotations.items()
+                           for i, shape_data in enumerate(data["shapes"]) if shape_data["shape"] == shape)
+        return {"controller": _center_controller(app, highlight=True), "name": name, "index": index}
+    return setup
+
+
+def _highlight(state):
+    state["controller"].highlight_selected_annotation(state["name"], state["index"])
+
+
+def _thumbnail_state(n_shapes):
+    def setup():
+        app = stub_app(n_shapes)
+        return {"image": app.adjusted_image,
+                "label_data": build_label_data("slice.dcm", app.annotations, app.original_image_size)}
+    return setup
+
+
+def _thumbnail(state):
+    render_thumbnail(state["image"], state["label_data"])
+
+
+for n in SHAPE_COUNTS:
+    register(f"redraw_annotations[{n}]", _redraw, _render_state(n), group="render")
+for n in SHAPE_COUNTS:
+    register(f"hover_hit_test[{n}]", _hover, _hover_state(n), group="render")
+register("hover_idle[1000]", _hover, _idle_hover_state(1000), group="render")
+register("highlight_blend[ellipse]", _highlight, _highlight_state("ellipse"), group="render")
+register("highlight_blend[closed_curve]", _highlight, _highlight_state("closed_curve"), group="render")
+register("render_thumbnail[20]", _thumbnail, _thumbnail_state(20), group="render")
@@ -0,0 +1,129 @@
+import atexit
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, RLELossless, generate_uid
+
+from render.view_transform import ViewTransform
+
+IMAGE_SIZE = (512, 512)  # (width, height) of the synthetic slices
+PANEL_SIZE = (800, 800)  # Stub center panel size (width, height)
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+
+_work_dir = None
+
+
+def work_dir():
+    """Temporary folder for synthetic files, removed at exit."""
+    global _work_dir
+    if _work_dir is None:
+        _work_dir = tempfile.mkdtemp(prefix="ct_labeling_bench_")
+        atexit.register(shutil.rmtree, _work_dir, True)
+    return _work_dir
+
+
+def synthetic_ct(size=IMAGE_SIZE, seed=0):
+    """
+    12-bit signed CT-like slice: air, a body ellipse, bone-bright spots and noise.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    yy, xx = np.mgrid[0:height, 0:width]
+    body = ((xx - width / 2) / (width * 0.42)) ** 2 + ((yy - height / 2) / (height * 0.35)) ** 2 <= 1
+    image = np.full((height, width), -1000, dtype=np.int16)
+    image[body] = 40
+    for _ in range(12):
+        cx, cy, r = rng.integers(width // 4, 3 * width // 4), rng.integers(height // 4, 3 * height // 4), rng.integers(5, 25)
+        image[(xx - cx) ** 2 + (yy - cy) ** 2 <= r * r] = rng.integers(200, 1500)
+    image += rng.normal(0, 20, image.shape).astype(np.int16)
+    return np.clip(image, -2048, 2047).astype(np.int16)
+
+
+def write_dicom(path, size=IMAGE_SIZE, seed=0, compressed=False, instance=1):
+    meta = FileMetaDataset()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    meta.MediaStorageSOPClassUID = CTImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds = FileDataset(path, {}, file_meta=meta, preamble=b"\0" * 128)
+    ds.SOPClassUID = CTImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = "CT"
+    ds.InstanceNumber = instance
+    ds.ImagePositionPatient = [0.0, 0.0, float(instance)]
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.PixelSpacing = [0.7, 0.7]
+    ds.Rows, ds.Columns = size[1], size[0]
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 16
+    ds.BitsStored = 12
+    ds.HighBit = 11
+    ds.PixelRepresentation = 1
+    ds.PixelData = synthetic_ct(size, seed).tobytes()
+    if compressed:
+        ds.compress(RLELossless)
+    ds.save_as(path, enforce_file_format=True)
+    return path
+
+
+def make_annotations(n_shapes, image_size=IMAGE_SIZE, n_labels=6, seed=0):
+    """
+    In-memory annotations as the app holds them: original-image coordinates,
+    alternating rotated ellipses and ~60-point closed curves.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = image_size
+    annotations = {}
+    for i in range(n_shapes):
+        name = f"label_{i % n_labels}"
+        cx, cy = float(rng.uniform(0.2, 0.8) * width), float(rng.uniform(0.2, 0.8) * height)
+        a, b = float(rng.uniform(8, 40)), float(rng.uniform(8, 40))
+        if i % 2 == 0:
+            shape_data = {"shape": "ellipse", "center": [cx, cy], "axes": [a, b],
+                          "angle": float(rng.uniform(0, 180)), "mask": None, "image_size": image_size}
+        else:
+            t = np.linspace(0, 2 * np.pi, 60, endpoint=False)
+            radius = 1 + 0.15 * np.sin(5 * t + rng.uniform(0, np.pi))
+            points = [(int(cx + a * r * np.cos(angle)), int(cy + b * r * np.sin(angle))) for angle, r in zip(t, radius)]
+            shape_data = {"shape": "closed_curve", "points": points, "mask": None, "image_size": image_size}
+        annotations.setdefault(name, {"color": COLORS[i % n_labels % len(COLORS)], "shapes": []})
+        annotations[name]["shapes"].append(shape_data)
+    return annotations
+
+
+def stub_app(n_shapes=0, image=None, panel_size=PANEL_SIZE):
+    """
+    Stand-in for ImageLabelingApp with the attributes the controllers read;
+    drawing to the screen is a no-op.
+    """
+    if image is None:
+        image = ((synthetic_ct().astype(np.int32) + 1000) // 12).clip(0, 255).astype(np.uint8)
+    app = SimpleNamespace(
+        annotations=make_annotations(n_shapes, (image.shape[1], image.shape[0])),
+        original_image_size=(image.shape[1], image.shape[0]),
+        current_image=image,
+        adjusted_image=image,
+        tmp_image=None,
+        selected_annotation=None,
+        selected_shape_index=None,
+        hovered_shape=None,
+        drawing_mode="normal",
+        is_drawing=False,
+    )
+    app.get_image_panel_size = lambda: panel_size
+    app.view_transform = lambda: ViewTransform(app.original_image_size, panel_size)
+    app.show_image = lambda: None
+    app.show_image_with_tmp = lambda image: None
+    app.update_display = lambda apply_adjustments=True, redraw_annotations=True: None
+    return app
+
+
+def stub_slider(value):
+    return SimpleNamespace(get=lambda: value)
+
+
+def stub_event(x, y):
+    return SimpleNamespace(x=x, y=y)
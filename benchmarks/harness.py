@@ -0,0 +1,118 @@
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCHMARKS = []
+
+
+class Benchmark:
+    """
+    One timed case: setup() builds the state once, run(state) is what gets timed.
+    """
+    def __init__(self, name, run, setup=None, group=""):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.group = group
+
+
+def register(name, run, setup=None, group=""):
+    BENCHMARKS.append(Benchmark(name, run, setup, group))
+
+
+def _time_loops(run, state, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        run(state)
+    return time.perf_counter() - start
+
+
+def measure(run, state, repeat=5, min_time=0.2):
+    """
+    Time run(state) like timeit: calibrate a loop count taking at least
+    min_time, then take `repeat` samples of it with the GC disabled.
+
+    Returns:
+        dict: Per-call milliseconds (min/median/mean) and the loop count
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        run(state)  # Warm up caches and lazy imports
+        loops = 1
+        while True:
+            elapsed = _time_loops(run, state, loops)
+            if elapsed >= min_time or loops >= 1_000_000:
+                break
+            loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.1))
+        samples = sorted(_time_loops(run, state, loops) / loops * 1000 for _ in range(repeat))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        "ms_min": samples[0],
+        "ms_median": samples[len(samples) // 2],
+        "ms_mean": sum(samples) / len(samples),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def _version(module_name):
+    try:
+        return __import__(module_name).__version__
+    except Exception:
+        return None
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": _version("numpy"),
+        "cv2": _version("cv2"),
+        "pydicom": _version("pydicom"),
+    }
+
+
+def run_all(benchmarks, repeat=5, min_time=0.2):
+    results = {}
+    for bench in benchmarks:
+        state = bench.setup() if bench.setup else None
+        results[bench.name] = measure(bench.run, state, repeat, min_time)
+        print(f"{bench.name:<44}{results[bench.name]['ms_median']:>12.4f} ms   ({results[bench.name]['loops']} loops)")
+    return results
+
+
+def save_results(path, results):
+    with open(path, "w") as file:
+        json.dump({"environment": environment(), "results": results}, file, indent=4)
+
+
+def compare(baseline_path, results):
+    """
+    Print median times next to a previous results file; ratio > 1 means faster now.
+    """
+    with open(baseline_path, "r") as file:
+        baseline = json.load(file)
+    print(f"\nCompared with {baseline_path} (commit {baseline['environment'].get('commit')}):")
+    print(f"{'benchmark':<44}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<44}{'-':>12}{result['ms_median']:>12.4f}{'new':>10}")
+            continue
+        speedup = before["ms_median"] / result["ms_median"] if result["ms_median"] else float("inf")
+        print(f"{name:<44}{before['ms_median']:>12.4f}{result['ms_median']:>12.4f}{speedup:>9.2f}x")
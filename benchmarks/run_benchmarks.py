@@ -0,0 +1,48 @@
+"""
+Headless benchmarks for the rendering and I/O hot paths.
+
+Runs without a display: controller methods are driven with stub app/panel
+objects (see fixtures.py) on synthetic DICOM slices and annotations.
+
+    python benchmarks/run_benchmarks.py --out before.json
+    python benchmarks/run_benchmarks.py --out after.json --compare before.json
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ct_image_labeling_tool"))
+
+import bench_image  # noqa: E402,F401  (registers benchmarks)
+import bench_io  # noqa: E402,F401
+import bench_render  # noqa: E402,F401
+from harness import BENCHMARKS, compare, run_all, save_results  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the headless benchmark suite.")
+    parser.add_argument("-k", dest="pattern", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--group", choices=sorted({bench.group for bench in BENCHMARKS}))
+    parser.add_argument("--repeat", type=int, default=5, help="Timing samples per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per sample")
+    parser.add_argument("--out", help="Write results (with commit and library versions) to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="Print speedups against an earlier results file")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    args = parser.parse_args()
+
+    selected = [bench for bench in BENCHMARKS
+                if (not args.pattern or args.pattern in bench.name) and (not args.group or bench.group == args.group)]
+    if args.list:
+        print("\n".join(bench.name for bench in selected))
+        return
+
+    results = run_all(selected, repeat=args.repeat, min_time=args.min_time)
+    if args.out:
+        save_results(args.out, results)
+        print(f"Results written to {args.out}")
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
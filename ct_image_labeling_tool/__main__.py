@@ -1,28 +1,80 @@
-import tkinter as tk
-from tkinterdnd2 import TkinterDnD
-
-from app.app import ImageLabelingApp
-
-def init_tkdnd(root):
-    try:
-        root.tk.call('package', 'require', 'tkdnd')
-        print("[INFO] tkdnd 패키지 로드 성공")
-        root.tk.call('namespace', 'eval', '::tkdnd', '')
-        print("[INFO] 네임스페이스 초기화 완료")
-    except tk.TclError as e:
-        print(f"[ERROR] tkdnd 초기화 실패: {e}")
-        raise RuntimeError('Unable to load tkdnd library.')
-
-def main():
-    root = TkinterDnD.Tk()
-    root.title("CT Image Labeling Tool")
-    root.geometry("1600x800")
-
-    init_tkdnd(root)
-
-    ImageLabelingApp(root)
-    
-    root.mainloop()
-
-if __name__ == "__main__":
+import argparse
+import tkinter as tk
+from tkinterdnd2 import TkinterDnD
+
+from app.startup_profile import StartupProfiler
+from service.annotation_store import STORES, create_store
+from service.perf import PERF, default_stats_path
+
+class DnDRoot(tk.Tk, TkinterDnD.DnDWrapper):
+    """
+    Tk root with the drag-and-drop methods of TkinterDnD.Tk.
+
+    Unlike TkinterDnD.Tk it does not load the tkdnd Tcl package in its
+    constructor; init_tkdnd does that once the window is on screen.
+    """
+
+def init_tkdnd(root):
+    try:
+        # TkinterDnD._require is what TkinterDnD.Tk.__init__ runs: it puts the bundled tkdnd
+        # binaries for this platform on auto_path and does `package require tkdnd`. It is
+        # private, so tkinterdnd2 is pinned in requirements.txt; check it when upgrading.
+        root.TkdndVersion = TkinterDnD._require(root)
+        print("[INFO] tkdnd 패키지 로드 성공")
+        root.tk.call('namespace', 'eval', '::tkdnd', '')
+        print("[INFO] 네임스페이스 초기화 완료")
+    except (tk.TclError, RuntimeError) as e:
+        print(f"[ERROR] tkdnd 초기화 실패: {e}")
+        raise RuntimeError('Unable to load tkdnd library.')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CT Image Labeling Tool")
+    parser.add_argument("--store", choices=sorted(STORES), default="json",
+                        help="Annotation backend: per-image JSON files or a per-study SQLite database")
+    parser.add_argument("--geometry-only", action="store_true",
+                        help="Save shape geometry without rasterized masks; masks are rebuilt from it on load")
+    parser.add_argument("--mask-compression", type=int, choices=range(10), metavar="0-9",
+                        help="PNG compression level of saved masks (9: smallest files, slowest saves; "
+                             "default: OpenCV's fast setting)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print a breakdown of startup and import times")
+    parser.add_argument("--perf", nargs="?", const=default_stats_path(), metavar="STATS_JSON",
+                        help="Time loading, rendering and saving, and write the stats to STATS_JSON on exit")
+    parser.add_argument("--perf-overlay", action="store_true",
+                        help="Show frame time and FPS over the image (toggle with F12)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    profiler = StartupProfiler() if args.profile_startup else None
+
+    root = DnDRoot()
+    root.title("CT Image Labeling Tool")
+    root.geometry("1600x800")
+    # Show the (empty) window before the heavier setup below
+    root.update()
+    if profiler:
+        profiler.mark("window shown")
+
+    from app.app import ImageLabelingApp
+    if profiler:
+        profiler.mark("import app")
+
+    init_tkdnd(root)
+    if profiler:
+        profiler.mark("load tkdnd")
+
+    if args.perf or args.perf_overlay:
+        PERF.enable()
+    app = ImageLabelingApp(root, store=create_store(args.store), perf_stats_path=args.perf,
+                           save_masks=not args.geometry_only, mask_compression=args.mask_compression)
+    if args.perf_overlay:
+        app.center_controller.show_perf_overlay()
+    if profiler:
+        profiler.mark("build app")
+        root.after_idle(profiler.report)
+
+    root.mainloop()
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
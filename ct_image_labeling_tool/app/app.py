@@ -1,247 +1,381 @@
-from PIL import Image, ImageTk
-import cv2
-import numpy as np
-import tkinter as tk
-
-from presentation.controller.left_frame_controller import LeftFrameController
-from presentation.controller.right_frame_controller import RightFrameController
-from presentation.controller.center_frame_controller import CenterFrameController
-from app.shortcuts import setup_shortcuts
-
-class ImageLabelingApp:
-    def __init__(self, root):
-        self.root = root
-
-        # File and image variables
-        self.file_list = []  # Loaded file paths
-        self.current_file_path = None
-        self.current_image = None  # Original image
-        self.adjusted_image = None  # Adjusted for brightness/sharpness
-        self.tmp_image = None  # Temporary image for display
-        self.original_image_size = None
-
-        # Annotations
-        self.annotations = {}  # {name: {"color": (B, G, R), "shapes": [...]}}
-        self.annotations_per_file = {}  # Annotations by file
-        self.drawing_mode = None  # "polygon", "ellipse", or "normal"
-        self.points = []  # Temporary points when drawing
-        self.selected_annotation = None
-        self.selected_shape_index = None
-
-        # Edit (normal) mode
-        self.normal_mod_mode = None  # "move", "resize", "rotate"
-        self.normal_mod_vertex = None  # "top", "bottom", etc.
-        self.normal_mod_start_mouse = None
-        self.normal_mod_start_params = None  # (center, axes, angle)
-
-        # Drawing mode
-        self.is_drawing = False
-        self.start_point = None  # For ellipse drawing
-
-        self.left_controller = LeftFrameController(self, root)
-        self.right_controller = RightFrameController(self, root)
-        self.center_controller = CenterFrameController(self, root)
-
-        setup_shortcuts(self)
-    
-    
-    def update_display(self, apply_adjustments=True, redraw_annotations=True):
-        if self.current_image is None:
-            self.tmp_image = None
-            self.center_controller.clear_image_panel()
-            self.drawing_mode = None
-            return
-        
-        if apply_adjustments:
-            self.adjusted_image = self.left_controller.adjust_brightness_and_sharpness(self.current_image)
-
-        panel_size = self.get_image_panel_size()
-
-        self.tmp_image = cv2.resize(self.adjusted_image, panel_size)
-
-        if redraw_annotations:
-            self.redraw_annotations()
-            self.show_image()
-        else:
-            self.show_image()
-
-
-    def show_image(self):
-        if self.tmp_image is None:
-            return
-        
-        img_rgb = cv2.cvtColor(self.tmp_image, cv2.COLOR_BGR2RGB)
-        img_pil = Image.fromarray(img_rgb)
-        img_tk = ImageTk.PhotoImage(image=img_pil)
-
-        self.center_controller.show_in_image_panel(img_tk)
-        
-        
-    def redraw_annotations(self):
-        if self.tmp_image is None:
-            return
-        disp_w, disp_h = self.get_image_panel_size()
-        orig_w, orig_h = self.original_image_size
-        scale_x = disp_w / orig_w
-        scale_y = disp_h / orig_h
-
-        temp_img = self.tmp_image.copy()
-        for _, data in self.annotations.items():
-            color = data["color"]
-            for shape_data in data["shapes"]:
-                shape = shape_data["shape"]
-                if shape == "ellipse":
-                    if "center" in shape_data:
-                        center = shape_data["center"]
-                        axes = shape_data["axes"]
-                        angle = shape_data["angle"]
-                        disp_center = (int(center[0] * scale_x), int(center[1] * scale_y))
-                        disp_axes = (int(axes[0] * scale_x), int(axes[1] * scale_y))
-                        cv2.ellipse(temp_img, disp_center, disp_axes, angle, 0, 360, color, 1)
-                    else:
-                        pts = shape_data["points"]
-                        disp_pts = [(int(pt[0] * scale_x), int(pt[1] * scale_y)) for pt in pts]
-                        center = ((disp_pts[0][0] + disp_pts[1][0]) // 2, (disp_pts[0][1] + disp_pts[1][1]) // 2)
-                        axes = (abs(disp_pts[1][0]-disp_pts[0][0])//2, abs(disp_pts[1][1]-disp_pts[0][1])//2)
-                        cv2.ellipse(temp_img, center, axes, 0, 0, 360, color, 1)
-                elif shape in ["polygon", "closed_curve"]:
-                    pts = shape_data["points"]
-                    disp_pts = [(int(pt[0] * scale_x), int(pt[1] * scale_y)) for pt in pts]
-                    cv2.polylines(temp_img, [np.array(disp_pts)], isClosed=(shape=="polygon"), color=color, thickness=1)
-        self.tmp_image = temp_img
-        self.show_image()
-
-
-    def delete_selected_file(self, event):
-        selection = self.right_controller.get_file_list_curselection
-        if not selection:
-            return
-        
-        index = selection[0]
-        file_to_remove = self.file_list[index]
-        self.right_controller.delete_selected_file_from_listbox(index)
-        del self.file_list[index]
-        print(f"Removed: {file_to_remove}")
-        
-        self.current_file_path = None
-        self.current_image = None
-        self.annotations.clear()
-        self.right_controller.delete_selected_annotation_from_listbox()
-        self.clear_image_panel()
-        print("Image panel and annotation list cleared.")
-
-
-    def delete_file_from_listbox(self, first=None):
-        self.right_controller.delete_selected_file_from_listbox(first)
-
-
-    def delete_selected_annotation(self, event=None):
-        if self.selected_annotation is not None:
-            del self.annotations[self.selected_annotation]["shapes"][self.selected_shape_index]
-            if not self.annotations[self.selected_annotation]["shapes"]:
-                del self.annotations[self.selected_annotation]
-                for i in range(self.right_controller.get_listbox_size("annotation")):
-                    if self.right_controller.get_annotation_from_listbox(i) == self.selected_annotation:
-                        self.right_controller.delete_selected_annotation_from_listbox(i)
-                        break
-            self.selected_annotation = None
-            self.selected_shape_index = None
-            self.update_display(apply_adjustments=False, redraw_annotations=True)
-
-
-    def show_image_with_tmp(self, tmp_image):
-        img_rgb = cv2.cvtColor(tmp_image, cv2.COLOR_BGR2RGB)
-        img_pil = Image.fromarray(img_rgb)
-        img_tk = ImageTk.PhotoImage(image=img_pil)
-
-        self.center_controller.show_in_image_panel(img_tk)
-
-
-    def get_image_panel_size(self):
-        return self.center_controller.get_image_panel_size()
-
-
-    def get_filter_slider_value(self):
-        return self.left_controller.get_filter_slider_value()
-
-
-    def set_slider_value(self, value={"brightness":50, "sharpness":0}):
-        self.left_controller.set_slider_value(value)
-
-
-    def redraw_annotations(self):
-        if self.tmp_image is None:
-            return
-        disp_w, disp_h = self.get_image_panel_size()
-        orig_w, orig_h = self.original_image_size
-        scale_x = disp_w / orig_w
-        scale_y = disp_h / orig_h
-
-        temp_img = self.tmp_image.copy()
-        
-        for name, data in self.annotations.items():
-            color = data["color"]
-            for shape_data in data["shapes"]:
-                shape = shape_data["shape"]
-                if shape == "ellipse":
-                    if "center" in shape_data:
-                        center = shape_data["center"]
-                        axes = shape_data["axes"]
-                        angle = shape_data["angle"]
-                        disp_center = (int(center[0] * scale_x), int(center[1] * scale_y))
-                        disp_axes = (int(axes[0] * scale_x), int(axes[1] * scale_y))
-                        cv2.ellipse(temp_img, disp_center, disp_axes, angle, 0, 360, color, 1)
-                    else:
-                        pts = shape_data["points"]
-                        disp_pts = [(int(pt[0] * scale_x), int(pt[1] * scale_y)) for pt in pts]
-                        center = ((disp_pts[0][0] + disp_pts[1][0]) // 2, (disp_pts[0][1] + disp_pts[1][1]) // 2)
-                        axes = (abs(disp_pts[1][0]-disp_pts[0][0])//2, abs(disp_pts[1][1]-disp_pts[0][1])//2)
-                        cv2.ellipse(temp_img, center, axes, 0, 0, 360, color, 1)
-                elif shape in ["polygon", "closed_curve"]:
-                    pts = shape_data["points"]
-                    disp_pts = [(int(pt[0] * scale_x), int(pt[1] * scale_y)) for pt in pts]
-                    cv2.polylines(temp_img, [np.array(disp_pts)], isClosed=(shape=="polygon"), color=color, thickness=1)
-        self.tmp_image = temp_img
-        self.show_image()
-
-
-    def handle_ellipse(self, start, end):
-        center = ((start[0] + end[0]) // 2, (start[1] + end[1]) // 2)
-        axes = (abs(end[0]-start[0])//2, abs(end[1]-start[1])//2)
-        cv2.ellipse(self.tmp_image, center, axes, 0, 0, 360, (255,0,0), 1)
-        self.show_image()
-
-
-    def add_annotation_into_listbox(self, annotation_text):
-        self.right_controller.add_annotation_into_listbox(annotation_text)
-
-
-    def add_file_into_listbox(self, content, at=tk.END):
-        self.right_controller.add_file_into_listbox(content, at=at)
-
-
-    def get_size_of_listbox(self, type):
-        return self.right_controller.get_listbox_size(type)
-
-
-    def get_annotation_from_listbox(self, index):
-        return self.right_controller.get_annotation_from_listbox(index)
-
-
-    def get_annotation_color(self, annotation_text):
-        colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255),
-                  (255, 255, 0), (255, 0, 255), (0, 255, 255)]
-        if annotation_text in self.annotations:
-            return self.annotations[annotation_text]["color"]
-        else:
-            return colors[len(self.annotations) % len(colors)]
-
-
-    def clear_image_panel(self):
-        self.center_controller.clear_image_panel()
-
-
-    def add_files_via_drag_and_drop(self, event):
-        new_files = self.root.tk.splitlist(event.data)
-
+import os
+import tkinter as tk
+from tkinter import messagebox
+
+from presentation.controller.left_frame_controller import LeftFrameController
+from presentation.controller.right_frame_controller import RightFrameController
+from presentation.controller.center_frame_controller import CenterFrameController
+from presentation.controller.grid_controller import GridController
+from render.frame import render_frame
+from render.view_transform import ViewTransform
+from app.shortcuts import setup_shortcuts
+from service.annotation_store import JsonAnnotationStore
+from service.decode_cache import DecodeCache
+from service.history import AnnotationHistory, DeleteShape, snapshot_annotations
+from service.image_io import to_bgr
+from service.journal import SessionJournal, default_journal_path, pending_operations, read_journal, replay_file
+from service.lazy_import import lazy_import
+from service.perf import PERF, timed
+
+# Imported on first use so the window can appear before them
+Image = lazy_import("PIL.Image")
+ImageTk = lazy_import("PIL.ImageTk")
+cv2 = lazy_import("cv2")
+
+class ImageLabelingApp:
+    def __init__(self, root, store=None, perf_stats_path=None, save_masks=True, mask_compression=None):
+        self.root = root
+        self.store = store if store is not None else JsonAnnotationStore()  # Annotation persistence backend
+        self.save_masks = save_masks  # False: save geometry only; masks are rebuilt from it when needed
+        self.mask_compression = mask_compression  # PNG level of saved masks; None is OpenCV's default
+        self.perf_stats_path = perf_stats_path  # Where timing stats are written on exit, if enabled
+
+        # File and image variables
+        self.file_list = []  # Loaded file paths
+        self.current_file_path = None
+        self.current_image = None  # Original image (single-channel for DICOM), read-only
+        self.adjusted_image = None  # Adjusted for brightness/sharpness
+        self.tmp_image = None  # Temporary image for display; BGR once annotations are drawn
+        self.original_image_size = None
+        self.decode_cache = DecodeCache(self.store)  # Decoded slices shared by the views
+
+        # Annotations
+        self.annotations = {}  # {name: {"color": (B, G, R), "shapes": [...]}}
+        self.annotations_per_file = {}  # Annotations by file
+        self.histories = {}  # Undo/redo history by file
+        self.journal = None  # Autosave journal for crash recovery
+        self.journaled_files = set()  # Files whose base state is already in the journal
+        self.drawing_mode = None  # "polygon", "ellipse", or "normal"
+        self.points = []  # Temporary points when drawing
+        self.selected_annotation = None
+        self.selected_shape_index = None
+        self.hovered_shape = None  # (name, index) filled in the frame on screen by hover
+
+        # Edit (normal) mode
+        self.normal_mod_mode = None  # "move", "resize", "rotate"
+        self.normal_mod_vertex = None  # "top", "bottom", etc.
+        self.normal_mod_start_mouse = None
+        self.normal_mod_start_params = None  # (center, axes, angle)
+        self.normal_mod_start_shape = None  # Shape dict before the edit, for undo
+
+        # Drawing mode
+        self.is_drawing = False
+        self.start_point = None  # For ellipse drawing
+        self.stroke_preview = None  # Closed-curve stroke drawn incrementally
+
+        self.left_controller = LeftFrameController(self, root)
+        self.right_controller = RightFrameController(self, root)
+        self.center_controller = CenterFrameController(self, root)
+        self.grid_controller = GridController(self, root, self.center_controller.view)
+
+        setup_shortcuts(self)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.recover_session()
+
+
+    def on_close(self):
+        # Only --perf writes stats; the F12 overlay alone leaves nothing behind
+        if self.perf_stats_path:
+            PERF.print_summary()
+            try:
+                PERF.export(self.perf_stats_path)
+                print(f"[INFO] Performance stats written to {self.perf_stats_path}")
+            except OSError as e:
+                print(f"[ERROR] Failed to write performance stats: {e}")
+        self.decode_cache.shutdown()
+        if self.journal is not None:
+            self.journal.close()
+        if hasattr(self.store, "close"):
+            self.store.close()
+        self.root.destroy()
+
+
+    def recover_session(self):
+        journal_path = default_journal_path()
+        try:
+            pending = pending_operations(read_journal(journal_path))
+        except Exception as e:
+            print(f"[ERROR] Failed to read session journal: {e}")
+            pending = {}
+
+        restore = bool(pending) and messagebox.askyesno(
+            "Restore Session",
+            f"Unsaved annotations from a previous session were found for {len(pending)} file(s). Do you want to restore them?")
+        if not restore:
+            # Start a fresh journal; nothing in the old one is kept
+            os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+            open(journal_path, "w").close()
+        self.journal = SessionJournal(journal_path)
+        if not restore:
+            return
+
+        restored = []
+        for file_path, records in pending.items():
+            if not os.path.exists(file_path):
+                print(f"[INFO] Skipping recovery of missing file: {file_path}")
+                continue
+            try:
+                annotations, history = replay_file(records)
+            except Exception as e:
+                print(f"[ERROR] Failed to recover annotations for {file_path}: {e}")
+                continue
+            self.annotations_per_file[file_path] = annotations
+            self.histories[file_path] = history
+            self.journaled_files.add(file_path)
+            if file_path not in self.file_list:
+                self.file_list.append(file_path)
+                self.add_file_into_listbox(self.right_controller.file_display_name(file_path))
+            restored.append(file_path)
+        print(f"[INFO] Restored unsaved annotations for {len(restored)} file(s).")
+
+        if restored:
+            self.right_controller.select_file(self.file_list.index(restored[0]))
+
+
+    def journal_command(self, command, base):
+        """
+        Journal a command that was just applied.
+
+        Args:
+            base (dict): Annotations before the command, written first if the file has no
+                records yet; None if it already has
+        """
+        if self.journal is None:
+            return
+        if self.current_file_path not in self.journaled_files:
+            self.journal.append("base", self.current_file_path, annotations=base)
+            self.journaled_files.add(self.current_file_path)
+        self.journal.append("do", self.current_file_path, command=command)
+
+
+    def journal_saved(self, file_path):
+        if self.journal is not None and file_path in self.journaled_files:
+            self.journal.append("saved", file_path)
+
+
+    def journal_reset(self):
+        if self.journal is not None:
+            self.journal.append("reset")
+        self.journaled_files.clear()
+
+
+    def journal_discard(self, file_path):
+        if self.journal is not None and file_path in self.journaled_files:
+            self.journal.append("discard", file_path)
+        self.journaled_files.discard(file_path)
+    
+    
+    @timed("update_display", frame=True)
+    def update_display(self, apply_adjustments=True, redraw_annotations=True):
+        if self.current_image is None:
+            self.tmp_image = None
+            self.center_controller.clear_image_panel()
+            self.drawing_mode = None
+            return
+        
+        if apply_adjustments:
+            self.adjusted_image = self.left_controller.adjust_brightness_and_sharpness(self.current_image)
+
+        panel_size = self.get_image_panel_size()
+
+        self.tmp_image = cv2.resize(self.adjusted_image, panel_size)
+
+        if redraw_annotations:
+            self.redraw_annotations()  # Shows the frame itself
+        else:
+            self.show_image()
+
+
+    def show_image(self):
+        if self.tmp_image is None:
+            return
+        
+        self.show_image_with_tmp(self.tmp_image)
+
+        
+    def delete_selected_file(self, event):
+        selection = self.right_controller.get_file_list_curselection
+        if not selection:
+            return
+        
+        index = selection[0]
+        file_to_remove = self.file_list[index]
+        self.right_controller.delete_selected_file_from_listbox(index)
+        del self.file_list[index]
+        # Its unsaved edits go with it, so the next start does not offer to restore them
+        self.annotations_per_file.pop(file_to_remove, None)
+        self.histories.pop(file_to_remove, None)
+        self.journal_discard(file_to_remove)
+        print(f"Removed: {file_to_remove}")
+        
+        self.current_file_path = None
+        self.current_image = None
+        self.annotations.clear()
+        self.right_controller.delete_selected_annotation_from_listbox()
+        self.clear_image_panel()
+        print("Image panel and annotation list cleared.")
+
+
+    def delete_file_from_listbox(self, first=None):
+        self.right_controller.delete_selected_file_from_listbox(first)
+
+
+    def delete_selected_annotation(self, event=None):
+        if self.selected_annotation is not None:
+            self.execute_command(DeleteShape(self.selected_annotation, self.selected_shape_index))
+            self.selected_annotation = None
+            self.selected_shape_index = None
+            self.update_display(apply_adjustments=False, redraw_annotations=True)
+
+
+    @property
+    def history(self):
+        if self.current_file_path not in self.histories:
+            self.histories[self.current_file_path] = AnnotationHistory()
+        return self.histories[self.current_file_path]
+
+
+    def execute_command(self, command):
+        base = None
+        if self.journal is not None and self.current_file_path not in self.journaled_files:
+            base = snapshot_annotations(self.annotations)
+        # Applied first: apply() fills in fields (AddShape.index, DeleteShape.shape_data) the record needs
+        self.history.execute(command, self.annotations)
+        self.journal_command(command, base)
+        self.sync_annotation_listbox()
+
+
+    def record_command(self, command):
+        base = None
+        if self.current_file_path not in self.journaled_files:
+            # The command is already applied; the journal base must be the state before it
+            base = snapshot_annotations(self.annotations)
+            command.revert(base)
+        self.journal_command(command, base)
+        self.history.push(command)
+
+
+    def undo(self, event=None):
+        if self.current_image is None or self.is_drawing:
+            return
+        command = self.history.undo(self.annotations)
+        if command is None:
+            print("Nothing to undo.")
+            return
+        if self.journal is not None:
+            self.journal.append("undo", self.current_file_path)
+        self.after_history_change()
+        print(f"Undo: {type(command).__name__}")
+
+
+    def redo(self, event=None):
+        if self.current_image is None or self.is_drawing:
+            return
+        command = self.history.redo(self.annotations)
+        if command is None:
+            print("Nothing to redo.")
+            return
+        if self.journal is not None:
+            self.journal.append("redo", self.current_file_path)
+        self.after_history_change()
+        print(f"Redo: {type(command).__name__}")
+
+
+    def after_history_change(self):
+        self.selected_annotation = None
+        self.selected_shape_index = None
+        self.sync_annotation_listbox()
+        self.update_display(apply_adjustments=False, redraw_annotations=True)
+
+
+    def sync_annotation_listbox(self):
+        names = list(self.annotations.keys())
+        size = self.right_controller.get_listbox_size("annotation")
+        if [self.right_controller.get_annotation_from_listbox(i) for i in range(size)] == names:
+            return
+        self.right_controller.delete_selected_annotation_from_listbox()
+        for name in names:
+            self.right_controller.add_annotation_into_listbox(name)
+
+
+    def show_image_with_tmp(self, tmp_image):
+        self.hovered_shape = None  # A new frame drops any hover fill; move_on_image sets it again
+        if tmp_image.ndim == 2:
+            img_pil = Image.fromarray(tmp_image)
+        else:
+            img_pil = Image.fromarray(cv2.cvtColor(tmp_image, cv2.COLOR_BGR2RGB))
+        img_tk = ImageTk.PhotoImage(image=img_pil)
+
+        self.center_controller.show_in_image_panel(img_tk)
+
+
+    def get_image_panel_size(self):
+        return self.center_controller.get_image_panel_size()
+
+
+    def get_filter_slider_value(self):
+        return self.left_controller.get_filter_slider_value()
+
+
+    def set_slider_value(self, value={"brightness":50, "sharpness":0}):
+        self.left_controller.set_slider_value(value)
+
+
+    @timed("redraw_annotations")
+    def redraw_annotations(self):
+        if self.tmp_image is None:
+            return
+        self.tmp_image = render_frame(self.tmp_image, self.annotations, self.view_transform())
+        self.show_image()
+
+
+    def view_transform(self):
+        return ViewTransform(self.original_image_size, self.get_image_panel_size())
+
+
+    def handle_ellipse(self, start, end):
+        center = ((start[0] + end[0]) // 2, (start[1] + end[1]) // 2)
+        axes = (abs(end[0]-start[0])//2, abs(end[1]-start[1])//2)
+        if self.tmp_image.ndim == 2:
+            self.tmp_image = to_bgr(self.tmp_image)
+        cv2.ellipse(self.tmp_image, center, axes, 0, 0, 360, (255,0,0), 1)
+        self.show_image()
+
+
+    def add_annotation_into_listbox(self, annotation_text):
+        self.right_controller.add_annotation_into_listbox(annotation_text)
+
+
+    def add_file_into_listbox(self, content, at=tk.END):
+        self.right_controller.add_file_into_listbox(content, at=at)
+
+
+    def refresh_file_listbox(self):
+        self.right_controller.refresh_file_listbox()
+
+
+    def get_size_of_listbox(self, type):
+        return self.right_controller.get_listbox_size(type)
+
+
+    def get_annotation_from_listbox(self, index):
+        return self.right_controller.get_annotation_from_listbox(index)
+
+
+    def get_annotation_color(self, annotation_text):
+        colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255),
+                  (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+        if annotation_text in self.annotations:
+            return self.annotations[annotation_text]["color"]
+        else:
+            return colors[len(self.annotations) % len(colors)]
+
+
+    def clear_image_panel(self):
+        self.center_controller.clear_image_panel()
+
+
+    def add_files_via_drag_and_drop(self, event):
+        new_files = self.root.tk.splitlist(event.data)
+
         self.right_controller.add_files_via_drag_and_drop(new_files)
\ No newline at end of file
@@ -1,35 +1,61 @@
-from tkinterdnd2 import DND_FILES
-
-def setup_shortcuts(app):
-    root = app.root
-    
-    
-    # Enable drag and drop support
-    root.drop_target_register(DND_FILES)
-    root.dnd_bind('<<Drop>>', app.add_files_via_drag_and_drop)
-
-    # Keyboard shortcuts for mode switching
-    # n: normal, e: ellipse, c: closed curve, p: polygon
-    root.bind("<Delete>", lambda event: handle_delete_key(app, event))
-    root.bind("<n>", lambda event: app.left_controller.set_drawing_mode("normal"))
-    root.bind("<e>", lambda event: app.left_controller.set_drawing_mode("ellipse"))
-    root.bind("<c>", lambda event: app.left_controller.set_drawing_mode("closed_curve"))
-    
-def handle_delete_key(app, event):
-    x, y = app.root.winfo_pointerx(), app.root.winfo_pointery()
-    widget_under = app.root.winfo_containing(x, y)
-    
-    if widget_under is None:
-        return
-    
-    if is_descendant(widget_under, app.right_controller.get_file_listbox):
-        app.delete_selected_file(event)
-    elif is_descendant(widget_under, app.center_controller.get_image_panel):
-        app.delete_selected_annotation(event)
-        
-def is_descendant(widget, parent):
-    while widget is not None:
-        if widget == parent:
-            return True
-        widget = widget.master
+import tkinter as tk
+
+from tkinterdnd2 import DND_FILES
+
+def setup_shortcuts(app):
+    root = app.root
+    
+    
+    # Enable drag and drop support
+    root.drop_target_register(DND_FILES)
+    root.dnd_bind('<<Drop>>', app.add_files_via_drag_and_drop)
+
+    # Keyboard shortcuts for mode switching
+    # n: normal, e: ellipse, c: closed curve, p: polygon
+    root.bind("<Delete>", lambda event: handle_delete_key(app, event))
+    root.bind("<n>", lambda event: app.left_controller.set_drawing_mode("normal"))
+    root.bind("<e>", lambda event: app.left_controller.set_drawing_mode("ellipse"))
+    root.bind("<c>", lambda event: app.left_controller.set_drawing_mode("closed_curve"))
+
+    # Slice grid
+    root.bind("<g>", app.grid_controller.toggle)
+    root.bind("<Escape>", lambda event: app.grid_controller.hide())
+
+    # Slice navigation: arrows step, Page Up/Down jump 10, u/U go to the next/previous unannotated file
+    for key, step in (("<Down>", 1), ("<Right>", 1), ("<Up>", -1), ("<Left>", -1), ("<Next>", 10), ("<Prior>", -10)):
+        root.bind(key, lambda event, step=step: handle_navigation_key(app, event, app.right_controller.step_file, step))
+    root.bind("<u>", lambda event: handle_navigation_key(app, event, app.right_controller.next_unannotated, 1))
+    root.bind("<U>", lambda event: handle_navigation_key(app, event, app.right_controller.next_unannotated, -1))
+
+    # Undo / redo
+    root.bind("<Control-z>", app.undo)
+    root.bind("<Control-y>", app.redo)
+    root.bind("<Control-Z>", app.redo)
+
+    # Frame-time/FPS overlay
+    root.bind("<F12>", app.center_controller.toggle_perf_overlay)
+    
+def handle_delete_key(app, event):
+    x, y = app.root.winfo_pointerx(), app.root.winfo_pointery()
+    widget_under = app.root.winfo_containing(x, y)
+    
+    if widget_under is None:
+        return
+    
+    if is_descendant(widget_under, app.right_controller.get_file_listbox):
+        app.delete_selected_file(event)
+    elif is_descendant(widget_under, app.center_controller.get_image_panel):
+        app.delete_selected_annotation(event)
+        
+def handle_navigation_key(app, event, navigate, step):
+    # Leave arrow keys to the widget when typing or moving through the annotation list
+    if isinstance(event.widget, (tk.Entry, tk.Listbox)):
+        return
+    navigate(step)
+        
+def is_descendant(widget, parent):
+    while widget is not None:
+        if widget == parent:
+            return True
+        widget = widget.master
     return False
\ No newline at end of file
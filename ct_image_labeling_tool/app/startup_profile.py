@@ -0,0 +1,64 @@
+import builtins
+import sys
+import threading
+import time
+
+
+class StartupProfiler:
+    """
+    Times the startup phases and the imports made on the way (--profile-startup).
+
+    builtins.__import__ is wrapped while profiling. The self time of each
+    newly loaded module (nested imports excluded) is added to its top-level
+    package, so the report shows which libraries the launch actually pays for.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last_mark = self.start
+        self.phases = []  # [(phase, seconds)]
+        self.package_times = {}  # {top-level package: seconds}
+        self.stack = []  # Time spent in nested imports, per active import
+        self.thread_id = threading.get_ident()
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or threading.get_ident() != self.thread_id:
+            return self.original_import(name, globals, locals, fromlist, level)
+        self.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self.stack.pop()
+            package = name.split(".")[0]
+            self.package_times[package] = self.package_times.get(package, 0.0) + elapsed - nested
+            if self.stack:
+                self.stack[-1] += elapsed
+
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_mark))
+        self.last_mark = now
+
+
+    def stop(self):
+        builtins.__import__ = self.original_import
+
+
+    def report(self, top=15):
+        self.stop()
+        print("[PROFILE] Startup phases:")
+        for phase, seconds in self.phases:
+            print(f"    {phase:<32}{seconds * 1000:8.1f} ms")
+        print(f"    {'total':<32}{(self.last_mark - self.start) * 1000:8.1f} ms")
+        print("[PROFILE] Import time by package (self time):")
+        ranked = sorted(self.package_times.items(), key=lambda item: item[1], reverse=True)
+        for package, seconds in ranked[:top]:
+            print(f"    {package:<32}{seconds * 1000:8.1f} ms")
+        deferred = [name for name in ("numpy", "cv2", "pydicom", "PIL") if name not in sys.modules]
+        if deferred:
+            print(f"[PROFILE] Not imported yet (loaded on first use): {', '.join(deferred)}")
@@ -0,0 +1,256 @@
+import os
+
+import tkinter as tk
+
+from render.frame import render_overview
+from render.view_transform import ViewTransform, thumbnail_size
+from service.lazy_import import lazy_import
+from service.perf import timed
+
+Image = lazy_import("PIL.Image")
+ImageTk = lazy_import("PIL.ImageTk")
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+TILE_SIDE = 192
+TILE_GAP = 6
+CAPTION_HEIGHT = 16
+POLL_MS = 40  # How often tiles still being decoded are checked for
+BACKGROUND = (32, 32, 32)
+PLACEHOLDER = (56, 56, 56)
+CURRENT_COLOR = (0, 255, 255)
+ANNOTATED_COLOR = (0, 200, 0)
+CAPTION_COLOR = (200, 200, 200)
+
+
+class GridController:
+    """
+    Grid of reduced slices with their annotations, shown in place of the image panel.
+
+    Tiles are cut from the DecodeCache pyramids. Slices that are not decoded
+    yet are queued on its pool, nearest to the current slice first, and drawn
+    as they arrive. The cache keeps the full-size image too, so clicking a
+    tile opens that slice without decoding it again.
+    """
+    def __init__(self, master, root, view):
+        self.master = master
+        self.root = root
+        self.view = view  # CenterFrame; the grid is drawn into its grid_panel
+        self.active = False
+        self.start = 0  # file_list index of the first tile
+        self.layout = None  # (columns, rows, width, height)
+        self.tiles = {}  # {path: (annotation key, tile)} of the visible tiles
+        self.waiting = []  # (file_list index, path) of visible slices still being decoded
+        self.poll_job = None
+        self.setup_ui_event()
+
+
+    def setup_ui_event(self):
+        panel = self.view.grid_panel
+        panel.bind("<Button-1>", self.click_on_grid)
+        panel.bind("<Configure>", self.on_resize)
+        panel.bind("<MouseWheel>", lambda event: self.scroll_rows(-1 if event.delta > 0 else 1))
+        panel.bind("<Button-4>", lambda event: self.scroll_rows(-1))
+        panel.bind("<Button-5>", lambda event: self.scroll_rows(1))
+
+
+    def toggle(self, event=None):
+        if self.active:
+            self.hide()
+        else:
+            self.show()
+
+
+    def show(self):
+        if self.active or not self.master.file_list:
+            return
+        self.active = True
+        self.view.image_panel.pack_forget()
+        self.view.grid_panel.pack(expand=True, fill=tk.BOTH)
+        self.root.update_idletasks()
+        self.layout = self.compute_layout()
+        self.center_on_current()
+        self.draw()
+
+
+    def hide(self, repaint=True):
+        if not self.active:
+            return
+        self.active = False
+        if self.poll_job is not None:
+            self.root.after_cancel(self.poll_job)
+            self.poll_job = None
+        self.master.decode_cache.cancel()
+        self.tiles = {}
+        self.view.grid_panel.pack_forget()
+        self.view.grid_panel.configure(image="")
+        self.view.grid_panel.image = None
+        self.view.image_panel.pack(expand=True, fill=tk.BOTH)
+        self.root.update_idletasks()
+        if repaint:
+            self.master.update_display(apply_adjustments=False, redraw_annotations=True)
+
+
+    def compute_layout(self):
+        width = max(self.view.grid_panel.winfo_width(), TILE_SIDE + 2 * TILE_GAP)
+        height = max(self.view.grid_panel.winfo_height(), TILE_SIDE + CAPTION_HEIGHT + 2 * TILE_GAP)
+        columns = max(1, (width - TILE_GAP) // (TILE_SIDE + TILE_GAP))
+        rows = max(1, (height - TILE_GAP) // (TILE_SIDE + CAPTION_HEIGHT + TILE_GAP))
+        return columns, rows, width, height
+
+
+    def on_resize(self, event):
+        if not self.active:
+            return
+        layout = self.compute_layout()
+        if layout != self.layout:
+            self.layout = layout
+            self.center_on_current()
+            self.draw()
+
+
+    def current_index(self):
+        if self.master.current_file_path in self.master.file_list:
+            return self.master.file_list.index(self.master.current_file_path)
+        return 0
+
+
+    def center_on_current(self):
+        columns, rows, _, _ = self.layout
+        self.start = (self.current_index() // columns - rows // 2) * columns
+        self.clamp_start()
+
+
+    def clamp_start(self):
+        columns, rows, _, _ = self.layout
+        total_rows = -(-len(self.master.file_list) // columns)
+        self.start = max(0, min(self.start, (total_rows - rows) * columns))
+
+
+    def scroll_rows(self, rows):
+        if not self.active:
+            return
+        start = self.start
+        self.start += rows * self.layout[0]
+        self.clamp_start()
+        if self.start != start:
+            self.draw()
+
+
+    def tile_origin(self, position):
+        columns = self.layout[0]
+        return (TILE_GAP + (position % columns) * (TILE_SIDE + TILE_GAP),
+                TILE_GAP + (position // columns) * (TILE_SIDE + CAPTION_HEIGHT + TILE_GAP))
+
+
+    def tile_at(self, x, y):
+        """file_list index of the tile under a grid panel point, or None."""
+        columns, rows, _, _ = self.layout
+        column = (x - TILE_GAP) // (TILE_SIDE + TILE_GAP)
+        row = (y - TILE_GAP) // (TILE_SIDE + CAPTION_HEIGHT + TILE_GAP)
+        if not (0 <= column < columns and 0 <= row < rows):
+            return None
+        index = self.start + row * columns + column
+        return index if index < len(self.master.file_list) else None
+
+
+    def tile_annotations(self, path, entry):
+        """Annotations to overlay: the edited state if the file was opened, else the saved one."""
+        if path == self.master.current_file_path:
+            return self.master.annotations
+        if path in self.master.annotations_per_file:
+            return self.master.annotations_per_file[path]
+        return entry.annotations
+
+
+    def render_tile(self, path):
+        """
+        Returns:
+            tuple: (annotation key, tile) with the BGR tile's longest side TILE_SIDE,
+            or None if the slice is not decoded yet
+        """
+        entry = self.master.decode_cache.get(path)
+        if entry is None:
+            return None
+        annotations = self.tile_annotations(path, entry)
+        # Shape dicts are replaced on edit, so the shape lists identify the overlay
+        key = [(name, data["color"], tuple(data["shapes"])) for name, data in annotations.items()]
+        cached = self.tiles.get(path)
+        if cached is not None and cached[0] == key:
+            return cached
+        transform = ViewTransform(entry.size, thumbnail_size(entry.size, TILE_SIDE))
+        small = cv2.resize(entry.level_for(TILE_SIDE), transform.display_size, interpolation=cv2.INTER_AREA)
+        tile = render_overview(small, annotations, transform)
+        if tile.ndim == 2:
+            tile = cv2.cvtColor(tile, cv2.COLOR_GRAY2BGR)
+        return key, tile
+
+
+    @timed("draw_grid")
+    def draw(self):
+        columns, rows, width, height = self.layout
+        file_list = self.master.file_list
+        visible = list(range(self.start, min(self.start + columns * rows, len(file_list))))
+        current = self.master.current_file_path
+        canvas = np.full((height, width, 3), BACKGROUND, dtype=np.uint8)
+        self.waiting = []
+        tiles = {}
+
+        for position, index in enumerate(visible):
+            path = file_list[index]
+            x, y = self.tile_origin(position)
+            rendered = self.render_tile(path)
+            annotated = False
+            if rendered is not None:
+                tiles[path] = rendered
+                key, tile = rendered
+                annotated = any(shapes for _, _, shapes in key)
+                tile_h, tile_w = tile.shape[:2]
+                ox, oy = x + (TILE_SIDE - tile_w) // 2, y + (TILE_SIDE - tile_h) // 2
+                canvas[oy:oy + tile_h, ox:ox + tile_w] = tile
+            else:
+                cv2.rectangle(canvas, (x, y), (x + TILE_SIDE - 1, y + TILE_SIDE - 1), PLACEHOLDER, -1)
+                if self.master.decode_cache.has_failed(path):
+                    cv2.putText(canvas, "unreadable", (x + 8, y + TILE_SIDE // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                                0.45, CAPTION_COLOR, 1, cv2.LINE_AA)
+                else:
+                    self.waiting.append((index, path))
+            if path == current:
+                cv2.rectangle(canvas, (x - 3, y - 3), (x + TILE_SIDE + 2, y + TILE_SIDE + CAPTION_HEIGHT), CURRENT_COLOR, 2)
+            caption = f"{index + 1} {os.path.basename(path)}"[:TILE_SIDE // 7]
+            cv2.putText(canvas, caption, (x + 2, y + TILE_SIDE + CAPTION_HEIGHT - 4), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.4, ANNOTATED_COLOR if annotated else CAPTION_COLOR, 1, cv2.LINE_AA)
+        self.tiles = tiles
+
+        image = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)))
+        self.view.grid_panel.configure(image=image)
+        self.view.grid_panel.image = image
+
+        if self.waiting:
+            # Nearest to the current slice first
+            anchor = self.current_index()
+            self.master.decode_cache.request([path for _, path in sorted(self.waiting, key=lambda item: abs(item[0] - anchor))])
+            if self.poll_job is None:
+                self.poll_job = self.root.after(POLL_MS, self.poll)
+
+
+    def poll(self):
+        self.poll_job = None
+        if not self.active:
+            return
+        cache = self.master.decode_cache
+        if any(cache.get(path) is not None or cache.has_failed(path) for _, path in self.waiting):
+            self.draw()
+        elif self.waiting:
+            self.poll_job = self.root.after(POLL_MS, self.poll)
+
+
+    def click_on_grid(self, event):
+        if not self.active:
+            return
+        index = self.tile_at(event.x, event.y)
+        if index is None:
+            return
+        # Opening the slice repaints the image panel, so don't paint the old one first
+        self.hide(repaint=False)
+        self.master.right_controller.select_file(index)
@@ -1,299 +1,406 @@
-import json
-import tkinter as tk
-from tkinter import filedialog, messagebox, simpledialog
-import os
-
-import cv2
-import numpy as np
-import pydicom
-
-from presentation.view.right_frame import RightFrame
-
-
-class RightFrameController:
-    def __init__(self, master, root):
-        self.master = master
-        self.file_settings = {}  # Per-file slider settings
-        
-        self.view = RightFrame(root)
-        self.setup_ui_event()
-
-
-    def setup_ui_event(self):
-        self.view.annotation_listbox.bind("<Double-Button-1>", self.edit_annotation_name)
-        self.view.file_listbox.bind("<<ListboxSelect>>", self.display_selected_image)
-        self.view.load_files_btn.config(command=self.load_files)
-
-
-    @property
-    def get_file_listbox(self):
-        return self.view.file_listbox
-
-
-    @property
-    def get_file_list_curselection(self):
-        return self.view.file_listbox.curselection()
-
-
-    def get_listbox_size(self, type):
-        """
-        Get listbox size from view.
-
-        Args:
-            type (str): {"annotation" or "file"}
-
-        Returns:
-            int: The size of the selected type's listbox
-        """
-        if type == "annotation":
-            return self.view.annotation_listbox.size()
-        elif type == "file":
-            return self.view.file_listbox.size()
-        else:
-            print("The type is invalid. It can only be annotation or file. Please check your value again.")
-            return 0
-        
-
-
-    def get_annotation_from_listbox(self, index):
-        return self.view.annotation_listbox.get(index)
-
-
-    def add_annotation_into_listbox(self, annotation_text, index=tk.END):
-        self.view.annotation_listbox.insert(index, annotation_text)
-
-
-    def add_file_into_listbox(self, content, at=tk.END):
-        self.view.file_listbox.insert(at, content)
-
-
-    def delete_selected_file_from_listbox(self, first=None):
-        """
-        Delete annotation form listbox
-
-        Args:
-            index (int): {index} if index == None delete all
-        """
-        if first == None:
-            self.view.file_listbox.delete(0, tk.END)
-        else:
-            self.view.file_listbox.delete(first)
-
-
-    def delete_selected_annotation_from_listbox(self, first=None):
-        """
-        Delete annotation form listbox
-
-        Args:
-            index (int): {index} if index == None delete all
-        """
-        if first == None:
-            self.view.annotation_listbox.delete(0, tk.END)
-        else:
-            self.view.annotation_listbox.delete(first)
-
-
-    def load_files(self):
-        file_paths = filedialog.askopenfilenames(filetypes=[("Image files", "*.png;*.jpg;*.jpeg;*.dcm"), ("All files", "*.*")])
-        if file_paths:
-            unsaved = {file: data for file, data in self.master.annotations_per_file.items() if data and not os.path.exists(os.path.splitext(file)[0] + ".json")}
-            if unsaved:
-                response = messagebox.askyesno("Warning", "There are unsaved annotations for some files. Do you want to discard them?")
-                if response:
-                    for file in unsaved.keys():
-                        del self.master.annotations_per_file[file]
-                    self.master.annotations.clear()
-                    self.master.current_file_path = None
-                    self.master.current_image = None
-                    self.master.clear_image_panel()
-
-                    self.delete_selected_file_from_listbox()
-                    print("[INFO] Unsaved annotations discarded.")
-                else:
-                    print("[INFO] File load cancelled.")
-                    return
-            self.master.annotations_per_file.clear()
-            self.master.annotations.clear()
-            self.master.current_file_path = None
-            self.master.current_image = None
-            self.master.clear_image_panel()
-
-            self.delete_selected_annotation_from_listbox()
-            self.master.file_list = list(file_paths)
-            self.delete_selected_file_from_listbox()
-
-            for file in self.master.file_list:
-                file_name = os.path.basename(file)
-                json_file_path = os.path.splitext(file)[0] + ".json"
-                if os.path.exists(json_file_path):
-                    display_name = f"{file_name} ✅"
-                    self.load_annotations_from_json(json_file_path)
-                    self.master.annotations_per_file[file] = self.master.annotations.copy()
-                else:
-                    display_name = file_name
-                self.add_file_into_listbox(display_name)
-
-            if self.master.file_list:
-                self.master.current_file_path = self.master.file_list[0]
-                self.master.current_image = self.load_image(self.master.file_list[0])
-                self.adjusted_image = self.master.current_image.copy()
-                if self.master.current_file_path in self.file_settings:
-                    settings = self.file_settings[self.master.current_file_path]
-                    self.master.set_slider_value({"brightness":settings["brightness"], "sharpness":settings["sharpness"]})
-                else:
-                    self.master.set_slider_value()
-                    pass
-                self.master.update_display()
-            else:
-                self.master.current_file_path = None
-                self.master.current_image = None
-                self.master.annotations.clear()
-                self.master.clear_image_panel()
-
-                self.delete_selected_annotation_from_listbox()
-                print("No files loaded.")
-
-
-    def add_files_via_drag_and_drop(self, new_files):
-        for file in new_files:
-            if file not in self.master.file_list:
-                self.master.file_list.append(file)
-                file_name = os.path.basename(file)
-                json_file_path = os.path.splitext(file)[0] + ".json"
-                display_name = f"{file_name} ✅" if os.path.exists(json_file_path) else file_name
-                self.add_file_into_listbox(display_name)
-        print(f"Files added via drag-and-drop: {new_files}")
-        
-        if self.master.file_list and self.master.current_image is None:
-            self.master.current_file_path = self.master.file_list[0]
-            self.master.current_image = self.load_image(self.master.current_file_path)
-            self.master.adjusted_image = self.master.current_image.copy()
-            json_file_path = os.path.splitext(self.master.current_file_path)[0] + ".json"
-            if os.path.exists(json_file_path):
-                print(f"[INFO] JSON file found for {self.master.current_file_path}")
-                self.load_annotations_from_json(json_file_path)
-            else:
-                self.master.annotations.clear()
-            self.delete_selected_annotation_from_listbox()
-            for name in self.master.annotations.keys():
-                self.view.annotation_listbox.insert(tk.END, name)
-            self.master.update_display(apply_adjustments=False, redraw_annotations=True)
-
-
-    def edit_annotation_name(self, event):
-        selection = self.view.annotation_listbox.curselection()
-        if not selection:
-            return
-        index = selection[0]
-        old_name = self.view.annotation_listbox.get(index)
-        new_name = simpledialog.askstring("Rename Annotation", "Enter new annotation name:", initialvalue=old_name)
-        if new_name and new_name.strip():
-            new_name = new_name.strip()
-            if new_name in self.master.annotations:
-                messagebox.showerror("Error", "Annotation with this name already exists.")
-                return
-            self.master.annotations[new_name] = self.master.annotations.pop(old_name)
-            self.delete_selected_annotation_from_listbox(index)
-            self.view.annotation_listbox.insert(index, new_name)
-            print(f"Annotation renamed from {old_name} to {new_name}")
-
-
-    def display_selected_image(self, event):
-        selection = self.view.file_listbox.curselection()
-        if selection:
-            file_path = self.master.file_list[selection[0]]
-            if self.master.current_file_path:
-                self.file_settings[self.master.current_file_path] = self.master.get_filter_slider_value()
-                self.master.annotations_per_file[self.master.current_file_path] = self.master.annotations.copy()
-            self.master.current_file_path = file_path
-            self.master.current_image = self.load_image(file_path)
-            if self.master.current_image is None:
-                print(f"Error: Failed to load {file_path}")
-                return
-            json_file_path = os.path.splitext(file_path)[0] + ".json"
-            if os.path.exists(json_file_path):
-                print(f"[INFO] JSON file found: {json_file_path}")
-                try:
-                    self.load_annotations_from_json(json_file_path)
-                    self.master.annotations_per_file[file_path] = self.master.annotations.copy()
-                except Exception as e:
-                    print(f"[ERROR] Failed to load annotations from JSON: {e}")
-            else:
-                print(f"[INFO] No JSON file found for {file_path}")
-                if file_path in self.master.annotations_per_file:
-                    self.master.annotations = self.master.annotations_per_file[file_path].copy()
-                    print(f"[INFO] Restored annotations from memory for {file_path}")
-                else:
-                    self.master.annotations.clear()
-            self.delete_selected_annotation_from_listbox()
-            for name in self.master.annotations.keys():
-                self.view.annotation_listbox.insert(tk.END, name)
-            if file_path in self.file_settings:
-                settings = self.file_settings[file_path]
-                self.master.set_slider_value({"brightness":settings["brightness"], "sharpness":settings["sharpness"]})
-            else:
-                self.master.set_slider_value()
-            self.master.adjusted_image = self.master.current_image.copy()
-            self.master.update_display(apply_adjustments=False, redraw_annotations=True)
-        else:
-            print("No file selected from the listbox.")
-
-
-    def load_image(self, file_path):
-        self.master.current_file_path = file_path
-        if file_path.endswith(".dcm"):
-            ds = pydicom.dcmread(file_path)
-            img = ds.pixel_array
-            img = cv2.normalize(img, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-        else:
-            img = cv2.imread(file_path, cv2.IMREAD_COLOR)
-        self.master.original_image_size = (img.shape[1], img.shape[0])
-        return img
-
-
-    def load_annotations_from_json(self, json_file):
-        try:
-            with open(json_file, "r") as file:
-                data = json.load(file)
-                print(f"[INFO] Loaded JSON data from: {json_file}")
-            self.master.annotations.clear()
-            for annotation in data.get("annotations", []):
-                name = annotation["name"]
-                shape = annotation["shape"]
-                color = tuple(annotation["color"])
-                mask = annotation.get("mask")
-                orig_size = annotation.get("orig_size", self.master.original_image_size)
-                if shape == "ellipse":
-                    if "center" in annotation and "axes" in annotation and "angle" in annotation:
-                        shape_data = {
-                            "shape": "ellipse",
-                            "center": annotation["center"],
-                            "axes": annotation["axes"],
-                            "angle": annotation["angle"],
-                            "mask": mask,
-                            "image_size": orig_size
-                        }
-                    else:
-                        points = annotation["points"]
-                        shape_data = {
-                            "shape": "ellipse",
-                            "points": points,
-                            "mask": mask,
-                            "image_size": orig_size
-                        }
-                else:
-                    points = annotation["points"]
-                    shape_data = {
-                        "shape": shape,
-                        "points": points,
-                        "mask": mask,
-                        "image_size": orig_size
-                    }
-                if name not in self.master.annotations:
-                    self.master.annotations[name] = {"color": color, "shapes": []}
-                    self.view.annotation_listbox.insert(tk.END, name)
-                self.master.annotations[name]["shapes"].append(shape_data)
-            print("[INFO] Annotations loaded successfully.")
-        except Exception as e:
-            print(f"[ERROR] Failed to load JSON annotations: {e}")
\ No newline at end of file
+import tkinter as tk
+from tkinter import filedialog, messagebox, simpledialog
+import os
+
+from presentation.view.right_frame import RightFrame
+from service.dicom_index import DicomIndex
+from service.image_io import IMAGE_EXTENSIONS
+from service.history import RenameLabel, snapshot_annotations
+from service.perf import timed
+from service.prefetch import SlicePrefetcher
+
+
+class RightFrameController:
+    def __init__(self, master, root):
+        self.master = master
+        self.root = root
+        self.file_settings = {}  # Per-file slider settings
+        self.dicom_index = None  # Created on first load; reads the header cache from disk
+        self.series_labels = {}  # Shown in the file list when more than one series is loaded
+        self.prefetcher = SlicePrefetcher(master.decode_cache)
+        self.nav_target = None  # file_list index keyboard navigation is heading to
+        self.nav_job = None  # Pending after_idle that opens nav_target
+        
+        self.view = RightFrame(root)
+        self.setup_ui_event()
+
+
+    def setup_ui_event(self):
+        self.view.annotation_listbox.bind("<Double-Button-1>", self.edit_annotation_name)
+        self.view.file_listbox.bind("<<ListboxSelect>>", self.display_selected_image)
+        # Route the listbox's own arrow keys through the coalesced navigation
+        self.view.file_listbox.bind("<Down>", lambda event: self.step_file(1) or "break")
+        self.view.file_listbox.bind("<Up>", lambda event: self.step_file(-1) or "break")
+        self.view.load_files_btn.config(command=self.load_files)
+
+
+    @property
+    def get_file_listbox(self):
+        return self.view.file_listbox
+
+
+    @property
+    def get_file_list_curselection(self):
+        return self.view.file_listbox.curselection()
+
+
+    def get_listbox_size(self, type):
+        """
+        Get listbox size from view.
+
+        Args:
+            type (str): {"annotation" or "file"}
+
+        Returns:
+            int: The size of the selected type's listbox
+        """
+        if type == "annotation":
+            return self.view.annotation_listbox.size()
+        elif type == "file":
+            return self.view.file_listbox.size()
+        else:
+            print("The type is invalid. It can only be annotation or file. Please check your value again.")
+            return 0
+        
+
+
+    def get_annotation_from_listbox(self, index):
+        return self.view.annotation_listbox.get(index)
+
+
+    def add_annotation_into_listbox(self, annotation_text, index=tk.END):
+        self.view.annotation_listbox.insert(index, annotation_text)
+
+
+    def add_file_into_listbox(self, content, at=tk.END):
+        self.view.file_listbox.insert(at, content)
+
+
+    def delete_selected_file_from_listbox(self, first=None):
+        """
+        Delete annotation form listbox
+
+        Args:
+            index (int): {index} if index == None delete all
+        """
+        if first == None:
+            self.view.file_listbox.delete(0, tk.END)
+        else:
+            self.view.file_listbox.delete(first)
+
+
+    def delete_selected_annotation_from_listbox(self, first=None):
+        """
+        Delete annotation form listbox
+
+        Args:
+            index (int): {index} if index == None delete all
+        """
+        if first == None:
+            self.view.annotation_listbox.delete(0, tk.END)
+        else:
+            self.view.annotation_listbox.delete(first)
+
+
+    def load_files(self):
+        file_paths = filedialog.askopenfilenames(filetypes=[("Image files", ";".join("*" + ext for ext in IMAGE_EXTENSIONS)), ("All files", "*.*")])
+        if file_paths:
+            unsaved = {file: data for file, data in self.master.annotations_per_file.items() if data and not self.master.store.exists(file)}
+            if unsaved:
+                response = messagebox.askyesno("Warning", "There are unsaved annotations for some files. Do you want to discard them?")
+                if response:
+                    for file in unsaved.keys():
+                        del self.master.annotations_per_file[file]
+                    self.master.annotations.clear()
+                    self.master.current_file_path = None
+                    self.master.current_image = None
+                    self.master.clear_image_panel()
+
+                    self.delete_selected_file_from_listbox()
+                    print("[INFO] Unsaved annotations discarded.")
+                else:
+                    print("[INFO] File load cancelled.")
+                    return
+            self.master.annotations_per_file.clear()
+            self.master.histories.clear()
+            self.master.decode_cache.clear()
+            self.prefetcher.reset()
+            self.master.journal_reset()
+            self.master.annotations.clear()
+            self.master.current_file_path = None
+            self.master.current_image = None
+            self.master.clear_image_panel()
+
+            self.delete_selected_annotation_from_listbox()
+            self.master.file_list = self.sort_by_series(file_paths)
+            self.delete_selected_file_from_listbox()
+
+            # Saved annotations are only read when a file is opened
+            for file in self.master.file_list:
+                self.add_file_into_listbox(self.file_display_name(file))
+
+            if self.master.file_list:
+                self.master.current_file_path = self.master.file_list[0]
+                self.master.current_image = self.load_image(self.master.file_list[0])
+                self.load_annotations_for_file(self.master.current_file_path)
+                self.master.annotations_per_file[self.master.current_file_path] = snapshot_annotations(self.master.annotations)
+                self.master.sync_annotation_listbox()
+                self.adjusted_image = self.master.current_image.copy()
+                if self.master.current_file_path in self.file_settings:
+                    settings = self.file_settings[self.master.current_file_path]
+                    self.master.set_slider_value({"brightness":settings["brightness"], "sharpness":settings["sharpness"]})
+                else:
+                    self.master.set_slider_value()
+                    pass
+                self.master.update_display()
+                self.prefetcher.visit(self.master.file_list, 0)
+            else:
+                self.master.current_file_path = None
+                self.master.current_image = None
+                self.master.annotations.clear()
+                self.master.clear_image_panel()
+
+                self.delete_selected_annotation_from_listbox()
+                print("No files loaded.")
+
+
+    def sort_by_series(self, file_paths):
+        """
+        Group DICOM files per series and order each series anatomically (headers only).
+        """
+        if self.dicom_index is None:
+            self.dicom_index = DicomIndex()
+        groups = self.dicom_index.sort_files(list(file_paths))
+        series = [files for key, files in groups if key is not None]
+        self.series_labels = {}
+        if len(series) > 1:
+            for files in series:
+                label = self.dicom_index.series_label(files[0])
+                self.series_labels.update({file: label for file in files})
+        return [file for _, files in groups for file in files]
+
+
+    def add_files_via_drag_and_drop(self, new_files):
+        new_files = [file for file in new_files if file not in self.master.file_list]
+        old_labels = self.series_labels
+        ordered = self.sort_by_series(self.master.file_list + new_files)
+        new_set = set(new_files)
+        new_files = [file for file in ordered if file in new_set]
+        relabeled = any(old_labels.get(file) != self.series_labels.get(file) for file in self.master.file_list)
+        appended = ordered[:len(self.master.file_list)] == self.master.file_list
+        # file_list is kept in slice order, so dropped slices go to their anatomical position
+        self.master.file_list[:] = ordered
+        if relabeled or not appended:
+            self.refresh_file_listbox()
+            current = self.current_index()
+            if current is not None:
+                self.view.file_listbox.selection_set(current)
+                self.view.file_listbox.activate(current)
+                self.view.file_listbox.see(current)
+                # Indices shifted, so the last visit says nothing about direction
+                self.prefetcher.reset()
+                self.prefetcher.observe(current)
+            if self.master.grid_controller.active:
+                self.master.grid_controller.draw()
+        else:
+            for file in new_files:
+                self.add_file_into_listbox(self.file_display_name(file))
+        print(f"Files added via drag-and-drop: {new_files}")
+        
+        if self.master.file_list and self.master.current_image is None:
+            self.master.current_file_path = self.master.file_list[0]
+            self.master.current_image = self.load_image(self.master.current_file_path)
+            self.master.adjusted_image = self.master.current_image.copy()
+            if self.master.current_file_path in self.master.annotations_per_file:
+                self.master.annotations = snapshot_annotations(self.master.annotations_per_file[self.master.current_file_path])
+            elif self.master.store.exists(self.master.current_file_path):
+                print(f"[INFO] Saved annotations found for {self.master.current_file_path}")
+                self.load_annotations_for_file(self.master.current_file_path)
+            else:
+                self.master.annotations.clear()
+            self.master.sync_annotation_listbox()
+            self.master.update_display(apply_adjustments=False, redraw_annotations=True)
+            self.prefetcher.visit(self.master.file_list, 0)
+
+
+    def file_display_name(self, file):
+        file_name = os.path.basename(file)
+        if file in self.series_labels:
+            file_name = f"[{self.series_labels[file]}] {file_name}"
+        return f"{file_name} ✅" if self.master.store.exists(file) else file_name
+
+
+    def refresh_file_listbox(self):
+        self.delete_selected_file_from_listbox()
+        for file in self.master.file_list:
+            self.add_file_into_listbox(self.file_display_name(file))
+
+
+    def select_file(self, index):
+        self.open_file(index)
+
+
+    def current_index(self):
+        if self.master.current_file_path in self.master.file_list:
+            return self.master.file_list.index(self.master.current_file_path)
+        return None
+
+
+    def is_annotated(self, file_path):
+        """Annotated in memory (saved or not), or saved in the store if not opened yet."""
+        if file_path == self.master.current_file_path:
+            return bool(self.master.annotations)
+        if file_path in self.master.annotations_per_file:
+            return bool(self.master.annotations_per_file[file_path])
+        return self.master.store.exists(file_path)
+
+
+    def navigate_to(self, index):
+        """
+        Open a slice once pending events are handled.
+
+        Key repeats that arrive while a slice is being opened only move the
+        target, so holding an arrow key shows the latest slice at the rate
+        frames can be drawn instead of queueing one open per repeat.
+        """
+        self.nav_target = index
+        if self.nav_job is None:
+            self.nav_job = self.root.after_idle(self.flush_navigation)
+
+
+    def flush_navigation(self):
+        self.nav_job = None
+        index, self.nav_target = self.nav_target, None
+        if index is None or index == self.current_index():
+            return
+        self.master.grid_controller.hide(repaint=False)
+        current = self.current_index()
+        self.open_file(index, direction=None if current is None else (1 if index > current else -1))
+
+
+    def step_file(self, step):
+        """Open the slice step positions after (or before, if negative) the current one."""
+        if not self.master.file_list:
+            return
+        base = self.nav_target if self.nav_target is not None else self.current_index()
+        base = 0 if base is None else base
+        self.navigate_to(max(0, min(base + step, len(self.master.file_list) - 1)))
+
+
+    def next_unannotated(self, step=1):
+        """Open the nearest slice without annotations in the direction of step."""
+        if not self.master.file_list:
+            return
+        base = self.nav_target if self.nav_target is not None else self.current_index()
+        start = (-1 if step > 0 else len(self.master.file_list)) if base is None else base
+        indices = range(start + 1, len(self.master.file_list)) if step > 0 else range(start - 1, -1, -1)
+        for index in indices:
+            if not self.is_annotated(self.master.file_list[index]):
+                self.navigate_to(index)
+                return
+        print("[INFO] No unannotated file in that direction.")
+
+
+    def edit_annotation_name(self, event):
+        selection = self.view.annotation_listbox.curselection()
+        if not selection:
+            return
+        index = selection[0]
+        old_name = self.view.annotation_listbox.get(index)
+        new_name = simpledialog.askstring("Rename Annotation", "Enter new annotation name:", initialvalue=old_name)
+        if new_name and new_name.strip():
+            new_name = new_name.strip()
+            if new_name in self.master.annotations:
+                messagebox.showerror("Error", "Annotation with this name already exists.")
+                return
+            self.master.execute_command(RenameLabel(old_name, new_name))
+            if self.master.selected_annotation == old_name:
+                self.master.selected_annotation = new_name
+            print(f"Annotation renamed from {old_name} to {new_name}")
+
+
+    def display_selected_image(self, event):
+        selection = self.view.file_listbox.curselection()
+        if selection:
+            self.open_file(selection[0])
+        else:
+            print("No file selected from the listbox.")
+
+
+    def open_file(self, index, direction=None):
+        """
+        Make file_list[index] the current file: keep the state of the one being
+        left, then show the new one with its annotations and slider settings.
+
+        Args:
+            index (int): file_list index
+            direction (int): +1 or -1 when reached by keyboard navigation, for prefetching
+        """
+        file_path = self.master.file_list[index]
+        self.view.file_listbox.selection_clear(0, tk.END)
+        self.view.file_listbox.selection_set(index)
+        self.view.file_listbox.activate(index)
+        self.view.file_listbox.see(index)
+        if self.master.current_file_path:
+            self.file_settings[self.master.current_file_path] = self.master.get_filter_slider_value()
+            self.master.annotations_per_file[self.master.current_file_path] = snapshot_annotations(self.master.annotations)
+        self.master.current_file_path = file_path
+        self.master.current_image = self.load_image(file_path)
+        if self.master.current_image is None:
+            print(f"Error: Failed to load {file_path}")
+            return
+        self.master.selected_annotation = None
+        self.master.selected_shape_index = None
+        if file_path in self.master.annotations_per_file:
+            # In-memory state is newer than (or equal to) the saved one and matches the undo history
+            self.master.annotations = snapshot_annotations(self.master.annotations_per_file[file_path])
+            print(f"[INFO] Restored annotations from memory for {file_path}")
+        elif self.master.store.exists(file_path):
+            print(f"[INFO] Saved annotations found: {self.master.store.location(file_path)}")
+            self.load_annotations_for_file(file_path)
+            self.master.annotations_per_file[file_path] = snapshot_annotations(self.master.annotations)
+        else:
+            print(f"[INFO] No saved annotations found for {file_path}")
+            self.master.annotations = {}
+        self.delete_selected_annotation_from_listbox()
+        for name in self.master.annotations.keys():
+            self.view.annotation_listbox.insert(tk.END, name)
+        if file_path in self.file_settings:
+            settings = self.file_settings[file_path]
+            self.master.set_slider_value({"brightness":settings["brightness"], "sharpness":settings["sharpness"]})
+        else:
+            self.master.set_slider_value()
+        self.master.adjusted_image = self.master.current_image.copy()
+        self.master.update_display(apply_adjustments=False, redraw_annotations=True)
+        self.prefetcher.visit(self.master.file_list, index, direction)
+
+
+    def load_image(self, file_path):
+        """
+        Full-size image of a file, from the decode cache when the grid view
+        or prefetching already decoded it.
+        """
+        self.master.current_file_path = file_path
+        entry = self.master.decode_cache.load(file_path)
+        if entry is None:
+            return None
+        self.master.original_image_size = entry.size
+        return entry.image
+
+
+    @timed("load_annotations")
+    def load_annotations_for_file(self, file_path):
+        self.master.annotations.clear()
+        try:
+            # Parsed with the image (geometry only; masks are re-rasterized on save)
+            entry = self.master.decode_cache.load(file_path)
+            if entry is None:
+                return
+            annotations = self.master.decode_cache.saved_annotations(entry)
+            if not annotations:
+                return
+            print(f"[INFO] Loaded annotation data from: {self.master.store.location(file_path)}")
+            self.master.annotations.update(annotations)
+            print("[INFO] Annotations loaded successfully.")
+        except Exception as e:
+            print(f"[ERROR] Failed to load annotations: {e}")
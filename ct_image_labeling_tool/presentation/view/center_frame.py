@@ -1,13 +1,19 @@
-import tkinter as tk
-
-class CenterFrame(tk.Frame):
-    def __init__(self, master):
-        super().__init__(master)
-        self.master = master
-        self.pack(side=tk.TOP, padx=10, pady=10, expand=True, fill=tk.BOTH)
-        self.setup_gui()
-
-    def setup_gui(self):
-        # 이미지 패널
-        self.image_panel = tk.Label(self)
-        self.image_panel.pack(expand=True, fill=tk.BOTH)
\ No newline at end of file
+import tkinter as tk
+
+class CenterFrame(tk.Frame):
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+        self.pack(side=tk.TOP, padx=10, pady=10, expand=True, fill=tk.BOTH)
+        self.setup_gui()
+
+    def setup_gui(self):
+        # 이미지 패널
+        self.image_panel = tk.Label(self)
+        self.image_panel.pack(expand=True, fill=tk.BOTH)
+
+        # Slice grid; packed in place of the image panel while the grid view is open
+        self.grid_panel = tk.Label(self, bg="black")
+
+        # Frame-time/FPS overlay, placed over the image panel when enabled
+        self.perf_label = tk.Label(self, bg="black", fg="lime", font=("Courier", 9), anchor="w")
\ No newline at end of file
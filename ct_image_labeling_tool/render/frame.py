@@ -0,0 +1,119 @@
+from service.image_io import to_bgr
+from service.mask import PackedMask
+from service.lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+RENDER_VERSION = 2  # Bump when drawing output changes, so cached renders are not reused
+OUTLINE_THICKNESS = 1
+HIGHLIGHT_ALPHA = 0.3
+OVERLAY_ALPHA = 0.3
+
+
+def draw_shape(canvas, shape_data, color, transform, thickness=OUTLINE_THICKNESS):
+    """
+    Draw one annotation shape onto a display-size canvas, in place.
+
+    Args:
+        canvas (np.ndarray): Display buffer (BGR, or 2D for masks)
+        shape_data (dict): Shape in original-image coordinates
+        color: BGR tuple, or a scalar for 2D canvases
+        transform (ViewTransform): Original image -> canvas mapping
+        thickness (int): Outline width; -1 fills the shape
+    """
+    shape = shape_data["shape"]
+    if shape == "ellipse":
+        center, axes, angle = transform.display_ellipse(shape_data)
+        cv2.ellipse(canvas, center, axes, angle, 0, 360, color, thickness)
+    elif shape in ("polygon", "closed_curve"):
+        points = np.array(transform.display_points(shape_data["points"]), dtype=np.int32)
+        if thickness < 0:
+            cv2.fillPoly(canvas, [points], color)
+        else:
+            cv2.polylines(canvas, [points], isClosed=True, color=color, thickness=thickness)
+
+
+def shape_mask(shape_data, transform):
+    """Filled uint8 mask (255 inside) of a shape at display size."""
+    mask = np.zeros((transform.display_size[1], transform.display_size[0]), dtype=np.uint8)
+    draw_shape(mask, shape_data, 255, transform, thickness=-1)
+    return mask
+
+
+def blend_mask(canvas, mask, color, alpha=HIGHLIGHT_ALPHA):
+    """
+    Blend color into the masked pixels of canvas, in place.
+
+    Only the mask's bounding box is touched, so the cost follows the shape
+    size rather than the display size.
+    """
+    x, y, w, h = cv2.boundingRect(mask)
+    if w and h:
+        region = canvas[y:y + h, x:x + w]
+        weight = alpha * (mask[y:y + h, x:x + w, np.newaxis] / 255.0)
+        region[:] = region * (1 - weight) + np.asarray(color, dtype=float) * weight
+    return canvas
+
+
+def render_frame(image, annotations, transform, highlight=None, outlines=True, overlays=()):
+    """
+    Compose one display frame. Pure function of its inputs; no UI toolkit needed.
+
+    Args:
+        image (np.ndarray): Grayscale (2D) or BGR image, at original or display size
+        annotations (dict): {name: {"color": (B, G, R), "shapes": [...]}} in original-image pixels
+        transform (ViewTransform): Original image -> display mapping
+        highlight (tuple): Optional (name, shape_index) to fill with its label color
+        outlines (bool): Draw every shape's outline
+        overlays: Iterable of (PackedMask, color) tinted onto the frame; masks are in display pixels
+
+    Returns:
+        np.ndarray: Display-size frame. A grayscale input with nothing to draw comes back
+        2D and may be the input itself, so don't draw on it in place.
+    """
+    frame = image
+    if (image.shape[1], image.shape[0]) != transform.display_size:
+        frame = cv2.resize(image, transform.display_size)
+    overlays = list(overlays)
+    if not (outlines and annotations) and highlight is None and not overlays:
+        return frame
+
+    # Grayscale slices are promoted to color only here, at display size
+    if frame.ndim == 2 or frame is image:
+        frame = to_bgr(frame)
+    # Tints first so outlines stay crisp on top of them
+    for mask, color in overlays:
+        mask.overlay(frame, color, OVERLAY_ALPHA)
+    if outlines:
+        for data in annotations.values():
+            color = data["color"]
+            for shape_data in data["shapes"]:
+                draw_shape(frame, shape_data, color, transform)
+    if highlight is not None:
+        name, shape_index = highlight
+        data = annotations[name]
+        blend_mask(frame, shape_mask(data["shapes"][shape_index], transform), data["color"])
+    return frame
+
+
+def render_overview(image, annotations, transform, fill=True):
+    """
+    Small overlay of a slice for thumbnails and the grid view: shape outlines,
+    plus a tint of each shape's area when fill is set.
+
+    Shapes are drawn at the small resolution so outlines stay one pixel wide
+    instead of being averaged away by a downsample.
+
+    Args:
+        image (np.ndarray): Slice already reduced to transform.display_size
+        annotations (dict): {name: {"color": (B, G, R), "shapes": [...]}} in original-image pixels
+        transform (ViewTransform): Original image -> small image mapping
+        fill (bool): Tint shape interiors with the label color
+    """
+    overlays = []
+    if fill:
+        for data in annotations.values():
+            for shape_data in data["shapes"]:
+                overlays.append((PackedMask.from_array(shape_mask(shape_data, transform)), data["color"]))
+    return render_frame(image, annotations, transform, overlays=overlays)
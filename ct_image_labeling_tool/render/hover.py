@@ -0,0 +1,129 @@
+from service.lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+NO_BOX = (1, 1, 0, 0)  # x0 > x1: contains no point
+
+
+def ellipse_geometry(shape_data, transform):
+    """
+    Display-pixel hit-test parameters of an ellipse.
+
+    Center and axes are truncated to int like the drawn outline. Degenerate
+    ellipses (an axis of 0 px) get NaN axes, which no point satisfies.
+
+    Returns:
+        tuple: (cx, cy, a, b, cos, sin) of the rotation angle
+    """
+    (cx, cy), (a, b), angle = transform.display_ellipse(shape_data)
+    if a == 0 or b == 0:
+        a = b = np.nan
+    theta = np.radians(angle)
+    return (cx, cy, a, b, np.cos(theta), np.sin(theta))
+
+
+def ellipse_bounds(geometry):
+    """Inclusive display box of an ellipse, padded a pixel for rounding."""
+    cx, cy, a, b, cos, sin = geometry
+    if np.isnan(a):
+        return NO_BOX
+    half_w = np.hypot(a * cos, b * sin) + 1
+    half_h = np.hypot(a * sin, b * cos) + 1
+    return (cx - half_w, cy - half_h, cx + half_w, cy + half_h)
+
+
+class HoverIndex:
+    """
+    Display-space geometry of all shapes for hover hit-testing.
+
+    Per shape it caches the bounding box and either the ellipse parameters
+    (center, axes and the cos/sin of the angle) or the polygon as an int32
+    array. A cursor outside the union of the boxes is rejected at once, and
+    the ellipses whose box holds it are tested in one NumPy evaluation.
+
+    Callers pass the current annotations on every event; the cache is only
+    rebuilt when the view transform changes or a shape dict is added, removed
+    or replaced. Shape dicts are replaced rather than edited in place (see
+    ReplaceShape), and the index keeps references to the ones it was built
+    from, so identity is a safe change check.
+    """
+    def __init__(self):
+        self.transform = None
+        self.shapes = []  # [(name, index, shape_data)] in hit-test order
+        self.boxes = None  # float (N, 4): x0, y0, x1, y1
+        self.ellipses = None  # float (N, 6): cx, cy, a, b, cos, sin; NaN rows for other shapes
+        self.polygons = {}  # {row: int32 (K, 2) display points}
+        self.union = None  # (x0, y0, x1, y1) of all boxes, None if there are none
+
+
+    def is_current(self, shapes, transform):
+        return (transform == self.transform and len(shapes) == len(self.shapes)
+                and all(new[0] == old[0] and new[2] is old[2] for new, old in zip(shapes, self.shapes)))
+
+
+    def refresh(self, annotations, transform):
+        """Rebuild the cached geometry if the annotations or the transform changed."""
+        shapes = [(name, index, shape_data) for name, data in annotations.items()
+                  for index, shape_data in enumerate(data["shapes"])]
+        if self.is_current(shapes, transform):
+            return
+        self.transform = transform
+        self.shapes = shapes
+        self.ellipses = np.full((len(shapes), 6), np.nan)
+        self.polygons = {}
+        boxes = []
+        for row, (_, _, shape_data) in enumerate(shapes):
+            shape = shape_data["shape"]
+            if shape == "ellipse":
+                self.ellipses[row] = ellipse_geometry(shape_data, transform)
+                boxes.append(ellipse_bounds(self.ellipses[row]))
+            elif shape in ("polygon", "closed_curve") and shape_data["points"]:
+                points = np.asarray(transform.display_points(shape_data["points"]), dtype=np.int32)
+                self.polygons[row] = points
+                boxes.append((*points.min(axis=0), *points.max(axis=0)))
+            else:
+                boxes.append(NO_BOX)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        valid = self.boxes[:, 0] <= self.boxes[:, 2]
+        if valid.any():
+            self.union = (*self.boxes[valid, :2].min(axis=0), *self.boxes[valid, 2:].max(axis=0))
+        else:
+            self.union = None
+
+
+    def candidates(self, x, y):
+        """
+        Rows of the shapes whose box contains the display point, in hit-test order.
+        """
+        if self.union is None:
+            return np.zeros(0, dtype=np.intp)
+        x0, y0, x1, y1 = self.union
+        if not (x0 <= x <= x1 and y0 <= y <= y1):
+            return np.zeros(0, dtype=np.intp)
+        boxes = self.boxes
+        inside = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+        return np.flatnonzero(inside)
+
+
+    def hit(self, x, y):
+        """
+        First shape (in annotation order) under the display point.
+
+        Returns:
+            tuple: (name, index, shape_data), or None
+        """
+        rows = self.candidates(x, y)
+        if len(rows) == 0:
+            return None
+        cx, cy, a, b, cos, sin = self.ellipses[rows].T
+        dx = x - cx
+        dy = y - cy
+        xr = dx * cos + dy * sin
+        yr = -dx * sin + dy * cos
+        in_ellipse = (xr ** 2) / (a ** 2) + (yr ** 2) / (b ** 2) <= 1  # False for NaN (non-ellipse) rows
+        for row, ellipse_hit in zip(rows, in_ellipse):
+            polygon = self.polygons.get(row)
+            if ellipse_hit or (polygon is not None and cv2.pointPolygonTest(polygon, (x, y), False) >= 0):
+                return self.shapes[row]
+        return None
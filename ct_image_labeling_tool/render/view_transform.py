@@ -0,0 +1,78 @@
+def thumbnail_size(image_size, max_side):
+    """Fit (width, height) within max_side, keeping the aspect ratio; never upscale."""
+    scale = min(1.0, max_side / max(image_size))
+    return (max(1, round(image_size[0] * scale)), max(1, round(image_size[1] * scale)))
+
+
+class ViewTransform:
+    """
+    Maps original-image pixel coordinates to display pixels and back.
+
+    Annotations are stored in original-image pixels; the display is the image
+    stretched to the panel size, so each axis has its own scale.
+    """
+    def __init__(self, image_size, display_size):
+        """
+        Args:
+            image_size (tuple): Original image (width, height)
+            display_size (tuple): Display buffer (width, height)
+        """
+        self.image_size = tuple(image_size)
+        self.display_size = tuple(display_size)
+        self.scale_x = self.display_size[0] / self.image_size[0]
+        self.scale_y = self.display_size[1] / self.image_size[1]
+        # Kept separately (not 1 / scale) so conversions round exactly as before
+        self.inverse_x = self.image_size[0] / self.display_size[0]
+        self.inverse_y = self.image_size[1] / self.display_size[1]
+
+
+    @classmethod
+    def identity(cls, image_size):
+        """Draw at the image's own resolution."""
+        return cls(image_size, image_size)
+
+
+    def __eq__(self, other):
+        return (isinstance(other, ViewTransform) and self.image_size == other.image_size
+                and self.display_size == other.display_size)
+
+
+    def __hash__(self):
+        return hash((self.image_size, self.display_size))
+
+
+    def __repr__(self):
+        return f"ViewTransform(image_size={self.image_size}, display_size={self.display_size})"
+
+
+    def to_display(self, point):
+        """Original-image point -> integer display pixel."""
+        return (int(point[0] * self.scale_x), int(point[1] * self.scale_y))
+
+
+    def to_image(self, point):
+        """Display point -> original-image point (float)."""
+        return (point[0] * self.inverse_x, point[1] * self.inverse_y)
+
+
+    def display_points(self, points):
+        return [(int(pt[0] * self.scale_x), int(pt[1] * self.scale_y)) for pt in points]
+
+
+    def display_ellipse(self, shape_data):
+        """
+        Display-pixel parameters of an ellipse shape, including the legacy
+        two-corner "points" form.
+
+        Returns:
+            tuple: (center, axes, angle) with integer center and axes
+        """
+        if "center" in shape_data:
+            center, axes = shape_data["center"], shape_data["axes"]
+            return (self.to_display(center),
+                    (int(axes[0] * self.scale_x), int(axes[1] * self.scale_y)),
+                    shape_data["angle"])
+        p0, p1 = self.display_points(shape_data["points"][:2])
+        return (((p0[0] + p1[0]) // 2, (p0[1] + p1[1]) // 2),
+                (abs(p1[0] - p0[0]) // 2, abs(p1[1] - p0[1]) // 2),
+                0)
@@ -0,0 +1,364 @@
+import base64
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from service.lazy_import import lazy_import
+from service.mask import PackedMask, ellipse_from_points, rasterize_ellipse, rasterize_polygon, rasterize_shape
+from service.perf import timed
+
+cv2 = lazy_import("cv2")
+
+
+MASK_KEY = "mask"
+MASK_PLACEHOLDER = True  # Stands in for a mask payload that was not read
+MASK_WORKERS = min(8, os.cpu_count() or 1)
+_CHUNK_SIZE = 64 * 1024
+# Smaller files are parsed whole with json.load, which is ~3x faster than the
+# pure-Python scanner; above this the scanner keeps mask payloads out of memory
+STREAM_MIN_BYTES = 8 * 1024 * 1024
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class _StringValueScanner:
+    """
+    Incremental JSON text filter that cuts out the string values of one key.
+
+    Text is fed in chunks; the value of every `"<key>": "..."` pair is
+    replaced by `true` in the output text and, if collect is set, returned
+    separately once complete. Only the value currently being skipped is ever
+    buffered, and only when collecting.
+    """
+    OUT, STRING, AFTER_KEY, VALUE = range(4)
+
+    def __init__(self, key, collect=False):
+        self.key = key
+        self.collect = collect
+        self.state = self.OUT
+        self.escape = False
+        self.token = ""
+        self.colon_seen = False
+        self.value_parts = []
+
+    def feed(self, chunk):
+        """
+        Returns:
+            tuple: (filtered text, [completed values])
+        """
+        out = []
+        values = []
+        i = 0
+        n = len(chunk)
+        while i < n:
+            if self.state == self.OUT:
+                j = chunk.find('"', i)
+                if j < 0:
+                    out.append(chunk[i:])
+                    break
+                out.append(chunk[i:j + 1])
+                self.state = self.STRING
+                self.token = ""
+                i = j + 1
+            elif self.state == self.AFTER_KEY:
+                c = chunk[i]
+                if c in " \t\r\n" or (c == ":" and not self.colon_seen):
+                    self.colon_seen = self.colon_seen or c == ":"
+                    out.append(c)
+                    i += 1
+                elif c == '"' and self.colon_seen:
+                    out.append("true")
+                    self.state = self.VALUE
+                    self.value_parts = []
+                    i += 1
+                else:
+                    self.state = self.OUT
+            else:
+                in_value = self.state == self.VALUE
+                if self.escape:
+                    if not in_value:
+                        out.append(chunk[i])
+                        self.token = None
+                    elif self.collect:
+                        self.value_parts.append(chunk[i])
+                    self.escape = False
+                    i += 1
+                    continue
+                m = _STRING_SPECIAL.search(chunk, i)
+                end = m.start() if m else n
+                if in_value:
+                    if self.collect:
+                        self.value_parts.append(chunk[i:end])
+                else:
+                    out.append(chunk[i:end + 1 if m else end])
+                    if self.token is not None:
+                        self.token += chunk[i:end]
+                        if len(self.token) > len(self.key):
+                            self.token = None
+                if m is None:
+                    break
+                i = end + 1
+                if m.group() == "\\":
+                    if in_value and self.collect:
+                        self.value_parts.append("\\")
+                    self.escape = True
+                elif in_value:
+                    if self.collect:
+                        values.append(json.loads('"' + "".join(self.value_parts) + '"'))
+                    self.value_parts = []
+                    self.state = self.OUT
+                elif self.token == self.key:
+                    self.state = self.AFTER_KEY
+                    self.colon_seen = False
+                else:
+                    self.state = self.OUT
+        return "".join(out), values
+
+
+def _iter_filtered(json_file, collect):
+    scanner = _StringValueScanner(MASK_KEY, collect=collect)
+    with open(json_file, "r") as file:
+        while True:
+            chunk = file.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield scanner.feed(chunk)
+
+
+@timed("read_label_data")
+def read_label_data(json_file, include_masks=True):
+    """
+    Read a per-image label JSON as written by "Save Labels (JSON)".
+
+    With include_masks=False each annotation's "mask" value is replaced by
+    MASK_PLACEHOLDER. Files of STREAM_MIN_BYTES or more are streamed and the
+    payloads dropped while reading, so they are never decoded or held in
+    memory; smaller ones are parsed whole and the payloads dropped afterwards.
+    """
+    if not include_masks and os.path.getsize(json_file) >= STREAM_MIN_BYTES:
+        return json.loads("".join(text for text, _ in _iter_filtered(json_file, collect=False)))
+    with open(json_file, "r") as file:
+        data = json.load(file)
+    if not include_masks and isinstance(data, dict):
+        for annotation in data.get("annotations", []):
+            if isinstance(annotation.get(MASK_KEY), str):
+                annotation[MASK_KEY] = MASK_PLACEHOLDER
+    return data
+
+
+def iter_masks(json_file):
+    """
+    Yield the base64 mask payloads of a label JSON one at a time, in file order.
+    """
+    for _, values in _iter_filtered(json_file, collect=True):
+        yield from values
+
+
+def annotations_from_label_data(data, default_size=None):
+    """
+    Convert saved label data into the in-memory annotation dict.
+
+    Legacy ellipses saved as two corner points are normalized to
+    center/axes/angle here, the form their masks were always drawn with, so
+    rendering and hit-testing deal with one ellipse form.
+
+    Returns:
+        dict: {name: {"color": (B, G, R), "shapes": [...]}}
+    """
+    annotations = {}
+    for annotation in data.get("annotations", []):
+        name = annotation["name"]
+        shape = annotation["shape"]
+        color = tuple(annotation["color"])
+        mask = annotation.get("mask")
+        if not isinstance(mask, (str, PackedMask)):
+            mask = None
+        orig_size = annotation.get("orig_size", default_size)
+        if shape == "ellipse":
+            if "center" in annotation and "axes" in annotation and "angle" in annotation:
+                shape_data = {
+                    "shape": "ellipse",
+                    "center": annotation["center"],
+                    "axes": annotation["axes"],
+                    "angle": annotation["angle"],
+                    "mask": mask,
+                    "image_size": orig_size
+                }
+            elif len(annotation.get("points", [])) >= 2:
+                center, axes = ellipse_from_points(annotation["points"])
+                shape_data = {
+                    "shape": "ellipse",
+                    "center": center,
+                    "axes": axes,
+                    "angle": 0,
+                    "mask": mask,
+                    "image_size": orig_size
+                }
+            else:
+                shape_data = {
+                    "shape": "ellipse",
+                    "points": annotation["points"],
+                    "mask": mask,
+                    "image_size": orig_size
+                }
+        else:
+            shape_data = {
+                "shape": shape,
+                "points": annotation["points"],
+                "mask": mask,
+                "image_size": orig_size
+            }
+        if name not in annotations:
+            annotations[name] = {"color": color, "shapes": []}
+        annotations[name]["shapes"].append(shape_data)
+    return annotations
+
+
+def load_annotations(json_file, default_size=None):
+    return annotations_from_label_data(read_label_data(json_file), default_size)
+
+
+def annotation_mask(annotation, frame_size=None):
+    """
+    Mask of one saved annotation: its stored mask (base64 PNG or PackedMask)
+    when there is one, otherwise rasterized from the geometry, which
+    reproduces what a full save stores.
+
+    Args:
+        annotation (dict): Saved annotation (coordinates in image pixels)
+        frame_size (tuple): (width, height); defaults to the annotation's orig_size
+
+    Returns:
+        PackedMask: The mask, or None if a stored PNG cannot be decoded
+    """
+    frame_size = tuple(frame_size or annotation["orig_size"])
+    mask = annotation.get("mask")
+    if isinstance(mask, str):
+        return PackedMask.from_base64_png(mask, frame_size=frame_size)
+    if isinstance(mask, PackedMask):
+        if mask.frame_size != frame_size:
+            return PackedMask.from_array(cv2.resize(mask.to_array(), frame_size))
+        return mask
+    return rasterize_shape(annotation, frame_size)
+
+
+def _encode_packed(value):
+    if isinstance(value, PackedMask):
+        return value.to_base64_png()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_label_data(json_file, label_data):
+    """Write label data as JSON; PackedMask masks (e.g. from a .npz sidecar) become base64 PNGs."""
+    with open(json_file, "w") as json_obj:
+        json.dump(label_data, json_obj, indent=4, default=_encode_packed)
+
+
+def encode_mask(mask, compression=None):
+    params = [cv2.IMWRITE_PNG_COMPRESSION, compression] if compression is not None else []
+    _, buffer = cv2.imencode(".png", mask, params)
+    return base64.b64encode(buffer).decode("utf-8")
+
+
+def _encode_job(compression, job):
+    mask = job()
+    return mask.to_base64_png(compression) if isinstance(mask, PackedMask) else mask
+
+
+def encode_masks(jobs, workers=None, compression=None):
+    """
+    Run mask jobs and PNG-encode their results, in a thread pool.
+
+    cv2.fillPoly/ellipse and cv2.imencode release the GIL, so threads
+    rasterize and compress several masks at once.
+
+    Args:
+        jobs (list): Callables returning a PackedMask (or an already encoded base64 string)
+        workers (int): Thread count; defaults to MASK_WORKERS, 1 runs inline
+        compression (int): PNG zlib level 0-9; None keeps OpenCV's default (fast RLE)
+
+    Returns:
+        list: base64 PNG strings, in the order of jobs
+    """
+    workers = min(workers or MASK_WORKERS, len(jobs))
+    encode = partial(_encode_job, compression)
+    if workers <= 1:
+        return [encode(job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(encode, jobs))
+
+
+def build_label_data(file_path, annotations, image_size, include_masks=True, workers=None, compression=None,
+                     packed_masks=False):
+    """
+    Convert the in-memory annotation dict into the saved label format.
+
+    Point shapes are rescaled to the original image size and every shape gets
+    a full-size PNG mask (base64); masks already cached on ellipses (base64 or
+    PackedMask) are reused. Masks are rasterized in their bounding box only
+    and expanded to the full frame just for PNG encoding, spread over
+    `workers` threads (see encode_masks); the output does not depend on it.
+
+    With include_masks=False only geometry is written (no "mask" keys); the
+    geometry is authoritative and annotation_mask() rebuilds the same masks.
+    With packed_masks, masks are left as PackedMask for stores that keep
+    them packed (AnnotationStore.packed_masks), skipping the PNG step.
+    """
+    label_data = {"file_path": [os.path.basename(file_path)], "annotations": []}
+    orig_w, orig_h = image_size
+    mask_jobs = []
+
+    for name, data in annotations.items():
+        for shape_data in data["shapes"]:
+            if shape_data["shape"] == "ellipse" and "center" in shape_data:
+                if include_masks:
+                    cached = shape_data.get("mask")  # base64 string or PackedMask
+                    if cached:
+                        mask_jobs.append(lambda cached=cached: cached)
+                    else:
+                        mask_jobs.append(partial(rasterize_ellipse, shape_data["center"], shape_data["axes"],
+                                                 shape_data["angle"], image_size))
+                annotation_entry = {
+                    "name": name,
+                    "shape": "ellipse",
+                    "center": shape_data["center"],
+                    "axes": shape_data["axes"],
+                    "angle": shape_data["angle"],
+                    "color": data["color"],
+                    "mask": None,
+                    "orig_size": shape_data["image_size"]
+                }
+            else:
+                ann_size = shape_data["image_size"]
+                scale_x = orig_w / ann_size[0]
+                scale_y = orig_h / ann_size[1]
+
+                if "points" in shape_data:
+                    converted_points = [(int(pt[0] * scale_x), int(pt[1] * scale_y)) for pt in shape_data["points"]]
+                else:
+                    converted_points = []
+
+                if include_masks and shape_data["shape"] in ["polygon", "closed_curve"]:
+                    mask_jobs.append(partial(rasterize_polygon, converted_points, image_size))
+                elif include_masks:
+                    # Legacy two-point ellipse; its mask was always drawn from the unscaled points
+                    mask_jobs.append(partial(rasterize_shape, shape_data, image_size))
+                annotation_entry = {
+                    "name": name,
+                    "shape": shape_data["shape"],
+                    "points": converted_points,
+                    "color": data["color"],
+                    "mask": None,
+                    "orig_size": shape_data["image_size"]
+                }
+            if not include_masks:
+                del annotation_entry["mask"]
+            label_data["annotations"].append(annotation_entry)
+
+    if include_masks:
+        # Rasterizing into the bounding box alone is cheap; only PNG encoding is worth the pool
+        masks = [job() for job in mask_jobs] if packed_masks else encode_masks(mask_jobs, workers, compression)
+        for annotation_entry, mask in zip(label_data["annotations"], masks):
+            annotation_entry["mask"] = mask
+    return label_data
@@ -0,0 +1,376 @@
+import argparse
+import abc
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from service.annotation_io import MASK_PLACEHOLDER, read_label_data, write_label_data
+from service.mask import PackedMask
+from service.sidecar import SIDECAR_EXT, load_sidecar, save_sidecar
+
+
+class AnnotationStore(abc.ABC):
+    """
+    Persistence backend for per-image label data. A backend missing one of
+    the methods below cannot be instantiated.
+
+    Label data is always exchanged in the saved JSON layout:
+    {"file_path": [file_name], "annotations": [{"name", "shape", ..., "mask"}]}
+
+    A "mask" is a base64 PNG or a PackedMask; every store saves either.
+    Stores with packed_masks set keep masks packed and load them as
+    PackedMask, so savers should build label data with packed masks for them.
+    """
+    packed_masks = False
+
+    @abc.abstractmethod
+    def exists(self, image_path):
+        pass
+
+    @abc.abstractmethod
+    def load(self, image_path, include_masks=True):
+        """
+        With include_masks=False, mask payloads are skipped and each "mask"
+        is MASK_PLACEHOLDER; use this when only geometry is needed.
+        """
+
+    @abc.abstractmethod
+    def save(self, image_path, label_data):
+        pass
+
+    @abc.abstractmethod
+    def location(self, image_path):
+        pass
+
+    @abc.abstractmethod
+    def revision(self, image_path):
+        """
+        Opaque stamp that changes whenever the image's label data is saved;
+        None when there is none. Batch jobs compare it to skip unchanged files.
+        """
+
+
+def mask_png_bytes(mask):
+    """PNG bytes of a base64 or PackedMask mask, None if there is none."""
+    if isinstance(mask, PackedMask):
+        return base64.b64decode(mask.to_base64_png())
+    return base64.b64decode(mask) if isinstance(mask, str) else None
+
+
+def file_revision(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class JsonAnnotationStore(AnnotationStore):
+    """
+    One pretty-printed JSON file next to each image (the default).
+    """
+    def json_path(self, image_path):
+        return os.path.splitext(image_path)[0] + ".json"
+
+    def exists(self, image_path):
+        return os.path.exists(self.json_path(image_path))
+
+    def load(self, image_path, include_masks=True):
+        json_file = self.json_path(image_path)
+        if not os.path.exists(json_file):
+            return None
+        return read_label_data(json_file, include_masks=include_masks)
+
+    def save(self, image_path, label_data):
+        write_label_data(self.json_path(image_path), label_data)
+
+    def location(self, image_path):
+        return self.json_path(image_path)
+
+    def revision(self, image_path):
+        return file_revision(self.json_path(image_path))
+
+
+class NpzAnnotationStore(AnnotationStore):
+    """
+    One compressed binary sidecar (.npz, see service/sidecar.py) next to each image.
+    """
+    packed_masks = True
+    def npz_path(self, image_path):
+        return os.path.splitext(image_path)[0] + SIDECAR_EXT
+
+    def exists(self, image_path):
+        return os.path.exists(self.npz_path(image_path))
+
+    def load(self, image_path, include_masks=True):
+        npz_file = self.npz_path(image_path)
+        if not os.path.exists(npz_file):
+            return None
+        return load_sidecar(npz_file, include_masks=include_masks)
+
+    def save(self, image_path, label_data):
+        save_sidecar(self.npz_path(image_path), label_data)
+
+    def location(self, image_path):
+        return self.npz_path(image_path)
+
+    def revision(self, image_path):
+        return file_revision(self.npz_path(image_path))
+
+
+class SqliteAnnotationStore(AnnotationStore):
+    """
+    One SQLite database (WAL mode) per study folder, next to the images.
+
+    Shapes are rows indexed by file, label name and shape type, so listing
+    annotated files or counting labels does not open any per-image file.
+    """
+    DB_NAME = "annotations.sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            file_name TEXT NOT NULL UNIQUE,
+            saved_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS shapes (
+            id INTEGER PRIMARY KEY,
+            file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            shape TEXT NOT NULL,
+            color TEXT NOT NULL,
+            geometry TEXT NOT NULL,
+            orig_size TEXT,
+            mask BLOB
+        );
+        CREATE INDEX IF NOT EXISTS idx_shapes_file ON shapes(file_id, position);
+        CREATE INDEX IF NOT EXISTS idx_shapes_name ON shapes(name);
+        CREATE INDEX IF NOT EXISTS idx_shapes_shape ON shapes(shape);
+    """
+
+    GEOMETRY_KEYS = ("points", "center", "axes", "angle")
+
+    def __init__(self):
+        self.connections = {}
+        self.lock = threading.RLock()
+
+    def db_path(self, study_dir):
+        return os.path.join(study_dir, self.DB_NAME)
+
+    def connect(self, study_dir, create=True):
+        study_dir = os.path.abspath(study_dir)
+        with self.lock:
+            if study_dir in self.connections:
+                return self.connections[study_dir]
+            db_path = self.db_path(study_dir)
+            if not create and not os.path.exists(db_path):
+                return None
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(self.SCHEMA)
+            self.connections[study_dir] = conn
+            return conn
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections.clear()
+
+    def exists(self, image_path):
+        conn = self.connect(os.path.dirname(image_path), create=False)
+        if conn is None:
+            return False
+        with self.lock:
+            row = conn.execute("SELECT 1 FROM files WHERE file_name = ?", (os.path.basename(image_path),)).fetchone()
+        return row is not None
+
+    def load(self, image_path, include_masks=True):
+        conn = self.connect(os.path.dirname(image_path), create=False)
+        if conn is None:
+            return None
+        file_name = os.path.basename(image_path)
+        with self.lock:
+            file_row = conn.execute("SELECT id FROM files WHERE file_name = ?", (file_name,)).fetchone()
+            if file_row is None:
+                return None
+            mask_column = "mask" if include_masks else "mask IS NOT NULL"
+            rows = conn.execute(
+                f"SELECT name, shape, color, geometry, orig_size, {mask_column} FROM shapes WHERE file_id = ? ORDER BY position",
+                (file_row[0],)).fetchall()
+
+        label_data = {"file_path": [file_name], "annotations": []}
+        for name, shape, color, geometry, orig_size, mask in rows:
+            annotation = {"name": name, "shape": shape}
+            annotation.update(json.loads(geometry))
+            annotation["color"] = json.loads(color)
+            if not include_masks:
+                if mask:
+                    annotation["mask"] = MASK_PLACEHOLDER
+            elif mask is not None:
+                annotation["mask"] = base64.b64encode(mask).decode("utf-8")
+            if orig_size is not None:
+                annotation["orig_size"] = json.loads(orig_size)
+            label_data["annotations"].append(annotation)
+        return label_data
+
+    def save(self, image_path, label_data):
+        conn = self.connect(os.path.dirname(image_path))
+        file_name = os.path.basename(image_path)
+        rows = []
+        for position, annotation in enumerate(label_data.get("annotations", [])):
+            geometry = {key: annotation[key] for key in self.GEOMETRY_KEYS if key in annotation}
+            mask = annotation.get("mask")
+            orig_size = annotation.get("orig_size")
+            rows.append((position, annotation["name"], annotation["shape"], json.dumps(annotation["color"]),
+                         json.dumps(geometry), json.dumps(orig_size) if orig_size is not None else None,
+                         mask_png_bytes(mask)))
+
+        with self.lock, conn:
+            conn.execute("INSERT INTO files (file_name, saved_at) VALUES (?, ?) "
+                         "ON CONFLICT(file_name) DO UPDATE SET saved_at = excluded.saved_at",
+                         (file_name, time.time()))
+            file_id = conn.execute("SELECT id FROM files WHERE file_name = ?", (file_name,)).fetchone()[0]
+            conn.execute("DELETE FROM shapes WHERE file_id = ?", (file_id,))
+            conn.executemany(
+                "INSERT INTO shapes (file_id, position, name, shape, color, geometry, orig_size, mask) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(file_id,) + row for row in rows])
+
+    def location(self, image_path):
+        return f"{self.db_path(os.path.dirname(image_path))} ({os.path.basename(image_path)})"
+
+    def revision(self, image_path):
+        conn = self.connect(os.path.dirname(image_path), create=False)
+        if conn is None:
+            return None
+        with self.lock:
+            row = conn.execute("SELECT saved_at FROM files WHERE file_name = ?", (os.path.basename(image_path),)).fetchone()
+        return row[0] if row else None
+
+    def annotated_files(self, study_dir):
+        conn = self.connect(study_dir, create=False)
+        if conn is None:
+            return []
+        with self.lock:
+            return [row[0] for row in conn.execute("SELECT file_name FROM files ORDER BY file_name")]
+
+    def label_counts(self, study_dir):
+        """
+        Returns:
+            dict: {label name: number of shapes}
+        """
+        conn = self.connect(study_dir, create=False)
+        if conn is None:
+            return {}
+        with self.lock:
+            return dict(conn.execute("SELECT name, COUNT(*) FROM shapes GROUP BY name ORDER BY name"))
+
+    def files_missing_label(self, study_dir, label_name):
+        conn = self.connect(study_dir, create=False)
+        if conn is None:
+            return []
+        with self.lock:
+            return [row[0] for row in conn.execute(
+                "SELECT file_name FROM files WHERE NOT EXISTS "
+                "(SELECT 1 FROM shapes WHERE shapes.file_id = files.id AND shapes.name = ?) ORDER BY file_name",
+                (label_name,))]
+
+    def export_json(self, study_dir, json_store=None):
+        """
+        Write every stored file back out as a per-image JSON.
+
+        Returns:
+            int: Number of JSON files written
+        """
+        json_store = json_store or JsonAnnotationStore()
+        count = 0
+        for file_name in self.annotated_files(study_dir):
+            image_path = os.path.join(study_dir, file_name)
+            json_store.save(image_path, self.load(image_path))
+            count += 1
+        return count
+
+    def import_json(self, study_dir):
+        """
+        Copy the per-image JSON files of a folder into the database.
+
+        Other JSON files in the folder (unreadable, or not label data) are
+        skipped and listed at the end.
+
+        Returns:
+            int: Number of files imported
+        """
+        count = 0
+        skipped = []
+        for file_name in sorted(os.listdir(study_dir)):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                label_data = read_label_data(os.path.join(study_dir, file_name))
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] Skipping {file_name}: {e}")
+                skipped.append(file_name)
+                continue
+            if not isinstance(label_data, dict) or not isinstance(label_data.get("annotations", []), list):
+                print(f"[INFO] Skipping {file_name}: not label data.")
+                skipped.append(file_name)
+                continue
+            image_names = label_data.get("file_path", [])
+            if not image_names or not isinstance(image_names, list):
+                print(f"[INFO] Skipping {file_name}: no file_path in JSON.")
+                skipped.append(file_name)
+                continue
+            self.save(os.path.join(study_dir, image_names[0]), label_data)
+            count += 1
+        if skipped:
+            print(f"[INFO] Skipped {len(skipped)} JSON file(s): {', '.join(skipped)}")
+        return count
+
+
+STORES = {
+    "json": JsonAnnotationStore,
+    "npz": NpzAnnotationStore,
+    "sqlite": SqliteAnnotationStore,
+}
+
+
+def create_store(name="json"):
+    if name not in STORES:
+        raise ValueError(f"Unknown annotation store '{name}'. Choose from: {', '.join(STORES)}")
+    return STORES[name]()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or convert a per-study SQLite annotation store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ("labels", "files", "import-json", "export-json"):
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument("study_dir")
+    missing = subparsers.add_parser("missing", help="List files without a given label")
+    missing.add_argument("study_dir")
+    missing.add_argument("label")
+    args = parser.parse_args()
+
+    store = SqliteAnnotationStore()
+    if args.command == "labels":
+        for name, count in store.label_counts(args.study_dir).items():
+            print(f"{name}\t{count}")
+    elif args.command == "files":
+        print("\n".join(store.annotated_files(args.study_dir)))
+    elif args.command == "missing":
+        print("\n".join(store.files_missing_label(args.study_dir, args.label)))
+    elif args.command == "import-json":
+        print(f"Imported {store.import_json(args.study_dir)} file(s).")
+    elif args.command == "export-json":
+        print(f"Exported {store.export_json(args.study_dir)} file(s).")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
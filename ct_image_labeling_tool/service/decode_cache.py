@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from service.annotation_io import annotations_from_label_data
+from service.history import snapshot_annotations
+from service.image_io import load_image
+from service.lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+
+MAX_SLICES = 64  # A 512x512 slice with its pyramid is ~350 KB
+DECODE_WORKERS = 2
+PYRAMID_MIN_SIDE = 64
+
+
+def build_pyramid(image, min_side=PYRAMID_MIN_SIDE):
+    """
+    The image followed by successive INTER_AREA halvings, down to min_side.
+
+    Returns:
+        list: Read-only arrays, largest first
+    """
+    levels = [image]
+    while max(levels[-1].shape[:2]) // 2 >= min_side:
+        height, width = levels[-1].shape[:2]
+        levels.append(cv2.resize(levels[-1], (max(1, width // 2), max(1, height // 2)), interpolation=cv2.INTER_AREA))
+    for level in levels:
+        level.setflags(write=False)
+    return levels
+
+
+class DecodedSlice:
+    """
+    A decoded slice with its thumbnail pyramid and saved annotations.
+
+    Attributes:
+        image (np.ndarray): Full-size 8-bit image as load_image returns it, read-only
+        size (tuple): (width, height) of the image
+        levels (list): Pyramid, see build_pyramid
+        annotations (dict): Saved annotations as read from the store, {} if none
+        revision: Store revision the annotations were read at
+    """
+    def __init__(self, path, image, annotations, revision):
+        self.path = path
+        self.levels = build_pyramid(image)
+        self.image = self.levels[0]
+        self.size = (image.shape[1], image.shape[0])
+        self.annotations = annotations
+        self.revision = revision
+
+
+    def level_for(self, max_side):
+        """Smallest pyramid level whose longest side is at least max_side."""
+        for level in reversed(self.levels):
+            if max(level.shape[:2]) >= max_side:
+                return level
+        return self.image
+
+
+class DecodeCache:
+    """
+    Decoded slices shared by the image view, the grid view and prefetching.
+
+    Slices are decoded on a small thread pool, together with their saved
+    annotations (pydicom's file reads and the cv2 normalize/resize calls
+    release the GIL), and kept in LRU order up to max_slices. Nothing calls
+    back into the UI from a worker, as Tk may only be used from the main
+    thread; views poll get() from root.after instead.
+    """
+    def __init__(self, store, max_slices=MAX_SLICES, workers=DECODE_WORKERS):
+        self.store = store
+        self.max_slices = max_slices
+        self.workers = workers
+        self.entries = OrderedDict()  # {path: DecodedSlice}, least recently used first
+        self.pending = {}  # {path: Future} queued or running
+        self.failed = set()  # Paths that could not be decoded; not retried in the background
+        self.lock = threading.Lock()
+        self.executor = None
+
+
+    def read_annotations(self, path, image_size):
+        """
+        Returns:
+            tuple: (annotations, store revision they were read at)
+        """
+        revision = self.store.revision(path)
+        if not self.store.exists(path):
+            return {}, revision
+        label_data = self.store.load(path, include_masks=False)
+        return (annotations_from_label_data(label_data, image_size) if label_data else {}), revision
+
+
+    def decode(self, path):
+        try:
+            image = load_image(path)
+        except Exception as e:
+            print(f"[ERROR] Failed to decode {path}: {e}")
+            image = None
+        entry = None
+        if image is not None:
+            try:
+                annotations, revision = self.read_annotations(path, (image.shape[1], image.shape[0]))
+            except Exception as e:
+                print(f"[ERROR] Failed to load annotations for {path}: {e}")
+                annotations, revision = {}, None
+            entry = DecodedSlice(path, image, annotations, revision)
+
+        with self.lock:
+            self.pending.pop(path, None)
+            if entry is None:
+                self.failed.add(path)
+                return None
+            self.entries[path] = entry
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_slices:
+                self.entries.popitem(last=False)
+        return entry
+
+
+    def request(self, paths):
+        """
+        Queue slices for background decoding, in order; cached, queued and
+        failed ones are skipped.
+        """
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="decode")
+            for path in paths:
+                if path not in self.entries and path not in self.pending and path not in self.failed:
+                    self.pending[path] = self.executor.submit(self.decode, path)
+
+
+    def cancel(self, keep=()):
+        """Drop queued decodes that have not started yet, except those of keep."""
+        keep = set(keep)
+        with self.lock:
+            for path, future in list(self.pending.items()):
+                if path not in keep and future.cancel():
+                    del self.pending[path]
+
+
+    def get(self, path):
+        """
+        Returns:
+            DecodedSlice: The cached slice, or None if it is not decoded (yet)
+        """
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                self.entries.move_to_end(path)
+            return entry
+
+
+    def has_failed(self, path):
+        return path in self.failed
+
+
+    def load(self, path):
+        """
+        Decoded slice, waiting for a queued decode or decoding in the calling thread.
+
+        Returns:
+            DecodedSlice: The slice, or None if it cannot be read
+        """
+        entry = self.get(path)
+        if entry is not None:
+            return entry
+        with self.lock:
+            self.failed.discard(path)
+            future = self.pending.get(path)
+        if future is not None:
+            if not future.cancel():
+                return future.result()
+            with self.lock:
+                self.pending.pop(path, None)
+        return self.decode(path)
+
+
+    def saved_annotations(self, entry):
+        """
+        The saved annotations of a decoded slice, as a snapshot the caller may edit.
+
+        They are re-read if the store changed since the slice was decoded.
+        """
+        revision = self.store.revision(entry.path)
+        if revision != entry.revision:
+            entry.annotations, entry.revision = self.read_annotations(entry.path, entry.size)
+        return snapshot_annotations(entry.annotations)
+
+
+    def clear(self):
+        """Forget every slice, e.g. when another set of files is loaded."""
+        self.cancel()
+        with self.lock:
+            self.entries.clear()
+            self.failed.clear()
+
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
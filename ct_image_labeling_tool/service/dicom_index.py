@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from service.image_io import position_sort_key, slice_position
+from service.lazy_import import lazy_import
+
+pydicom = lazy_import("pydicom")
+
+INDEX_VERSION = 1
+INDEX_TAGS = [
+    "PatientID", "StudyInstanceUID", "StudyDescription", "SeriesInstanceUID", "SeriesNumber",
+    "SeriesDescription", "Modality", "InstanceNumber", "ImagePositionPatient", "ImageOrientationPatient",
+    "Rows", "Columns",
+]
+
+
+def default_index_path():
+    return os.path.join(os.path.expanduser("~"), ".ct_image_labeling_tool", "dicom_index.json")
+
+
+def read_index_record(file_path):
+    """
+    Read the study/series/instance fields of one DICOM file.
+
+    Only the tags in INDEX_TAGS are parsed and reading stops before the
+    pixel data, so no pixels are decoded.
+
+    Returns:
+        dict: Index record, or None if the file is not readable DICOM
+    """
+    try:
+        ds = pydicom.dcmread(file_path, stop_before_pixels=True, specific_tags=INDEX_TAGS)
+    except Exception as e:
+        print(f"[ERROR] Failed to read DICOM header of {file_path}: {e}")
+        return None
+    series_number = getattr(ds, "SeriesNumber", None)
+    instance = getattr(ds, "InstanceNumber", None)
+    return {
+        "patient_id": str(getattr(ds, "PatientID", "")),
+        "study_uid": str(getattr(ds, "StudyInstanceUID", "")),
+        "study_description": str(getattr(ds, "StudyDescription", "")),
+        "series_uid": str(getattr(ds, "SeriesInstanceUID", "")),
+        "series_number": int(series_number) if series_number is not None else None,
+        "series_description": str(getattr(ds, "SeriesDescription", "")),
+        "modality": str(getattr(ds, "Modality", "")),
+        "instance": int(instance) if instance is not None else None,
+        "position": slice_position(ds),
+        "rows": int(getattr(ds, "Rows", 0)),
+        "columns": int(getattr(ds, "Columns", 0)),
+    }
+
+
+class DicomIndex:
+    """
+    Study/series/instance table of DICOM files, built from headers only.
+
+    Records are cached on disk keyed by absolute path and validated against
+    the file's mtime and size, so reopening a folder only reads the headers
+    of files that changed.
+    """
+    def __init__(self, cache_path=None, max_workers=8):
+        self.cache_path = cache_path or default_index_path()
+        self.max_workers = max_workers
+        self.entries = self.read_cache()
+        self.dirty = False
+
+
+    def read_cache(self):
+        try:
+            with open(self.cache_path, "r") as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if cache.get("version") != INDEX_VERSION:
+            return {}
+        return cache.get("files", {})
+
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"version": INDEX_VERSION, "files": self.entries}, file)
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+
+
+    def scan(self, file_paths):
+        """
+        Index DICOM files, reading headers of new or modified files in a thread pool.
+
+        Returns:
+            dict: {file path: record}; files that are not DICOM (or unreadable) are left out
+        """
+        records = {}
+        stale = []
+        for path in file_paths:
+            if not path.lower().endswith(".dcm"):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = self.entries.get(os.path.abspath(path))
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                records[path] = entry["record"]
+            else:
+                stale.append((path, stat))
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for (path, stat), record in zip(stale, executor.map(read_index_record, [path for path, _ in stale])):
+                    if record is None:
+                        continue
+                    records[path] = record
+                    self.entries[os.path.abspath(path)] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "record": record}
+            self.dirty = True
+            self.save()
+        return records
+
+
+    def sort_files(self, file_paths):
+        """
+        Order files per study and series, and anatomically within each series.
+
+        Files that are not indexed DICOM keep their relative order after the DICOM files.
+
+        Returns:
+            list: [(series key or None, [file paths])] in display order
+        """
+        records = self.scan(file_paths)
+        groups = {}
+        for path in file_paths:
+            record = records.get(path)
+            key = (record["study_uid"], record["series_uid"]) if record else None
+            groups.setdefault(key, []).append(path)
+
+        def series_order(key):
+            first = records[groups[key][0]]
+            number = first["series_number"]
+            return (key[0], number is None, number if number is not None else 0, key[1])
+
+        ordered = []
+        for key in sorted((key for key in groups if key is not None), key=series_order):
+            files = sorted(groups[key], key=lambda path: position_sort_key(records[path]["position"],
+                                                                            records[path]["instance"], path))
+            ordered.append((key, files))
+        if None in groups:
+            ordered.append((None, groups[None]))
+        return ordered
+
+
+    def series_label(self, file_path):
+        """Short series name for display, e.g. "S3 AXIAL"; None if not indexed."""
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry is None:
+            return None
+        record = entry["record"]
+        label = f"S{record['series_number']}" if record["series_number"] is not None else "S?"
+        if record["series_description"]:
+            label += f" {record['series_description']}"
+        return label
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the studies and series of a DICOM folder (headers only).")
+    parser.add_argument("folder")
+    parser.add_argument("--files", action="store_true", help="Also list the files of each series in slice order")
+    args = parser.parse_args()
+
+    file_paths = [os.path.join(args.folder, name) for name in sorted(os.listdir(args.folder))]
+    index = DicomIndex()
+    for key, files in index.sort_files(file_paths):
+        if key is None:
+            print(f"Other files\t{len(files)}")
+        else:
+            print(f"{index.series_label(files[0])}\t{len(files)} slice(s)\t{key[1]}")
+        if args.files:
+            for path in files:
+                print(f"    {os.path.basename(path)}")
+
+
+if __name__ == "__main__":
+    main()
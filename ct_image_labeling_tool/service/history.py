@@ -0,0 +1,176 @@
+from collections import deque
+
+
+def snapshot_annotations(annotations):
+    """
+    Copy the annotation dict down to the per-label shape lists.
+
+    Shape dicts are shared between snapshots and are never mutated in place;
+    edits replace them, so sharing them is safe and keeps snapshots cheap.
+    """
+    return {name: {"color": data["color"], "shapes": list(data["shapes"])}
+            for name, data in annotations.items()}
+
+
+class AddShape:
+    def __init__(self, name, color, shape_data, index=None):
+        self.name = name
+        self.color = color
+        self.shape_data = shape_data
+        self.index = index
+
+    def apply(self, annotations):
+        if self.name not in annotations:
+            annotations[self.name] = {"color": self.color, "shapes": []}
+        shapes = annotations[self.name]["shapes"]
+        if self.index is None:
+            self.index = len(shapes)
+        shapes.insert(self.index, self.shape_data)
+
+    def revert(self, annotations):
+        shapes = annotations[self.name]["shapes"]
+        del shapes[self.index]
+        if not shapes:
+            del annotations[self.name]
+
+    def to_dict(self):
+        return {"type": "add", "name": self.name, "color": self.color,
+                "shape_data": strip_mask(self.shape_data), "index": self.index}
+
+
+class DeleteShape:
+    def __init__(self, name, index, color=None, shape_data=None):
+        self.name = name
+        self.index = index
+        self.color = color
+        self.shape_data = shape_data
+
+    def apply(self, annotations):
+        data = annotations[self.name]
+        self.color = data["color"]
+        self.shape_data = data["shapes"].pop(self.index)
+        if not data["shapes"]:
+            del annotations[self.name]
+
+    def revert(self, annotations):
+        if self.name not in annotations:
+            annotations[self.name] = {"color": self.color, "shapes": []}
+        annotations[self.name]["shapes"].insert(self.index, self.shape_data)
+
+    def to_dict(self):
+        return {"type": "delete", "name": self.name, "index": self.index, "color": self.color,
+                "shape_data": strip_mask(self.shape_data)}
+
+
+class ReplaceShape:
+    """
+    Swap one shape for another; used for move, resize and rotate.
+    """
+    def __init__(self, name, index, before, after, kind="move"):
+        self.name = name
+        self.index = index
+        self.before = before
+        self.after = after
+        self.kind = kind
+
+    def apply(self, annotations):
+        annotations[self.name]["shapes"][self.index] = self.after
+
+    def revert(self, annotations):
+        annotations[self.name]["shapes"][self.index] = self.before
+
+    def to_dict(self):
+        return {"type": "replace", "name": self.name, "index": self.index, "kind": self.kind,
+                "before": strip_mask(self.before), "after": strip_mask(self.after)}
+
+
+class RenameLabel:
+    def __init__(self, old_name, new_name):
+        self.old_name = old_name
+        self.new_name = new_name
+
+    def apply(self, annotations):
+        rename_label(annotations, self.old_name, self.new_name)
+
+    def revert(self, annotations):
+        rename_label(annotations, self.new_name, self.old_name)
+
+    def to_dict(self):
+        return {"type": "rename", "old_name": self.old_name, "new_name": self.new_name}
+
+
+def rename_label(annotations, old_name, new_name):
+    """
+    Rename a label in place while keeping its position in the dict.
+    """
+    items = list(annotations.items())
+    annotations.clear()
+    for name, data in items:
+        annotations[new_name if name == old_name else name] = data
+
+
+def strip_mask(shape_data):
+    """
+    Drop the cached mask; it is re-rasterized from the geometry when saving.
+    """
+    if shape_data is None or "mask" not in shape_data:
+        return shape_data
+    return {key: value for key, value in shape_data.items() if key != "mask"}
+
+
+def command_from_dict(data):
+    command_type = data["type"]
+    if command_type == "add":
+        return AddShape(data["name"], tuple(data["color"]), data["shape_data"], data["index"])
+    elif command_type == "delete":
+        color = tuple(data["color"]) if data["color"] is not None else None
+        return DeleteShape(data["name"], data["index"], color, data["shape_data"])
+    elif command_type == "replace":
+        return ReplaceShape(data["name"], data["index"], data["before"], data["after"], data["kind"])
+    elif command_type == "rename":
+        return RenameLabel(data["old_name"], data["new_name"])
+    raise ValueError(f"Unknown command type: {command_type}")
+
+
+class AnnotationHistory:
+    """
+    Undo/redo stack of annotation commands.
+
+    Only commands are stored, never copies of the annotation dict, so memory
+    grows with the number of edits kept (bounded by max_steps), not with the
+    size of the annotations.
+    """
+    def __init__(self, max_steps=1000):
+        self.undo_stack = deque(maxlen=max_steps)
+        self.redo_stack = []
+
+    def execute(self, command, annotations):
+        command.apply(annotations)
+        self.push(command)
+
+    def push(self, command):
+        """
+        Record a command whose effect has already been applied.
+        """
+        self.undo_stack.append(command)
+        self.redo_stack.clear()
+
+    def undo(self, annotations):
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        command.revert(annotations)
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self, annotations):
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        command.apply(annotations)
+        self.undo_stack.append(command)
+        return command
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
@@ -0,0 +1,135 @@
+from service.lazy_import import lazy_import
+from service.perf import timed
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+pydicom = lazy_import("pydicom")
+
+PIXEL_DATA_TAG = 0x7FE00010
+# Larger elements are not read by dcmread; only their file offset is recorded
+DEFER_SIZE = 4096
+IMAGE_EXTENSIONS = (".dcm", ".png", ".jpg", ".jpeg")  # What the file dialog offers and folder walks treat as slices
+
+
+def map_pixel_data(file_path):
+    """
+    Memory-map the pixel data of an uncompressed, single-frame grayscale DICOM.
+
+    The header is parsed with the pixel data deferred, so the file is never
+    read into memory; the returned array views the file directly. Values
+    match ds.pixel_array (masked to BitsStored, sign-extended if signed).
+
+    Returns:
+        np.ndarray: (Rows, Columns) int/uint array, or None when the file
+                    needs pydicom's decoders (compressed, big endian, multi-frame, color)
+    """
+    ds = pydicom.dcmread(file_path, defer_size=DEFER_SIZE)
+    transfer_syntax = ds.file_meta.get("TransferSyntaxUID")
+    if transfer_syntax is None or transfer_syntax.is_compressed or transfer_syntax.is_deflated \
+            or not transfer_syntax.is_little_endian:
+        return None
+    if int(getattr(ds, "SamplesPerPixel", 1)) != 1 or int(getattr(ds, "NumberOfFrames", 1) or 1) != 1:
+        return None
+    bits_allocated = int(ds.BitsAllocated)
+    if bits_allocated not in (8, 16):
+        return None
+    try:
+        element = ds.get_item(PIXEL_DATA_TAG, keep_deferred=True)
+    except TypeError:  # pydicom < 3 never loads deferred values in get_item
+        element = ds.get_item(PIXEL_DATA_TAG)
+    offset = getattr(element, "value_tell", None)
+    rows, columns = int(ds.Rows), int(ds.Columns)
+    if offset is None or element.length < rows * columns * bits_allocated // 8:
+        return None
+
+    signed = int(ds.PixelRepresentation) == 1
+    dtype = np.dtype(f"<{'i' if signed else 'u'}{bits_allocated // 8}")
+    pixels = np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=(rows, columns))
+    bits_stored = int(getattr(ds, "BitsStored", bits_allocated))
+    if bits_stored < bits_allocated:
+        if signed:
+            shift = bits_allocated - bits_stored
+            pixels = np.left_shift(pixels, shift)
+            np.right_shift(pixels, shift, out=pixels)
+        else:
+            pixels = np.bitwise_and(pixels, dtype.type((1 << bits_stored) - 1))
+    return pixels
+
+
+def load_dicom(file_path, out=None):
+    """
+    Load a DICOM slice as 8-bit grayscale, min-max normalized per slice to 0-255.
+
+    Uncompressed files are normalized straight from the memory-mapped pixel
+    data into out (allocated when None); others go through ds.pixel_array.
+    """
+    pixels = map_pixel_data(file_path)
+    if pixels is None:
+        pixels = pydicom.dcmread(file_path).pixel_array
+    return cv2.normalize(np.asarray(pixels), out, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+
+
+@timed("load_image")
+def load_image(file_path, out=None):
+    """
+    Load a DICOM or standard image file as an 8-bit image.
+
+    DICOM pixel data is min-max normalized per slice to 0-255 and stays
+    single-channel (HxW); other files are read as BGR. Use to_bgr where
+    color has to be drawn.
+
+    Args:
+        file_path (str): Image path
+        out (np.ndarray): Optional HxW uint8 buffer to decode DICOM into
+    """
+    if file_path.endswith(".dcm"):
+        img = load_dicom(file_path, out)
+    else:
+        img = cv2.imread(file_path, cv2.IMREAD_COLOR)
+    return img
+
+
+def to_bgr(image):
+    """
+    Color copy of an image for drawing annotations; grayscale is promoted to BGR.
+    """
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image.copy()
+
+
+def read_dicom_header(file_path):
+    """
+    Read a DICOM header without touching the pixel data.
+    """
+    return pydicom.dcmread(file_path, stop_before_pixels=True)
+
+
+def slice_position(ds):
+    """
+    Position of a slice along the series' normal, or None if unknown.
+
+    The ImagePositionPatient is projected onto the normal of the
+    ImageOrientationPatient plane, which orders slices regardless of the
+    patient axis the series was acquired along.
+    """
+    position = getattr(ds, "ImagePositionPatient", None)
+    orientation = getattr(ds, "ImageOrientationPatient", None)
+    if position is None:
+        return None
+    if orientation is None:
+        return float(position[2])
+    normal = np.cross(np.asarray(orientation[:3], dtype=float), np.asarray(orientation[3:], dtype=float))
+    return float(np.dot(normal, np.asarray(position, dtype=float)))
+
+
+def position_sort_key(position, instance, file_path=""):
+    """
+    Sort key ordering slices anatomically: position, then InstanceNumber, then file name.
+    """
+    return (position is None, position if position is not None else 0.0,
+            instance is None, int(instance) if instance is not None else 0, file_path)
+
+
+def slice_sort_key(ds, file_path=""):
+    return position_sort_key(slice_position(ds), getattr(ds, "InstanceNumber", None), file_path)
@@ -0,0 +1,163 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from service.history import AnnotationHistory, command_from_dict, strip_mask
+
+_CLOSE = object()
+
+
+def default_journal_path():
+    return os.path.join(os.path.expanduser("~"), ".ct_image_labeling_tool", "session.journal")
+
+
+class SessionJournal:
+    """
+    Append-only log of annotation operations for crash recovery.
+
+    append() builds the record on the calling thread and only enqueues it; a
+    background thread writes it as one JSON line and fsyncs at most once per
+    flush_interval. The writer never sees commands or annotation dicts the UI
+    may still change.
+
+    Records:
+        {"op": "base", "file": ..., "annotations": {...}}  state before the first edit
+        {"op": "do", "file": ..., "cmd": {...}}            command applied to a file
+        {"op": "undo" | "redo", "file": ...}
+        {"op": "saved", "file": ...}                       state up to here is on disk
+        {"op": "discard", "file": ...}                     forget the file's records
+        {"op": "reset"}                                    forget everything before
+    """
+    def __init__(self, path, flush_interval=0.5, batch_size=256):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.thread = threading.Thread(target=self._run, name="session-journal", daemon=True)
+        self.thread.start()
+
+
+    def append(self, op, file_path=None, command=None, annotations=None):
+        record = {"op": op}
+        if file_path is not None:
+            record["file"] = file_path
+        if command is not None:
+            record["cmd"] = command.to_dict()
+        if annotations is not None:
+            record["annotations"] = {name: {"color": data["color"], "shapes": [strip_mask(s) for s in data["shapes"]]}
+                                     for name, data in annotations.items()}
+        self.queue.put(record)
+
+
+    def close(self):
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        self.file.close()
+
+
+    def _run(self):
+        last_sync = time.monotonic()
+        dirty = False
+        closing = False
+        while not closing:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            lines = []
+            while item is not None:
+                if item is _CLOSE:
+                    closing = True
+                    break
+                lines.append(json.dumps(item, separators=(",", ":")) + "\n")
+                if len(lines) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            if lines:
+                self.file.write("".join(lines))
+                self.file.flush()
+                dirty = True
+
+            now = time.monotonic()
+            if dirty and (closing or now - last_sync >= self.flush_interval):
+                os.fsync(self.file.fileno())
+                last_sync = now
+                dirty = False
+
+
+def read_journal(path):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A crash can leave the last line half written
+                break
+    return records
+
+
+def pending_operations(records):
+    """
+    Group the records of files that have edits newer than their last save.
+
+    Returns:
+        dict: {file_path: [record, ...]} in journal order, starting with the base
+    """
+    per_file = {}
+    unsaved = set()
+    for record in records:
+        op = record["op"]
+        if op == "reset":
+            per_file.clear()
+            unsaved.clear()
+            continue
+        file_path = record["file"]
+        if op == "discard":
+            per_file.pop(file_path, None)
+            unsaved.discard(file_path)
+            continue
+        if op == "base":
+            per_file[file_path] = []
+        per_file.setdefault(file_path, []).append(record)
+        if op == "saved":
+            unsaved.discard(file_path)
+        else:
+            unsaved.add(file_path)
+    return {file_path: per_file[file_path] for file_path in per_file if file_path in unsaved}
+
+
+def replay_file(records):
+    """
+    Rebuild the annotations and undo history of one file from its records.
+
+    Returns:
+        tuple: (annotations, AnnotationHistory)
+    """
+    annotations = {}
+    history = AnnotationHistory()
+    for record in records:
+        op = record["op"]
+        if op == "base":
+            annotations = {name: {"color": tuple(data["color"]), "shapes": data["shapes"]}
+                           for name, data in record["annotations"].items()}
+            history.clear()
+        elif op == "do":
+            history.execute(command_from_dict(record["cmd"]), annotations)
+        elif op == "undo":
+            history.undo(annotations)
+        elif op == "redo":
+            history.redo(annotations)
+    return annotations, history
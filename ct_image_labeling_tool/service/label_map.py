@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+
+import cv2
+import numpy as np
+
+from service.annotation_store import STORES, create_store
+from service.image_io import IMAGE_EXTENSIONS
+from service.mask import rasterize_shape
+
+OVERLAP_POLICIES = ("last", "first", "max")
+
+
+def label_map_dtype(label_to_index):
+    return np.uint8 if max(label_to_index.values(), default=0) < 256 else np.uint16
+
+
+def frame_size_of(label_data):
+    for annotation in label_data.get("annotations", []):
+        if annotation.get("orig_size"):
+            return tuple(annotation["orig_size"])
+    return None
+
+
+def build_label_map(label_data, label_to_index, image_size=None, overlap="last"):
+    """
+    Composite all shapes of one slice into a single class-index image.
+
+    Each shape is rasterized from its geometry into its bounding box and
+    written straight into the label map, so no per-shape full-frame mask or
+    PNG decode is involved. 0 is background; labels missing from
+    label_to_index are skipped.
+
+    Args:
+        label_data (dict): Saved label layout (coordinates in image pixels)
+        label_to_index (dict): {label name: class index (1..65535)}
+        image_size (tuple): (width, height); defaults to the annotations' orig_size
+        overlap (str): Where shapes overlap, "last" drawn wins, "first" drawn wins,
+                       or "max" keeps the highest class index
+
+    Returns:
+        np.ndarray: HxW uint8 (uint16 if any index exceeds 255)
+    """
+    if overlap not in OVERLAP_POLICIES:
+        raise ValueError(f"Unknown overlap policy '{overlap}'. Choose from: {', '.join(OVERLAP_POLICIES)}")
+    image_size = image_size or frame_size_of(label_data)
+    if image_size is None:
+        raise ValueError("Image size is unknown; pass image_size explicitly.")
+
+    dtype = label_map_dtype(label_to_index)
+    label_map = np.zeros((image_size[1], image_size[0]), dtype=dtype)
+    for annotation in label_data.get("annotations", []):
+        index = label_to_index.get(annotation["name"])
+        if index is None:
+            continue
+        mask = rasterize_shape(annotation, image_size)
+        if mask.is_empty():
+            continue
+        x, y, w, h = mask.bbox
+        window = label_map[y:y + h, x:x + w]
+        inside = mask.window()
+        if overlap == "first":
+            inside &= window == 0
+        elif overlap == "max":
+            inside &= window < index
+        window[inside] = index
+    return label_map
+
+
+def one_hot(label_map, num_classes):
+    """
+    Stack a label map into (num_classes + 1, H, W) uint8 channels; channel 0 is background.
+    """
+    return (label_map[np.newaxis] == np.arange(num_classes + 1, dtype=label_map.dtype)[:, np.newaxis, np.newaxis]).astype(np.uint8)
+
+
+def load_label_mapping(mapping_file=None, labels=None):
+    """
+    Read {label: index} from a JSON file, or number a comma-separated list from 1.
+    """
+    if mapping_file:
+        with open(mapping_file, "r") as file:
+            return {name: int(index) for name, index in json.load(file).items()}
+    names = [name.strip() for name in labels.split(",") if name.strip()]
+    return {name: i + 1 for i, name in enumerate(names)}
+
+
+def export_label_maps(image_dir, out_dir, label_to_index, store=None, overlap="last", write_one_hot=False):
+    """
+    Write one label-map PNG (and optionally a one-hot .npy) per annotated image.
+
+    Returns:
+        int: Number of slices exported
+    """
+    store = store or create_store("json")
+    if os.path.abspath(out_dir) == os.path.abspath(image_dir):
+        # Label maps are named <stem>.png and would overwrite PNG slices
+        raise ValueError("out_dir must differ from image_dir.")
+    os.makedirs(out_dir, exist_ok=True)
+    num_classes = max(label_to_index.values(), default=0)
+    count = 0
+    for file_name in sorted(os.listdir(image_dir)):
+        image_path = os.path.join(image_dir, file_name)
+        # Sidecars (x.json, x.npz) resolve to their slice's annotations too
+        if not file_name.lower().endswith(IMAGE_EXTENSIONS) or os.path.isdir(image_path) or not store.exists(image_path):
+            continue
+        label_data = store.load(image_path, include_masks=False)
+        label_map = build_label_map(label_data, label_to_index, overlap=overlap)
+        stem = os.path.splitext(file_name)[0]
+        cv2.imwrite(os.path.join(out_dir, stem + ".png"), label_map)
+        if write_one_hot:
+            np.save(os.path.join(out_dir, stem + ".npy"), one_hot(label_map, num_classes))
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export per-slice class-index label maps for training.")
+    parser.add_argument("image_dir")
+    parser.add_argument("out_dir")
+    mapping = parser.add_mutually_exclusive_group(required=True)
+    mapping.add_argument("--mapping", help='JSON file like {"psoas": 1, "vertebra": 2}')
+    mapping.add_argument("--labels", help="Comma-separated label names, numbered from 1 in order")
+    parser.add_argument("--overlap", choices=OVERLAP_POLICIES, default="last")
+    parser.add_argument("--one-hot", action="store_true", help="Also write a stacked one-hot .npy per slice")
+    parser.add_argument("--store", choices=sorted(STORES), default="json")
+    args = parser.parse_args()
+
+    label_to_index = load_label_mapping(args.mapping, args.labels)
+    count = export_label_maps(args.image_dir, args.out_dir, label_to_index, create_store(args.store),
+                              args.overlap, args.one_hot)
+    print(f"Exported {count} label map(s) to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import sys
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is only imported on first attribute access.
+
+    Attributes looked up through the proxy are cached on it, so after the
+    first use `cv2.resize` costs the same as with a plain `import cv2`.
+    """
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            # Through __import__ (not importlib) so import hooks such as the startup profiler see it
+            __import__(self.__dict__["_name"])
+            module = sys.modules[self.__dict__["_name"]]
+            self.__dict__["_module"] = module
+        return module
+
+
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        self.__dict__[attr] = value
+        return value
+
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    Return the module if it is already imported, otherwise a LazyModule for it.
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
@@ -0,0 +1,250 @@
+import base64
+from functools import lru_cache
+
+from service.lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+
+@lru_cache(maxsize=None)
+def _popcount_table():
+    return np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class PackedMask:
+    """
+    Binary mask kept as np.packbits rows of its bounding box.
+
+    The box starts on a byte boundary (x is a multiple of 8), so two masks of
+    the same frame line up byte for byte and union/intersection are plain
+    bitwise ops on the packed rows. A 40x40 structure on a 512x512 slice
+    takes ~250 bytes instead of 256 KB.
+
+    Attributes:
+        frame_size (tuple): (width, height) of the full image
+        x, y (int): top-left corner of the box in the frame
+        bits (np.ndarray): uint8 (rows, bytes per row), bit 7 of byte 0 is column x
+    """
+    def __init__(self, frame_size, x, y, bits):
+        self.frame_size = tuple(frame_size)
+        self.x = x
+        self.y = y
+        self.bits = bits
+
+
+    @classmethod
+    def empty(cls, frame_size):
+        return cls(frame_size, 0, 0, np.zeros((0, 0), dtype=np.uint8))
+
+
+    @classmethod
+    def from_array(cls, mask, offset=(0, 0), frame_size=None):
+        """
+        Pack a mask array (nonzero = inside), optionally a window of the frame.
+
+        Args:
+            mask (np.ndarray): HxW array, full frame or a window of it
+            offset (tuple): (x, y) of the window's top-left corner in the frame
+            frame_size (tuple): (width, height) of the frame; defaults to the mask size
+        """
+        if frame_size is None:
+            frame_size = (mask.shape[1], mask.shape[0])
+        rows = np.flatnonzero(mask.any(axis=1))
+        if len(rows) == 0:
+            return cls.empty(frame_size)
+        cols = np.flatnonzero(mask.any(axis=0))
+        x0 = (offset[0] + cols[0]) // 8 * 8
+        local_x0 = x0 - offset[0]
+        window = mask[rows[0]:rows[-1] + 1, max(local_x0, 0):cols[-1] + 1] != 0
+        if local_x0 < 0:
+            window = np.pad(window, ((0, 0), (-local_x0, 0)))
+        return cls(frame_size, x0, offset[1] + rows[0], np.packbits(window, axis=1))
+
+
+    @classmethod
+    def from_base64_png(cls, mask_base64, frame_size=None):
+        mask = cv2.imdecode(np.frombuffer(base64.b64decode(mask_base64), np.uint8), cv2.IMREAD_GRAYSCALE)
+        if mask is None:
+            return None
+        if frame_size is not None and (mask.shape[1], mask.shape[0]) != tuple(frame_size):
+            mask = cv2.resize(mask, tuple(frame_size))
+        return cls.from_array(mask)
+
+
+    @property
+    def height(self):
+        return self.bits.shape[0]
+
+
+    @property
+    def width(self):
+        """Box width in pixels, clipped to the frame."""
+        if self.bits.size == 0:
+            return 0
+        return min(self.bits.shape[1] * 8, self.frame_size[0] - self.x)
+
+
+    @property
+    def bbox(self):
+        """(x, y, width, height) of the packed box."""
+        return (self.x, self.y, self.width, self.height)
+
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+
+    def area(self):
+        return int(_popcount_table()[self.bits].sum(dtype=np.int64))
+
+
+    def is_empty(self):
+        return self.bits.size == 0 or not self.bits.any()
+
+
+    def window(self):
+        """Unpacked box as a bool array of shape (height, width)."""
+        return np.unpackbits(self.bits, axis=1, count=self.width).astype(bool)
+
+
+    def to_array(self):
+        """Expand to a full-frame uint8 mask (0/255)."""
+        frame_w, frame_h = self.frame_size
+        mask = np.zeros((frame_h, frame_w), dtype=np.uint8)
+        if self.bits.size:
+            mask[self.y:self.y + self.height, self.x:self.x + self.width] = self.window() * np.uint8(255)
+        return mask
+
+
+    def to_base64_png(self, compression=None):
+        params = [cv2.IMWRITE_PNG_COMPRESSION, compression] if compression is not None else []
+        _, buffer = cv2.imencode(".png", self.to_array(), params)
+        return base64.b64encode(buffer).decode("utf-8")
+
+
+    def _combine(self, other, op, union):
+        if self.frame_size != other.frame_size:
+            raise ValueError("Masks belong to frames of different sizes")
+        if self.bits.size == 0 or other.bits.size == 0:
+            if not union:
+                return PackedMask.empty(self.frame_size)
+            return other if self.bits.size == 0 else self
+
+        boxes = [(m.y, m.y + m.height, m.x // 8, m.x // 8 + m.bits.shape[1]) for m in (self, other)]
+        if union:
+            y0, y1 = min(b[0] for b in boxes), max(b[1] for b in boxes)
+            c0, c1 = min(b[2] for b in boxes), max(b[3] for b in boxes)
+        else:
+            y0, y1 = max(b[0] for b in boxes), min(b[1] for b in boxes)
+            c0, c1 = max(b[2] for b in boxes), min(b[3] for b in boxes)
+            if y0 >= y1 or c0 >= c1:
+                return PackedMask.empty(self.frame_size)
+
+        result = np.zeros((y1 - y0, c1 - c0), dtype=np.uint8)
+        if union:
+            for m, (my0, my1, mc0, mc1) in zip((self, other), boxes):
+                result[my0 - y0:my1 - y0, mc0 - c0:mc1 - c0] |= m.bits
+        else:
+            a, b = (m.bits[y0 - by0:y1 - by0, c0 - bc0:c1 - bc0]
+                    for m, (by0, _, bc0, _) in zip((self, other), boxes))
+            result = op(a, b)
+        return PackedMask(self.frame_size, c0 * 8, y0, result)
+
+
+    def union(self, other):
+        return self._combine(other, np.bitwise_or, union=True)
+
+
+    def intersection(self, other):
+        return self._combine(other, np.bitwise_and, union=False)
+
+
+    def overlay(self, image, color, alpha=0.3):
+        """
+        Add alpha * color to the masked pixels of image, in place.
+
+        Same result as cv2.addWeighted(image, 1.0, colored_mask, alpha, 0),
+        but only the pixels inside the box are touched.
+        """
+        if self.bits.size == 0:
+            return image
+        region = image[self.y:self.y + self.height, self.x:self.x + self.width]
+        inside = self.window()
+        tint = np.asarray(color, dtype=np.float32) * alpha
+        region[inside] = np.clip(np.rint(region[inside].astype(np.float32) + tint), 0, 255).astype(image.dtype)
+        return image
+
+
+def _window(x0, y0, x1, y1, frame_size):
+    """Clip an inclusive pixel box to the frame; None if it falls outside."""
+    frame_w, frame_h = frame_size
+    x0, y0 = max(int(x0), 0), max(int(y0), 0)
+    x1, y1 = min(int(x1), frame_w - 1), min(int(y1), frame_h - 1)
+    if x0 > x1 or y0 > y1:
+        return None
+    return x0, y0, x1 - x0 + 1, y1 - y0 + 1
+
+
+def rasterize_polygon(points, frame_size):
+    """
+    Fill a polygon into its bounding box only.
+
+    Bit-exact with cv2.fillPoly on a full-frame buffer.
+    """
+    pts = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+    if len(pts) == 0:
+        return PackedMask.empty(frame_size)
+    box = _window(pts[:, 0].min(), pts[:, 1].min(), pts[:, 0].max(), pts[:, 1].max(), frame_size)
+    if box is None:
+        return PackedMask.empty(frame_size)
+    x, y, w, h = box
+    window = np.zeros((h, w), dtype=np.uint8)
+    cv2.fillPoly(window, [pts], color=255, offset=(-x, -y))
+    return PackedMask.from_array(window, offset=(x, y), frame_size=frame_size)
+
+
+def rasterize_ellipse(center, axes, angle, frame_size):
+    """
+    Fill an ellipse into its bounding box only.
+
+    Center and axes are truncated to int as the saved masks always were, so
+    the result is bit-exact with cv2.ellipse(..., thickness=-1) on a
+    full-frame buffer.
+    """
+    cx, cy = int(center[0]), int(center[1])
+    a, b = abs(int(axes[0])), abs(int(axes[1]))
+    theta = np.radians(angle)
+    # Axis-aligned half extents of the rotated ellipse, plus a margin for rounding
+    half_w = int(np.ceil(np.hypot(a * np.cos(theta), b * np.sin(theta)))) + 2
+    half_h = int(np.ceil(np.hypot(a * np.sin(theta), b * np.cos(theta)))) + 2
+    box = _window(cx - half_w, cy - half_h, cx + half_w, cy + half_h, frame_size)
+    if box is None:
+        return PackedMask.empty(frame_size)
+    x, y, w, h = box
+    window = np.zeros((h, w), dtype=np.uint8)
+    cv2.ellipse(window, (cx - x, cy - y), (a, b), angle, 0, 360, 255, -1)
+    return PackedMask.from_array(window, offset=(x, y), frame_size=frame_size)
+
+
+def ellipse_from_points(points):
+    """Center/axes of a legacy ellipse stored as two corner points."""
+    center = ((points[0][0] + points[1][0]) / 2, (points[0][1] + points[1][1]) / 2)
+    axes = (abs(points[1][0] - points[0][0]) / 2, abs(points[1][1] - points[0][1]) / 2)
+    return center, axes
+
+
+def rasterize_shape(shape_data, frame_size):
+    """
+    Rasterize a shape whose coordinates are already in frame pixels.
+    """
+    if shape_data["shape"] == "ellipse":
+        if "center" in shape_data:
+            return rasterize_ellipse(shape_data["center"], shape_data["axes"], shape_data["angle"], frame_size)
+        points = shape_data.get("points", [])
+        if not points:
+            return PackedMask.empty(frame_size)
+        center, axes = ellipse_from_points(points)
+        return rasterize_ellipse(center, axes, 0, frame_size)
+    return rasterize_polygon(shape_data.get("points", []), frame_size)
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from service.annotation_io import annotation_mask
+from service.annotation_store import STORES, create_store
+from service.image_io import IMAGE_EXTENSIONS
+from service.mask import PackedMask, rasterize_shape
+
+MATCH = "match"
+MISMATCH = "mismatch"
+NOT_STORED = "not stored"
+UNDECODABLE = "undecodable"
+
+
+def check_annotation(annotation, frame_size=None):
+    """
+    Compare an annotation's stored mask with the one rebuilt from its geometry.
+
+    Returns:
+        tuple: (status, number of differing pixels)
+    """
+    mask = annotation.get("mask")
+    if not isinstance(mask, (str, PackedMask)):
+        return NOT_STORED, 0
+    stored = mask if isinstance(mask, PackedMask) else PackedMask.from_base64_png(mask)
+    if stored is None:
+        return UNDECODABLE, 0
+    frame_size = tuple(frame_size or annotation.get("orig_size") or stored.frame_size)
+    if stored.frame_size != frame_size:
+        return MISMATCH, frame_size[0] * frame_size[1]
+    rebuilt = rasterize_shape(annotation, frame_size)
+    differing = int(np.count_nonzero(stored.to_array() != rebuilt.to_array()))
+    return (MATCH if differing == 0 else MISMATCH), differing
+
+
+def check_label_data(label_data, frame_size=None):
+    """
+    Returns:
+        list: [(index, name, shape, status, differing pixels)] per annotation
+    """
+    return [(i, annotation["name"], annotation["shape"]) + check_annotation(annotation, frame_size)
+            for i, annotation in enumerate(label_data.get("annotations", []))]
+
+
+def strip_masks(label_data):
+    """Copy of label data without mask payloads (geometry-only layout)."""
+    return dict(label_data, annotations=[{key: value for key, value in annotation.items() if key != "mask"}
+                                         for annotation in label_data.get("annotations", [])])
+
+
+def add_masks(label_data):
+    """Copy of label data with a mask for every annotation, rebuilt from geometry where missing."""
+    annotations = []
+    for annotation in label_data.get("annotations", []):
+        if not isinstance(annotation.get("mask"), (str, PackedMask)) and annotation.get("orig_size"):
+            # Every store saves a PackedMask; JSON and SQLite encode it as a PNG
+            annotation = dict(annotation, mask=annotation_mask(annotation))
+        annotations.append(annotation)
+    return dict(label_data, annotations=annotations)
+
+
+def check_folder(image_dir, store=None, strip=False, add=False, verbose=False):
+    """
+    Check every annotated image of a folder.
+
+    With strip, files whose stored masks all match their geometry are
+    rewritten without masks; files with any mismatch are left alone. With
+    add, geometry-only files get their masks written back.
+
+    Returns:
+        dict: Counts per status, plus "files", "mismatched_files" and "rewritten"
+    """
+    store = store or create_store("json")
+    totals = {MATCH: 0, MISMATCH: 0, NOT_STORED: 0, UNDECODABLE: 0, "files": 0, "mismatched_files": 0, "rewritten": 0}
+    for file_name in sorted(os.listdir(image_dir)):
+        image_path = os.path.join(image_dir, file_name)
+        if not file_name.lower().endswith(IMAGE_EXTENSIONS) or not store.exists(image_path):
+            continue
+        label_data = store.load(image_path, include_masks=True)
+        if label_data is None:
+            continue
+        results = check_label_data(label_data)
+        totals["files"] += 1
+        for _, _, _, status, _ in results:
+            totals[status] += 1
+        bad = [result for result in results if result[3] in (MISMATCH, UNDECODABLE)]
+        if bad:
+            totals["mismatched_files"] += 1
+        for index, name, shape, status, differing in results:
+            if status in (MISMATCH, UNDECODABLE) or verbose:
+                print(f"{file_name}\t#{index} {name} ({shape})\t{status}" + (f", {differing} px" if differing else ""))
+
+        if strip and not bad and any(result[3] == MATCH for result in results):
+            store.save(image_path, strip_masks(label_data))
+            totals["rewritten"] += 1
+        elif add and any(result[3] == NOT_STORED for result in results):
+            store.save(image_path, add_masks(label_data))
+            totals["rewritten"] += 1
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that stored masks equal the masks rebuilt from shape geometry.")
+    parser.add_argument("image_dir")
+    parser.add_argument("--store", choices=sorted(STORES), default="json")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--strip", action="store_true",
+                        help="Rewrite files whose masks all match without masks (geometry-only)")
+    action.add_argument("--add-masks", action="store_true",
+                        help="Write rebuilt masks into geometry-only files, for tools that need them")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List every annotation, not only mismatches")
+    args = parser.parse_args()
+
+    totals = check_folder(args.image_dir, create_store(args.store), args.strip, args.add_masks, args.verbose)
+    print(f"Checked {totals['files']} file(s): {totals[MATCH]} mask(s) match, {totals[MISMATCH]} mismatch, "
+          f"{totals[UNDECODABLE]} undecodable, {totals[NOT_STORED]} not stored")
+    if args.strip or args.add_masks:
+        print(f"Rewrote {totals['rewritten']} file(s)")
+    sys.exit(1 if totals["mismatched_files"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+FRAME = "frame"
+
+
+def default_stats_path():
+    return os.path.join(os.path.expanduser("~"), ".ct_image_labeling_tool",
+                        time.strftime("perf-%Y%m%d-%H%M%S.json"))
+
+
+class TimingStat:
+    """
+    Running totals of one timed operation plus a ring buffer of recent samples.
+    """
+    def __init__(self, ring_size):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.recent = deque(maxlen=ring_size)  # (finished at, seconds)
+
+
+    def add(self, seconds, finished_at):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.recent.append((finished_at, seconds))
+
+
+    def summary(self):
+        recent = sorted(seconds for _, seconds in self.recent)
+
+        def percentile(q):
+            return recent[min(int(q * len(recent)), len(recent) - 1)] * 1000 if recent else 0.0
+
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "min_ms": self.min * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "recent_p50_ms": percentile(0.5),
+            "recent_p95_ms": percentile(0.95),
+        }
+
+
+class PerfRecorder:
+    """
+    Timers and counters for the hot paths of the app, off unless enabled.
+
+    Functions decorated with @timed cost one attribute check while disabled.
+    Timed functions that render the center panel are marked frame=True; the
+    outermost one per UI event is also recorded as a "frame", which feeds
+    the frame-time/FPS overlay through the on_frame callbacks.
+    """
+    def __init__(self, ring_size=1000):
+        self.enabled = False
+        self.ring_size = ring_size
+        self.stats = {}
+        self.counters = {}
+        self.on_frame = []  # Callbacks (frame seconds), called on the recording thread
+        self.lock = threading.Lock()
+        self.local = threading.local()  # Frame nesting depth per thread
+        self.started_at = time.time()
+
+
+    def enable(self):
+        self.enabled = True
+
+
+    def disable(self):
+        """Stop timing; what was recorded so far is kept."""
+        self.enabled = False
+
+
+    def record(self, name, seconds):
+        now = time.perf_counter()
+        with self.lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = TimingStat(self.ring_size)
+            stat.add(seconds, now)
+
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+
+    def timed(self, name, frame=False):
+        """
+        Decorator recording each call's duration under name.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                depth = getattr(self.local, "frame_depth", 0)
+                if frame:
+                    self.local.frame_depth = depth + 1
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    seconds = time.perf_counter() - start
+                    self.record(name, seconds)
+                    if frame:
+                        self.local.frame_depth = depth
+                        if depth == 0:
+                            self.record(FRAME, seconds)
+                            for callback in self.on_frame:
+                                callback(seconds)
+            return wrapper
+        return decorator
+
+
+    def fps(self, window=1.0):
+        """Frames finished during the last `window` seconds, per second."""
+        stat = self.stats.get(FRAME)
+        if stat is None:
+            return 0.0
+        now = time.perf_counter()
+        with self.lock:
+            frames = sum(1 for finished_at, _ in stat.recent if now - finished_at <= window)
+        return frames / window
+
+
+    def summary(self):
+        with self.lock:
+            return {
+                "stats": {name: stat.summary() for name, stat in sorted(self.stats.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+    def export(self, path):
+        """
+        Write the summary and the recent samples (ms) of every timer as JSON.
+        """
+        data = self.summary()
+        data["started_at"] = self.started_at
+        data["ended_at"] = time.time()
+        with self.lock:
+            data["recent_ms"] = {name: [round(seconds * 1000, 3) for _, seconds in stat.recent]
+                                 for name, stat in sorted(self.stats.items())}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(data, file, indent=4)
+
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"[PERF] {'operation':<28}{'count':>8}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        for name, stat in summary["stats"].items():
+            print(f"[PERF] {name:<28}{stat['count']:>8}{stat['mean_ms']:>10.2f}"
+                  f"{stat['recent_p95_ms']:>10.2f}{stat['max_ms']:>10.2f}")
+        for name, value in summary["counters"].items():
+            print(f"[PERF] {name:<28}{value:>8}")
+
+
+PERF = PerfRecorder()
+timed = PERF.timed
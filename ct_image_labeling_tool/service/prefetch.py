@@ -0,0 +1,79 @@
+PREFETCH_AHEAD = 3  # Slices kept decoded in the direction of travel
+PREFETCH_AHEAD_MAX = 8  # Lookahead while stepping steadily one way, e.g. holding an arrow key
+PREFETCH_BEHIND = 1  # Slices kept decoded against it, for stepping back
+
+
+class SlicePrefetcher:
+    """
+    Keeps the slices the user is likely to open next decoded in a DecodeCache.
+
+    The direction is learned from the steps between opened slices: a run of
+    steps the same way extends the lookahead, a step back reverses it, and a
+    jump (e.g. a click further down the list) makes the next slices on both
+    sides equally likely again. Keyboard navigation passes its direction
+    explicitly, as coalesced key repeats arrive as steps of more than one.
+    Queued decodes that fall out of the window are cancelled, so a reversal
+    does not wait behind slices it walked away from.
+    """
+    def __init__(self, cache, ahead=PREFETCH_AHEAD, ahead_max=PREFETCH_AHEAD_MAX, behind=PREFETCH_BEHIND):
+        self.cache = cache
+        self.ahead = ahead
+        self.ahead_max = ahead_max
+        self.behind = behind
+        self.last_index = None
+        self.direction = 0  # +1 down the list, -1 up, 0 unknown
+        self.streak = 0  # Consecutive steps in direction
+
+
+    def reset(self):
+        self.last_index = None
+        self.direction = 0
+        self.streak = 0
+
+
+    def observe(self, index, direction=None):
+        """
+        Update the learned direction with a newly opened slice.
+
+        Args:
+            index (int): Slice just opened
+            direction (int): +1 or -1 if the user navigated that way, None to infer it
+        """
+        if self.last_index is not None:
+            step = index - self.last_index
+            if direction is not None and step != 0:
+                step = direction
+            if step in (1, -1):
+                self.streak = self.streak + 1 if step == self.direction else 1
+                self.direction = step
+            elif step != 0:
+                self.direction = 0
+                self.streak = 0
+        self.last_index = index
+
+
+    def window(self, index, count):
+        """
+        Indices to keep decoded around index, most likely first.
+
+        Args:
+            index (int): Slice just opened
+            count (int): Number of slices in the list
+        """
+        if self.direction == 0:
+            offsets = [offset for step in range(1, self.ahead + 1) for offset in (step, -step)]
+        else:
+            ahead = min(self.ahead + self.streak - 1, self.ahead_max)
+            offsets = [self.direction * step for step in range(1, ahead + 1)]
+            offsets += [-self.direction * step for step in range(1, self.behind + 1)]
+        return [index + offset for offset in offsets if 0 <= index + offset < count]
+
+
+    def visit(self, file_list, index, direction=None):
+        """
+        Record that file_list[index] was opened and queue the slices around it.
+        """
+        self.observe(index, direction)
+        paths = [file_list[i] for i in self.window(index, len(file_list))]
+        self.cache.cancel(keep=paths)
+        self.cache.request(paths)
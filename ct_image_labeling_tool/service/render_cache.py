@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from service.lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 1 << 30
+EVICT_TO = 0.9  # Eviction frees down to this fraction of max_bytes, so it doesn't run on every put
+PNG_COMPRESSION = 1  # Fast zlib level; entries are written far more often than they are shipped
+MAX_DIGESTS = 100_000  # Memoized file digests kept; the most recently computed survive
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".ct_image_labeling_tool", "render_cache")
+
+
+def make_key(*parts):
+    """
+    Content key: SHA-256 of the JSON form of parts (digests, geometry, render parameters).
+    """
+    payload = json.dumps([CACHE_VERSION, parts], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def label_fingerprint(label_data, include_masks=False):
+    """
+    Digest of a slice's label data: names, colors and geometry, plus mask
+    payloads when the render draws them. None for an unannotated slice.
+    """
+    if not label_data:
+        return None
+    annotations = label_data.get("annotations", [])
+    if not include_masks:
+        annotations = [{key: value for key, value in annotation.items() if key != "mask"} for annotation in annotations]
+    return make_key(annotations)
+
+
+class RenderCache:
+    """
+    Disk cache of rendered overlays and thumbnails, addressed by content.
+
+    Entries are PNG files under objects/, named by a key that hashes every
+    input of the render (see make_key), so a changed image, label or setting
+    simply misses. An SQLite index (WAL mode) holds entry sizes and last
+    access times for LRU eviction once the total passes max_bytes, and
+    memoizes file digests by path, size and mtime (pruned to MAX_DIGESTS,
+    and of files that are gone or changed on eviction). Files are written to a
+    temporary name and renamed, and index updates run in IMMEDIATE
+    transactions, so any number of processes can share one cache.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed);
+        CREATE TABLE IF NOT EXISTS totals (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            bytes INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO totals (id, bytes) VALUES (0, 0);
+        CREATE TABLE IF NOT EXISTS digests (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            digest TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.conn = None
+        self.pid = None
+
+
+    def __getstate__(self):
+        # Worker processes open their own connection
+        return {"cache_dir": self.cache_dir, "max_bytes": self.max_bytes, "conn": None, "pid": None}
+
+
+    def connect(self):
+        if self.conn is None or self.pid != os.getpid():
+            os.makedirs(os.path.join(self.cache_dir, "objects"), exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self.conn, self.pid = conn, os.getpid()
+        return self.conn
+
+
+    def close(self):
+        if self.conn is not None and self.pid == os.getpid():
+            self.conn.close()
+        self.conn = None
+
+
+    def object_path(self, key):
+        return os.path.join(self.cache_dir, "objects", key[:2], key + ".png")
+
+
+    def file_digest(self, path):
+        """
+        SHA-256 of a file's bytes, re-read only when its size or mtime changed.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        conn = self.connect()
+        row = conn.execute("SELECT size, mtime_ns, digest FROM digests WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        conn.execute("INSERT OR REPLACE INTO digests (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                     (path, stat.st_size, stat.st_mtime_ns, digest))
+        # A replaced row gets a new rowid, so the lowest rowids are the oldest digests
+        conn.execute("DELETE FROM digests WHERE rowid <= (SELECT MAX(rowid) FROM digests) - ?", (MAX_DIGESTS,))
+        return digest
+
+
+    def prune_digests(self):
+        """
+        Drop memoized digests of files that no longer exist or have changed since.
+
+        Returns:
+            int: Number of digests removed
+        """
+        conn = self.connect()
+        stale = []
+        for path, size, mtime_ns in conn.execute("SELECT path, size, mtime_ns FROM digests").fetchall():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stale.append((path,))
+                continue
+            if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                stale.append((path,))
+        conn.executemany("DELETE FROM digests WHERE path = ?", stale)
+        return len(stale)
+
+
+    def get_bytes(self, key):
+        """
+        Returns:
+            bytes: The cached PNG, or None on a miss
+        """
+        conn = self.connect()
+        try:
+            with open(self.object_path(key), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            # Never stored, or evicted by another process; drop any stale row
+            if conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                self._forget(key)
+            return None
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return data
+
+
+    def get_image(self, key):
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+    def put_bytes(self, key, data):
+        path = self.object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO entries (key, size, accessed) VALUES (?, ?, ?)",
+                         (key, len(data), time.time()))
+            conn.execute("UPDATE totals SET bytes = bytes + ? WHERE id = 0", (len(data) - (row[0] if row else 0),))
+            total = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if total > self.max_bytes:
+            self.evict()
+
+
+    def put_image(self, key, image):
+        """
+        Store an image (encoded as PNG).
+
+        Returns:
+            bytes: The encoded PNG, for callers that also write it elsewhere
+        """
+        ok, encoded = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+        if not ok:
+            raise ValueError("Could not encode image for the render cache.")
+        data = encoded.tobytes()
+        self.put_bytes(key, data)
+        return data
+
+
+    def _forget(self, key):
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                conn.execute("UPDATE totals SET bytes = bytes - ? WHERE id = 0", (row[0],))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+    def evict(self, max_bytes=None):
+        """
+        Remove least recently used entries until the cache is below
+        EVICT_TO of max_bytes, and prune stale file digests.
+
+        Returns:
+            int: Number of entries removed
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            total = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+            target = int(max_bytes * EVICT_TO)
+            victims = []
+            if total > max_bytes:
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                    if total <= target:
+                        break
+                    victims.append(key)
+                    total -= size
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in victims])
+            conn.execute("UPDATE totals SET bytes = ? WHERE id = 0", (total,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for key in victims:
+            try:
+                os.remove(self.object_path(key))
+            except FileNotFoundError:
+                pass
+        self.prune_digests()
+        return len(victims)
+
+
+    def clear(self):
+        removed = self.evict(max_bytes=-1)
+        self.connect().execute("DELETE FROM digests")
+        return removed
+
+
+    def stats(self):
+        conn = self.connect()
+        entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or empty the render cache.")
+    parser.add_argument("command", choices=["stats", "clear", "evict"])
+    parser.add_argument("--cache-dir", help=f"Cache folder (default: {default_cache_dir()})")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / (1 << 20),
+                        help="Size limit used by 'evict'")
+    args = parser.parse_args()
+
+    cache = RenderCache(args.cache_dir, int(args.max_mb * (1 << 20)))
+    if args.command == "clear":
+        print(f"Removed {cache.clear()} cache entries from {cache.cache_dir}")
+    elif args.command == "evict":
+        print(f"Removed {cache.evict()} cache entries from {cache.cache_dir}")
+    else:
+        stats = cache.stats()
+        print(f"{cache.cache_dir}: {stats['entries']} entries, {stats['bytes'] / (1 << 20):.1f} MB "
+              f"(limit {stats['max_bytes'] / (1 << 20):.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
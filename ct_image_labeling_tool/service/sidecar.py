@@ -0,0 +1,184 @@
+import argparse
+import base64
+import json
+import os
+
+from service.annotation_io import MASK_PLACEHOLDER, read_label_data, write_label_data
+from service.lazy_import import lazy_import
+from service.mask import PackedMask
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+FORMAT_NAME = "ct-image-labeling-tool/labels"
+FORMAT_VERSION = 1
+SIDECAR_EXT = ".npz"
+
+
+def decode_mask(mask_base64):
+    """Grayscale mask of a base64 PNG, or None if it cannot be decoded."""
+    try:
+        mask_array = np.frombuffer(base64.b64decode(mask_base64), np.uint8)
+    except ValueError:
+        return None
+    if not len(mask_array):
+        return None
+    return cv2.imdecode(mask_array, cv2.IMREAD_GRAYSCALE)
+
+
+def save_sidecar(npz_file, label_data):
+    """
+    Write label data as a compressed .npz bundle.
+
+    Masks may be PackedMask (as build_label_data(packed_masks=True) makes
+    them), stored from their box without expanding to the frame, or base64
+    PNGs, which are decoded first.
+
+    Layout (version 1):
+        format, version     header identifying the bundle
+        meta                UTF-8 JSON: file_path and per-annotation name/shape/color/orig_size
+        contours            float32 (K, 2) points of all annotations, concatenated
+        contour_offsets     int64 (N + 1) slice of `contours` per annotation
+        ellipses            float64 (N, 5) center x/y, axes a/b, angle (NaN if not center form)
+        mask_bits           uint8, np.packbits of each bbox-cropped mask, concatenated
+        mask_offsets        int64 (N + 1) slice of `mask_bits` per annotation
+        mask_boxes          int32 (N, 6) x, y, w, h of the crop and full frame w, h; -1 if no mask
+    """
+    annotations = label_data.get("annotations", [])
+    meta = {"file_path": label_data.get("file_path", []), "annotations": []}
+    contours = []
+    contour_offsets = [0]
+    ellipses = np.full((len(annotations), 5), np.nan, dtype=np.float64)
+    mask_bits = []
+    mask_offsets = [0]
+    mask_boxes = np.full((len(annotations), 6), -1, dtype=np.int32)
+
+    for i, annotation in enumerate(annotations):
+        entry = {key: annotation[key] for key in ("name", "shape", "color", "orig_size") if key in annotation}
+        points = annotation.get("points")
+        if "center" in annotation:
+            ellipses[i] = (*annotation["center"], *annotation["axes"], annotation["angle"])
+        if points is not None:
+            entry["integer_points"] = all(isinstance(v, int) for pt in points for v in pt)
+            contours.append(np.asarray(points, dtype=np.float32).reshape(-1, 2))
+        contour_offsets.append(contour_offsets[-1] + (len(points) if points is not None else 0))
+
+        mask = annotation.get("mask")
+        if isinstance(mask, str):
+            mask_image = decode_mask(mask)
+            if mask_image is None:
+                # Stored as no mask, so it is rebuilt from the geometry like a geometry-only save
+                print(f"[ERROR] Failed to decode mask of '{annotation.get('name')}'; saving it without a mask.")
+                mask = None
+            else:
+                mask = PackedMask.from_array(mask_image)
+        if isinstance(mask, PackedMask):
+            # The byte-aligned PackedMask box; loading only needs it to cover the mask
+            bits = np.packbits(mask.window())
+            mask_boxes[i] = (*mask.bbox, *mask.frame_size)
+            mask_bits.append(bits)
+            mask_offsets.append(mask_offsets[-1] + len(bits))
+        else:
+            mask_offsets.append(mask_offsets[-1])
+        meta["annotations"].append(entry)
+
+    np.savez_compressed(
+        npz_file,
+        format=np.array(FORMAT_NAME),
+        version=np.array(FORMAT_VERSION, dtype=np.int32),
+        meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+        contours=np.concatenate(contours) if contours else np.zeros((0, 2), dtype=np.float32),
+        contour_offsets=np.asarray(contour_offsets, dtype=np.int64),
+        ellipses=ellipses,
+        mask_bits=np.concatenate(mask_bits) if mask_bits else np.zeros(0, dtype=np.uint8),
+        mask_offsets=np.asarray(mask_offsets, dtype=np.int64),
+        mask_boxes=mask_boxes,
+    )
+
+
+def load_sidecar(npz_file, include_masks=True):
+    """
+    Read a .npz bundle back into the saved JSON layout.
+
+    Masks come back as PackedMask, unpacked from their box only (JSON writers
+    encode them as PNGs); with include_masks=False they are not read and
+    each present mask is MASK_PLACEHOLDER.
+    """
+    with np.load(npz_file) as bundle:
+        if str(bundle["format"]) != FORMAT_NAME:
+            raise ValueError(f"Not a label sidecar: {npz_file}")
+        version = int(bundle["version"])
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported label sidecar version {version} (supported: {FORMAT_VERSION})")
+
+        meta = json.loads(bundle["meta"].tobytes().decode("utf-8"))
+        contours = bundle["contours"]
+        contour_offsets = bundle["contour_offsets"]
+        ellipses = bundle["ellipses"]
+        mask_boxes = bundle["mask_boxes"]
+        mask_offsets = bundle["mask_offsets"]
+        mask_bits = bundle["mask_bits"] if include_masks else None
+
+    label_data = {"file_path": meta["file_path"], "annotations": []}
+    for i, entry in enumerate(meta["annotations"]):
+        annotation = {"name": entry["name"], "shape": entry["shape"]}
+        if not np.isnan(ellipses[i, 0]):
+            annotation["center"] = ellipses[i, 0:2].tolist()
+            annotation["axes"] = ellipses[i, 2:4].tolist()
+            annotation["angle"] = float(ellipses[i, 4])
+        if "integer_points" in entry:
+            points = contours[contour_offsets[i]:contour_offsets[i + 1]]
+            if entry["integer_points"]:
+                points = points.astype(np.int64)
+            annotation["points"] = points.tolist()
+        annotation["color"] = entry["color"]
+
+        x, y, w, h, frame_w, frame_h = (int(v) for v in mask_boxes[i])
+        if frame_w >= 0:
+            if not include_masks:
+                annotation["mask"] = MASK_PLACEHOLDER
+            else:
+                bits = mask_bits[mask_offsets[i]:mask_offsets[i + 1]]
+                window = np.unpackbits(bits, count=w * h).reshape(h, w)
+                annotation["mask"] = PackedMask.from_array(window, offset=(x, y), frame_size=(frame_w, frame_h))
+        if "orig_size" in entry:
+            annotation["orig_size"] = entry["orig_size"]
+        label_data["annotations"].append(annotation)
+    return label_data
+
+
+def json_to_sidecar(json_file, npz_file=None):
+    npz_file = npz_file or os.path.splitext(json_file)[0] + SIDECAR_EXT
+    save_sidecar(npz_file, read_label_data(json_file))
+    return npz_file
+
+
+def sidecar_to_json(npz_file, json_file=None):
+    json_file = json_file or os.path.splitext(npz_file)[0] + ".json"
+    write_label_data(json_file, load_sidecar(npz_file))
+    return json_file
+
+
+def _convert(path, source_ext, convert):
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(source_ext)]
+    else:
+        files = [path]
+    for file in files:
+        print(f"{file} -> {convert(file)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert label JSON files to and from .npz sidecars.")
+    parser.add_argument("direction", choices=["to-npz", "to-json"])
+    parser.add_argument("path", help="A single file or a folder to convert")
+    args = parser.parse_args()
+
+    if args.direction == "to-npz":
+        _convert(args.path, ".json", json_to_sidecar)
+    else:
+        _convert(args.path, SIDECAR_EXT, sidecar_to_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from render.frame import RENDER_VERSION, render_overview
+from render.view_transform import ViewTransform, thumbnail_size
+from service.annotation_io import annotations_from_label_data
+from service.annotation_store import STORES, create_store
+from service.image_io import IMAGE_EXTENSIONS, load_image, to_bgr
+from service.render_cache import RenderCache, label_fingerprint, make_key
+
+MANIFEST_NAME = "thumbnails.json"
+MANIFEST_VERSION = 2  # 2: thumbnails are named after the full image file name
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_SIDE = 256
+SHEET_GRID = (8, 6)  # Contact sheet (columns, rows)
+CAPTION_HEIGHT = 16
+# Fast zlib level: thumbnails are re-rendered often and encoding dominated the run time
+PNG_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+
+def render_thumbnail(image, label_data, max_side=THUMBNAIL_SIDE, fill=True):
+    """
+    Downsampled overlay of one slice: shape outlines, plus a tint of each
+    shape's area when fill is set (as validation.py shows saved masks).
+
+    Args:
+        image (np.ndarray): Grayscale or BGR slice at original size
+        label_data (dict): Saved label layout, or None for an unannotated slice
+        max_side (int): Longest side of the thumbnail in pixels
+        fill (bool): Tint shape interiors with the label color
+
+    Returns:
+        np.ndarray: Thumbnail (BGR; grayscale if nothing is drawn)
+    """
+    image_size = (image.shape[1], image.shape[0])
+    transform = ViewTransform(image_size, thumbnail_size(image_size, max_side))
+    small = cv2.resize(image, transform.display_size, interpolation=cv2.INTER_AREA)
+    annotations = annotations_from_label_data(label_data, image_size) if label_data else {}
+    return render_overview(small, annotations, transform, fill)
+
+
+_worker_store = None
+_worker_cache = None
+
+
+def _init_worker(store_class, cache=None):
+    global _worker_store, _worker_cache
+    _worker_store = store_class()
+    _worker_cache = cache
+
+
+def _render_job(image_path, out_path, max_side, fill):
+    """
+    Render and write one thumbnail, or copy it from the render cache. Runs in
+    a worker process; only the shape count and cache key travel back, so the
+    parent's memory does not grow with the batch.
+
+    Returns:
+        tuple: (shape count, cache key or None)
+    """
+    label_data = _worker_store.load(image_path, include_masks=False)
+    shapes = len(label_data.get("annotations", [])) if label_data else 0
+    if _worker_cache is None:
+        _write_png(out_path, render_thumbnail(load_image(image_path), label_data, max_side, fill))
+        return shapes, None
+
+    key = make_key("thumbnail", RENDER_VERSION, _worker_cache.file_digest(image_path),
+                   label_fingerprint(label_data), max_side, fill)
+    data = _worker_cache.get_bytes(key)
+    if data is None:
+        data = _worker_cache.put_image(key, render_thumbnail(load_image(image_path), label_data, max_side, fill))
+    _write_file(out_path, data)
+    return shapes, key
+
+
+def _sheet_job(sheet_path, tiles, max_side, grid, key=None):
+    """Assemble one contact sheet from thumbnails on disk. Runs in a worker process."""
+    data = _worker_cache.get_bytes(key) if key and _worker_cache is not None else None
+    if data is not None:
+        _write_file(sheet_path, data)
+        return
+    tiles = [(cv2.imread(path, cv2.IMREAD_UNCHANGED) if path else None, caption, annotated)
+             for path, caption, annotated in tiles]
+    sheet = build_contact_sheet(tiles, max_side, grid)
+    if key and _worker_cache is not None:
+        _write_file(sheet_path, _worker_cache.put_image(key, sheet))
+    else:
+        _write_png(sheet_path, sheet)
+
+
+def _write_png(path, image):
+    _write_file(path, cv2.imencode(".png", image, PNG_PARAMS)[1].tobytes())
+
+
+def _write_file(path, data):
+    # Write then rename, so readers never see a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _run_bounded(jobs, store, workers, cache=None):
+    """
+    Run (key, function, args) jobs; yield (key, result or exception) as they finish.
+
+    At most 2 * workers jobs are submitted at once, so a 10k-slice folder
+    never queues 10k pending futures.
+    """
+    if workers <= 1:
+        _init_worker(type(store), cache)
+        for key, function, args in jobs:
+            try:
+                yield key, function(*args)
+            except Exception as e:
+                yield key, e
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(type(store), cache)) as executor:
+        pending = {}
+        jobs = iter(jobs)
+        while True:
+            for key, function, args in jobs:
+                pending[executor.submit(function, *args)] = key
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                error = future.exception()
+                yield key, error if error is not None else future.result()
+
+
+def thumbnail_path(thumb_dir, file_name):
+    """Thumbnail of an image, named after its full file name so a.dcm and a.png don't collide."""
+    return os.path.join(thumb_dir, file_name + ".png")
+
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(tmp_path, path)
+
+
+def build_contact_sheet(tiles, max_side=THUMBNAIL_SIDE, grid=SHEET_GRID):
+    """
+    Paste thumbnails into a captioned grid.
+
+    Args:
+        tiles (list): [(thumbnail, caption, annotated)], at most columns * rows
+        max_side (int): Cell size the thumbnails were rendered for
+
+    Returns:
+        np.ndarray: BGR contact sheet
+    """
+    columns = min(grid[0], len(tiles))
+    rows = (len(tiles) + columns - 1) // columns
+    cell_h = max_side + CAPTION_HEIGHT
+    sheet = np.zeros((rows * cell_h, columns * max_side, 3), dtype=np.uint8)
+    for i, (thumbnail, caption, annotated) in enumerate(tiles):
+        x0, y0 = (i % columns) * max_side, (i // columns) * cell_h
+        if thumbnail is not None:
+            h, w = thumbnail.shape[:2]
+            ox, oy = x0 + (max_side - w) // 2, y0 + (max_side - h) // 2
+            sheet[oy:oy + h, ox:ox + w] = to_bgr(thumbnail) if thumbnail.ndim == 2 else thumbnail
+        # Unannotated slices get a dim caption so gaps stand out
+        color = (255, 255, 255) if annotated else (110, 110, 110)
+        cv2.putText(sheet, caption, (x0 + 3, y0 + cell_h - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1, cv2.LINE_AA)
+    return sheet
+
+
+def render_thumbnails(image_dir, out_dir, store=None, max_side=THUMBNAIL_SIDE, fill=True,
+                      annotated_only=False, workers=None, grid=SHEET_GRID, force=False, cache=None):
+    """
+    Render an overlay thumbnail per image of a folder, plus contact sheets.
+
+    Incremental: out_dir/thumbnails.json records each image's mtime and label
+    revision; only images whose pixels or labels changed since the last run
+    (or all of them when the render settings changed, or with force) are
+    rendered again, and only the contact sheets holding them are rebuilt.
+    With a RenderCache, renders are also looked up by content, so a fresh
+    out_dir or a forced run over unchanged data copies files instead.
+
+    Returns:
+        dict: Counts of "rendered", "skipped", "failed" slices and "sheets" written
+    """
+    store = store or create_store("json")
+    if os.path.abspath(out_dir) == os.path.abspath(image_dir):
+        # Contact sheets written there would be picked up as slices on the next run
+        raise ValueError("out_dir must differ from image_dir.")
+    workers = workers or os.cpu_count() or 1
+    thumb_dir = os.path.join(out_dir, THUMBNAIL_DIR)
+    os.makedirs(thumb_dir, exist_ok=True)
+
+    params = {"max_side": max_side, "fill": fill, "store": type(store).__name__}
+    manifest = read_manifest(out_dir)
+    if manifest is None or manifest.get("params") != params or force:
+        manifest = {"version": MANIFEST_VERSION, "params": params, "slices": {}, "sheets": []}
+    entries = manifest["slices"]
+
+    names, stamps, jobs = [], {}, []
+    for file_name in sorted(os.listdir(image_dir)):
+        image_path = os.path.join(image_dir, file_name)
+        if not file_name.lower().endswith(IMAGE_EXTENSIONS) or os.path.isdir(image_path):
+            continue
+        revision = store.revision(image_path)
+        if annotated_only and revision is None:
+            continue
+        names.append(file_name)
+        stamp = {"image_mtime_ns": os.stat(image_path).st_mtime_ns, "labels": revision}
+        out_path = thumbnail_path(thumb_dir, file_name)
+        entry = entries.get(file_name)
+        if entry is not None and all(entry.get(key) == value for key, value in stamp.items()) and os.path.exists(out_path):
+            continue
+        stamps[file_name] = stamp
+        jobs.append((file_name, _render_job, (image_path, out_path, max_side, fill)))
+
+    # Forget images that were removed from the folder, and thumbnails of an older naming
+    for file_name in set(entries) - set(names):
+        del entries[file_name]
+    expected = {os.path.basename(thumbnail_path(thumb_dir, file_name)) for file_name in names}
+    for thumb_name in os.listdir(thumb_dir):
+        if thumb_name.endswith(".png") and thumb_name not in expected:
+            os.remove(os.path.join(thumb_dir, thumb_name))
+
+    stats = {"rendered": 0, "skipped": len(names) - len(jobs), "failed": 0, "sheets": 0}
+    changed = set()
+    start = time.perf_counter()
+    try:
+        for file_name, result in _run_bounded(jobs, store, workers, cache):
+            if isinstance(result, Exception):
+                print(f"[ERROR] Failed to render {file_name}: {result}")
+                entries.pop(file_name, None)
+                stats["failed"] += 1
+                continue
+            shapes, key = result
+            entries[file_name] = dict(stamps[file_name], shapes=shapes, key=key)
+            changed.add(file_name)
+            stats["rendered"] += 1
+            if stats["rendered"] % 500 == 0:
+                print(f"[INFO] Rendered {stats['rendered']}/{len(jobs)} thumbnails "
+                      f"({stats['rendered'] / (time.perf_counter() - start):.0f}/s)")
+    finally:
+        # Finished work is kept even if the run is interrupted
+        write_manifest(out_dir, manifest)
+
+    per_sheet = grid[0] * grid[1]
+    pages = [names[i:i + per_sheet] for i in range(0, len(names), per_sheet)]
+    old_pages = manifest.get("sheets", [])
+    sheet_jobs = []
+    for i, page in enumerate(pages):
+        sheet_path = os.path.join(out_dir, f"contact_sheet_{i + 1:03d}.png")
+        if i < len(old_pages) and old_pages[i] == page and not changed.intersection(page) and os.path.exists(sheet_path):
+            continue
+        tiles = []
+        for file_name in page:
+            entry = entries.get(file_name)
+            shapes = entry["shapes"] if entry else 0
+            caption = f"{file_name[:24]} ({shapes})" if entry else f"{file_name[:24]} (failed)"
+            path = thumbnail_path(thumb_dir, file_name) if entry else None
+            tiles.append((path, caption, shapes > 0))
+        keys = [entries[file_name].get("key") if file_name in entries else None for file_name in page]
+        captions = [(caption, annotated) for _, caption, annotated in tiles]
+        sheet_key = make_key("sheet", keys, captions, max_side, list(grid)) if cache and all(keys) else None
+        sheet_jobs.append((sheet_path, _sheet_job, (sheet_path, tiles, max_side, grid, sheet_key)))
+    for sheet_path, result in _run_bounded(sheet_jobs, store, workers, cache):
+        if isinstance(result, Exception):
+            print(f"[ERROR] Failed to write {sheet_path}: {result}")
+        else:
+            stats["sheets"] += 1
+    for i in range(len(pages), len(old_pages)):
+        stale = os.path.join(out_dir, f"contact_sheet_{i + 1:03d}.png")
+        if os.path.exists(stale):
+            os.remove(stale)
+    manifest["sheets"] = pages
+    write_manifest(out_dir, manifest)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render annotated overlay thumbnails and contact sheets for QA review.")
+    parser.add_argument("image_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--size", type=int, default=THUMBNAIL_SIDE, help="Longest thumbnail side in pixels")
+    parser.add_argument("--no-fill", action="store_true", help="Draw outlines only, without tinting shape areas")
+    parser.add_argument("--annotated-only", action="store_true", help="Skip images without label data")
+    parser.add_argument("--grid", default=f"{SHEET_GRID[0]}x{SHEET_GRID[1]}", help="Contact sheet columns x rows")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-render everything, ignoring the manifest")
+    parser.add_argument("--store", choices=sorted(STORES), default="json")
+    parser.add_argument("--cache-dir", help="Render cache folder (default: ~/.ct_image_labeling_tool/render_cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or fill the render cache")
+    args = parser.parse_args()
+
+    grid = tuple(int(value) for value in args.grid.lower().split("x"))
+    start = time.perf_counter()
+    stats = render_thumbnails(args.image_dir, args.out_dir, create_store(args.store), args.size, not args.no_fill,
+                              args.annotated_only, args.workers, grid, args.force,
+                              None if args.no_cache else RenderCache(args.cache_dir))
+    print(f"Rendered {stats['rendered']} thumbnail(s), {stats['skipped']} unchanged, {stats['failed']} failed; "
+          f"wrote {stats['sheets']} contact sheet(s) to {args.out_dir} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,166 +1,171 @@
-import cv2
-import json
-import numpy as np
-import os
-import pydicom
-from tkinter import Tk, filedialog
-import base64
-
-def load_dicom_or_image(file_path):
-    """
-    Load DICOM or standard image file.
-    """
-    if file_path.endswith(".dcm"):
-        ds = pydicom.dcmread(file_path)
-        img = ds.pixel_array
-        img = cv2.normalize(img, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-        print(f"Loaded DICOM file: {file_path}")
-        print(f"DICOM Image Size: {img.shape[:2]}")
-    else:
-        img = cv2.imread(file_path, cv2.IMREAD_COLOR)
-        print(f"Loaded Image file: {file_path}")
-        print(f"Image Size: {img.shape[:2]}")
-    return img
-
-def resize_image(image, window_width, window_height):
-    """
-    Resize image to fit within the specified window size while maintaining aspect ratio.
-    """
-    img_height, img_width = image.shape[:2]
-    aspect_ratio = img_width / img_height
-
-    if img_width > window_width or img_height > window_height:
-        if window_width / window_height > aspect_ratio:
-            # Fit to window height
-            new_height = window_height
-            new_width = int(window_height * aspect_ratio)
-        else:
-            # Fit to window width
-            new_width = window_width
-            new_height = int(window_width / aspect_ratio)
-        return cv2.resize(image, (new_width, new_height))
-    else:
-        # If the image is smaller than the window, keep original size
-        return image
-
-def validate_json_annotations(json_path):
-    """
-    Validate JSON annotations by displaying them on the corresponding DICOM/image file.
-    """
-    # Load JSON file
-    with open(json_path, "r") as json_file:
-        data = json.load(json_file)
-
-    annotations = data.get("annotations", [])
-    base_dir = os.path.dirname(json_path)
-    file_list = data.get("file_path", [])
-    if not file_list:
-        print("No file_path found in JSON.")
-        return
-    image_path = os.path.join(base_dir, file_list[0])
-
-    if not os.path.exists(image_path):
-        print(f"Image file not found: {image_path}")
-        return
-
-    # Load the original image
-    original_image = load_dicom_or_image(image_path)
-    print(f"Original Image Size: {original_image.shape[:2]}")
-
-    # Debug: Print annotation details
-    print(f"Annotations count: {len(annotations)}")
-    for i, annotation in enumerate(annotations):
-        print(f"\nAnnotation {i + 1}:")
-        print(f"  Name: {annotation['name']}")
-        print(f"  Shape: {annotation['shape']}")
-        if annotation['shape'] == 'ellipse':
-            if 'center' in annotation:
-                print(f"  Center: {annotation['center']}")
-                print(f"  Axes: {annotation['axes']}")
-                print(f"  Angle: {annotation['angle']}")
-            else:
-                print(f"  Points: {annotation['points']}")
-        else:
-            print(f"  Points: {annotation['points']}")
-        print(f"  Color: {annotation['color']}")
-        if 'mask' in annotation:
-            print(f"  Mask: Exists")
-        else:
-            print(f"  Mask: Not available")
-
-    # Create a resizable window
-    window_name = "Validation: Annotated Image with Masks"
-    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-    cv2.resizeWindow(window_name, 1200, 1200)
-
-    annotated_image = original_image.copy()
-    for annotation in annotations:
-        shape = annotation["shape"]
-        color = tuple(annotation["color"])
-        if shape == "closed_curve":
-            # Draw closed_curve annotation using points
-            points = annotation["points"]
-            cv2.polylines(annotated_image, [np.array(points, dtype=np.int32)], isClosed=True, color=color, thickness=1)
-        elif shape == "ellipse":
-            # For ellipse, check if new structure exists (center, axes, angle)
-            if "center" in annotation and "axes" in annotation and "angle" in annotation:
-                center = tuple(map(int, annotation["center"]))
-                axes = tuple(map(int, annotation["axes"]))
-                angle = annotation["angle"]
-                cv2.ellipse(annotated_image, center, axes, angle, 0, 360, color, thickness=1)
-            else:
-                # 구 방식: use points
-                points = annotation["points"]
-                center = ((points[0][0] + points[1][0]) // 2, (points[0][1] + points[1][1]) // 2)
-                axes = (abs(points[1][0] - points[0][0]) // 2, abs(points[1][1] - points[0][1]) // 2)
-                cv2.ellipse(annotated_image, center, axes, 0, 0, 360, color, thickness=1)
-        else:
-            print(f"Skipping unsupported shape: {shape}")
-
-        # If mask exists, decode and overlay it
-        if "mask" in annotation:
-            print("Decoding mask...")
-            mask_data = base64.b64decode(annotation["mask"])
-            mask_array = np.frombuffer(mask_data, np.uint8)
-            mask_image = cv2.imdecode(mask_array, cv2.IMREAD_GRAYSCALE)
-            if mask_image is not None:
-                # 만약 mask 이미지의 크기가 원본 이미지와 다르다면 재조정
-                if mask_image.shape != original_image.shape[:2]:
-                    mask_image = cv2.resize(mask_image, (original_image.shape[1], original_image.shape[0]))
-                print(f"Decoded Mask Shape: {mask_image.shape}")
-
-                # Create a colored mask using the annotation color
-                mask_colored = np.zeros_like(original_image)
-                mask_colored[:, :, :] = color  # Fill mask with the annotation color
-
-                # Apply the mask (scale intensity by mask_image)
-                for c in range(3):  # RGB channels
-                    mask_colored[:, :, c] = mask_colored[:, :, c] * (mask_image / 255.0)
-
-                # Overlay the mask onto the original image
-                annotated_image = cv2.addWeighted(annotated_image, 1.0, mask_colored, 0.3, 0)
-            else:
-                print("Failed to decode mask.")
-
-    window_width, window_height = 800, 600
-    resized_image = resize_image(annotated_image, window_width, window_height)
-    cv2.imshow(window_name, resized_image)
-    while True:
-        key = cv2.waitKey(1) & 0xFF
-        if key == 27 or cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
-            break
-    cv2.destroyAllWindows()
-
-if __name__ == "__main__":
-    root = Tk()
-    root.withdraw()
-    json_path = filedialog.askopenfilename(
-        title="Select JSON File",
-        filetypes=[("JSON Files", "*.json")]
-    )
-    if json_path:
-        print(f"Selected JSON file: {json_path}")
-        validate_json_annotations(json_path)
-    else:
-        print("No JSON file selected.")
+import argparse
+import cv2
+import os
+from tkinter import Tk, filedialog
+
+from render.frame import RENDER_VERSION, render_frame
+from render.view_transform import ViewTransform
+from service.annotation_io import (STREAM_MIN_BYTES, annotation_mask, annotations_from_label_data, iter_masks,
+                                   read_label_data)
+from service.image_io import load_image
+from service.mask import PackedMask
+from service.render_cache import RenderCache, make_key
+
+def load_dicom_or_image(file_path):
+    """
+    Load DICOM or standard image file.
+    """
+    img = load_image(file_path)
+    if file_path.endswith(".dcm"):
+        print(f"Loaded DICOM file: {file_path}")
+        print(f"DICOM Image Size: {img.shape[:2]}")
+    else:
+        print(f"Loaded Image file: {file_path}")
+        print(f"Image Size: {img.shape[:2]}")
+    return img
+
+def resize_image(image, window_width, window_height):
+    """
+    Resize image to fit within the specified window size while maintaining aspect ratio.
+    """
+    img_height, img_width = image.shape[:2]
+    aspect_ratio = img_width / img_height
+
+    if img_width > window_width or img_height > window_height:
+        if window_width / window_height > aspect_ratio:
+            # Fit to window height
+            new_height = window_height
+            new_width = int(window_height * aspect_ratio)
+        else:
+            # Fit to window width
+            new_width = window_width
+            new_height = int(window_width / aspect_ratio)
+        return cv2.resize(image, (new_width, new_height))
+    else:
+        # If the image is smaller than the window, keep original size
+        return image
+
+def validate_json_annotations(json_path, cache=None):
+    """
+    Validate JSON annotations by displaying them on the corresponding DICOM/image file.
+
+    With a RenderCache, the composed overlay is kept in it, keyed by the
+    image and JSON file contents, so reopening an unchanged file skips decoding.
+    """
+    if os.path.getsize(json_path) >= STREAM_MIN_BYTES:
+        # Load geometry only; mask payloads are streamed one at a time below
+        data = read_label_data(json_path, include_masks=False)
+        masks = iter_masks(json_path)
+    else:
+        # Small enough to parse once, masks included
+        data = read_label_data(json_path)
+        masks = iter([annotation["mask"] for annotation in data.get("annotations", [])
+                      if isinstance(annotation.get("mask"), str)])
+
+    annotations = data.get("annotations", [])
+    base_dir = os.path.dirname(json_path)
+    file_list = data.get("file_path", [])
+    if not file_list:
+        print("No file_path found in JSON.")
+        return
+    image_path = os.path.join(base_dir, file_list[0])
+
+    if not os.path.exists(image_path):
+        print(f"Image file not found: {image_path}")
+        return
+
+    annotated_image = None
+    if cache is not None:
+        cache_key = make_key("validation", RENDER_VERSION, cache.file_digest(image_path), cache.file_digest(json_path))
+        annotated_image = cache.get_image(cache_key)
+    if annotated_image is None:
+        # Load the original image
+        original_image = load_dicom_or_image(image_path)
+        print(f"Original Image Size: {original_image.shape[:2]}")
+    else:
+        print(f"Loaded overlay from the render cache: {image_path}")
+
+    # Debug: Print annotation details
+    print(f"Annotations count: {len(annotations)}")
+    for i, annotation in enumerate(annotations):
+        print(f"\nAnnotation {i + 1}:")
+        print(f"  Name: {annotation['name']}")
+        print(f"  Shape: {annotation['shape']}")
+        if annotation['shape'] == 'ellipse':
+            if 'center' in annotation:
+                print(f"  Center: {annotation['center']}")
+                print(f"  Axes: {annotation['axes']}")
+                print(f"  Angle: {annotation['angle']}")
+            else:
+                print(f"  Points: {annotation['points']}")
+        else:
+            print(f"  Points: {annotation['points']}")
+        print(f"  Color: {annotation['color']}")
+        if annotation.get('mask') is not None:
+            print(f"  Mask: Exists")
+        else:
+            print(f"  Mask: Not stored (rebuilt from geometry)")
+
+    # Create a resizable window
+    window_name = "Validation: Annotated Image with Masks"
+    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    cv2.resizeWindow(window_name, 1200, 1200)
+
+    if annotated_image is None:
+        # Saved masks are in original-image pixels, so compose at the image's own size
+        frame_size = (original_image.shape[1], original_image.shape[0])
+        overlays = []
+        for annotation in annotations:
+            if annotation["shape"] not in ("ellipse", "closed_curve", "polygon"):
+                print(f"Skipping unsupported shape: {annotation['shape']}")
+
+            # If mask exists, decode and overlay it
+            if annotation.get("mask") is not None:
+                print("Decoding mask...")
+                # 만약 mask 이미지의 크기가 원본 이미지와 다르다면 재조정
+                mask = PackedMask.from_base64_png(next(masks), frame_size=frame_size)
+                if mask is not None:
+                    print(f"Decoded Mask Box: {mask.bbox}")
+                else:
+                    print("Failed to decode mask.")
+            else:
+                # Geometry-only save: rebuild the mask the full save would have stored
+                mask = annotation_mask(annotation, frame_size)
+                print(f"Rebuilt Mask Box: {mask.bbox}")
+            if mask is not None:
+                overlays.append((mask, tuple(annotation["color"])))
+
+        annotated_image = render_frame(original_image, annotations_from_label_data(data, frame_size),
+                                       ViewTransform.identity(frame_size), overlays=overlays)
+        if cache is not None:
+            cache.put_image(cache_key, annotated_image)
+
+    window_width, window_height = 800, 600
+    resized_image = resize_image(annotated_image, window_width, window_height)
+    cv2.imshow(window_name, resized_image)
+    while True:
+        key = cv2.waitKey(1) & 0xFF
+        if key == 27 or cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
+            break
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show a label JSON's annotations over its image.")
+    parser.add_argument("json_path", nargs="?", help="Label JSON (default: pick one in a file dialog)")
+    parser.add_argument("--cache-dir", help="Render cache folder (default: ~/.ct_image_labeling_tool/render_cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or fill the render cache")
+    args = parser.parse_args()
+
+    json_path = args.json_path
+    if not json_path:
+        root = Tk()
+        root.withdraw()
+        json_path = filedialog.askopenfilename(
+            title="Select JSON File",
+            filetypes=[("JSON Files", "*.json")]
+        )
+    if json_path:
+        print(f"Selected JSON file: {json_path}")
+        validate_json_annotations(json_path, None if args.no_cache else RenderCache(args.cache_dir))
+    else:
+        print("No JSON file selected.")
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from service.annotation_store import STORES, create_store
+from service.image_io import load_image, read_dicom_header, slice_position, slice_sort_key
+from service.label_map import build_label_map, label_map_dtype, load_label_mapping
+
+NIFTI_HEADER_SIZE = 348
+NIFTI_DATA_OFFSET = 352  # Header plus the 4-byte (empty) extension flag
+NIFTI_DATATYPES = {np.dtype(np.uint8): 2, np.dtype(np.int16): 4, np.dtype(np.uint16): 512}
+
+
+def order_series(file_paths):
+    """
+    Order the DICOM files of one series anatomically using headers only.
+
+    Returns:
+        tuple: (ordered file paths, header datasets in the same order)
+    """
+    headers = [read_dicom_header(path) for path in file_paths]
+    series = {getattr(ds, "SeriesInstanceUID", None) for ds in headers}
+    if len(series) > 1:
+        print(f"[INFO] Folder contains {len(series)} series; slices are stacked together.")
+    order = sorted(range(len(file_paths)), key=lambda i: slice_sort_key(headers[i], file_paths[i]))
+    return [file_paths[i] for i in order], [headers[i] for i in order]
+
+
+def volume_geometry(headers):
+    """
+    Voxel spacing (x, y, z) in mm and a RAS affine for the ordered slices.
+    """
+    first = headers[0]
+    row_spacing, col_spacing = (float(v) for v in getattr(first, "PixelSpacing", (1.0, 1.0)))
+    positions = [slice_position(ds) for ds in headers]
+    if len(headers) > 1 and None not in positions:
+        slice_spacing = abs(positions[-1] - positions[0]) / (len(headers) - 1) or 1.0
+    else:
+        slice_spacing = float(getattr(first, "SliceThickness", 1.0) or 1.0)
+
+    affine = np.diag([col_spacing, row_spacing, slice_spacing, 1.0])
+    orientation = getattr(first, "ImageOrientationPatient", None)
+    origin = getattr(first, "ImagePositionPatient", None)
+    if orientation is not None and origin is not None:
+        row_dir = np.asarray(orientation[:3], dtype=float)
+        col_dir = np.asarray(orientation[3:], dtype=float)
+        if len(headers) > 1 and getattr(headers[-1], "ImagePositionPatient", None) is not None:
+            slice_dir = (np.asarray(headers[-1].ImagePositionPatient, dtype=float)
+                         - np.asarray(origin, dtype=float)) / (len(headers) - 1)
+        else:
+            slice_dir = np.cross(row_dir, col_dir) * slice_spacing
+        affine = np.eye(4)
+        affine[:3, 0] = row_dir * col_spacing
+        affine[:3, 1] = col_dir * row_spacing
+        affine[:3, 2] = slice_dir
+        affine[:3, 3] = np.asarray(origin, dtype=float)
+        # DICOM patient space is LPS; NIfTI is RAS
+        affine[:2] *= -1
+    return (col_spacing, row_spacing, slice_spacing), affine
+
+
+def nifti_header(shape, dtype, spacing, affine, description=""):
+    """
+    Pack a NIfTI-1 single-file (.nii) header for a (Z, H, W) C-order volume.
+    """
+    depth, height, width = shape
+    dtype = np.dtype(dtype)
+    header = struct.pack(
+        "<i10s18sihbb8h3fhhhh8ffffhbb4f2i80s24shh6f4f4f4f16s4s",
+        NIFTI_HEADER_SIZE, b"", b"", 0, 0, b"r"[0], 0,
+        3, width, height, depth, 1, 1, 1, 1,
+        0.0, 0.0, 0.0, 0,
+        NIFTI_DATATYPES[dtype], dtype.itemsize * 8, 0,
+        1.0, spacing[0], spacing[1], spacing[2], 0.0, 0.0, 0.0, 0.0,
+        float(NIFTI_DATA_OFFSET), 1.0, 0.0,
+        0, 0, 2,  # slice_end, slice_code, xyzt_units = mm
+        0.0, 0.0, 0.0, 0.0,
+        0, 0,
+        description.encode("ascii", "replace")[:79], b"",
+        0, 1,  # qform_code, sform_code (scanner)
+        0.0, 0.0, 0.0, 0.0, 0.0, 0.0,
+        *affine[0], *affine[1], *affine[2],
+        b"", b"n+1\0",
+    )
+    assert len(header) == NIFTI_HEADER_SIZE
+    return header
+
+
+def open_volume(path, shape, dtype, fmt, spacing=None, affine=None, description=""):
+    """
+    Create a writable memory-mapped (Z, H, W) volume on disk.
+    """
+    if fmt == "npy":
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    with open(path, "wb") as file:
+        file.write(nifti_header(shape, dtype, spacing, affine, description))
+        file.write(b"\0" * (NIFTI_DATA_OFFSET - NIFTI_HEADER_SIZE))
+        file.truncate(NIFTI_DATA_OFFSET + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return np.memmap(path, dtype=dtype, mode="r+", offset=NIFTI_DATA_OFFSET, shape=shape)
+
+
+def export_volume(image_dir, out_prefix, label_to_index=None, store=None, fmt="npy", overlap="last"):
+    """
+    Stack the DICOM slices of a folder (one series) and their label maps into volumes.
+
+    Slices are ordered by ImagePositionPatient / InstanceNumber from the
+    headers, then loaded one at a time with load_image and written straight
+    into memory-mapped output, so memory stays at about one slice.
+
+    Writes <out_prefix>_image.{npy|nii}, <out_prefix>_labels.{npy|nii} (when a
+    label mapping is given) and <out_prefix>_slices.json with the slice order.
+    """
+    file_paths = [os.path.join(image_dir, name) for name in sorted(os.listdir(image_dir)) if name.endswith(".dcm")]
+    if not file_paths:
+        raise ValueError(f"No DICOM files found in {image_dir}")
+    store = store or create_store("json")
+    ext = ".npy" if fmt == "npy" else ".nii"
+
+    file_paths, headers = order_series(file_paths)
+    spacing, affine = volume_geometry(headers)
+    shape = (len(file_paths), int(headers[0].Rows), int(headers[0].Columns))
+    images = open_volume(out_prefix + "_image" + ext, shape, np.uint8, fmt, spacing, affine, "CT image")
+    labels = None
+    if label_to_index:
+        labels = open_volume(out_prefix + "_labels" + ext, shape, label_map_dtype(label_to_index), fmt,
+                             spacing, affine, "label map")
+
+    annotated = []
+    for z, path in enumerate(file_paths):
+        # Normalized straight into the output volume
+        image = load_image(path, out=images[z])
+        if image.shape != shape[1:]:
+            raise ValueError(f"Slice size {image.shape[:2]} of {path} does not match {shape[1:]}")
+        if labels is not None and store.exists(path):
+            label_data = store.load(path, include_masks=False)
+            labels[z] = build_label_map(label_data, label_to_index, (shape[2], shape[1]), overlap)
+            annotated.append(os.path.basename(path))
+    images.flush()
+    if labels is not None:
+        labels.flush()
+
+    with open(out_prefix + "_slices.json", "w") as file:
+        json.dump({
+            "slices": [os.path.basename(path) for path in file_paths],
+            "annotated": annotated,
+            "spacing": list(spacing),
+            "affine": affine.tolist(),
+            "labels": label_to_index or {},
+        }, file, indent=4)
+    return shape
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stack a folder of DICOM slices and their labels into volumes.")
+    parser.add_argument("image_dir", help="Folder holding one CT series")
+    parser.add_argument("out_prefix", help="Output path prefix, e.g. out/patient01")
+    parser.add_argument("--format", choices=["npy", "nifti"], default="npy")
+    mapping = parser.add_mutually_exclusive_group()
+    mapping.add_argument("--mapping", help='JSON file like {"psoas": 1, "vertebra": 2}')
+    mapping.add_argument("--labels", help="Comma-separated label names, numbered from 1 in order")
+    parser.add_argument("--overlap", choices=["last", "first", "max"], default="last")
+    parser.add_argument("--store", choices=sorted(STORES), default="json")
+    args = parser.parse_args()
+
+    label_to_index = load_label_mapping(args.mapping, args.labels) if (args.mapping or args.labels) else None
+    out_dir = os.path.dirname(args.out_prefix)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    shape = export_volume(args.image_dir, args.out_prefix, label_to_index, create_store(args.store),
+                          args.format, args.overlap)
+    print(f"Exported volume of shape {shape} (slices, rows, columns) to {args.out_prefix}_*")
+
+
+if __name__ == "__main__":
+    main()